@@ -1,5 +1,4 @@
 import os
-import joblib
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -8,33 +7,53 @@ def create_app():
     """Application Factory Function"""
     load_dotenv()
     app = Flask(__name__)
-    CORS(app)
 
-    # --- Load Models and other shared resources ---
-    # This is the new home for your model loading logic.
-    # We attach them to the 'app' object to make them accessible via 'current_app'.
-    try:
-        model_package = joblib.load('churn_model.pkl')
-        app.churn_model_package = model_package
-        print("Success: New Random Forest model package loaded.")
-    except FileNotFoundError:
-        print("Error: 'churn_model.pkl' not found. Please run the train_model.py script first.")
-        exit()
-
-    try:
-        sales_forecaster = joblib.load('sales_forecaster.pkl')
-        app.sales_forecaster = sales_forecaster
-        print("Success: SARIMAX (Sales) model loaded.")
-    except FileNotFoundError:
-        print("Warning: 'sales_forecaster.pkl' not found. Sales forecasting will not work.")
-        app.sales_forecaster = None
+    from .services.serialization import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag', 'Last-Modified', 'X-Profile-Id', 'X-Profile-Url', 'X-Model-Version'])
+
+    from .services import startup_service, http_cache, metrics, profiling, model_store
 
     # --- Register Blueprints ---
-    with app.app_context():
-        from .routes import churn_routes, sales_routes, utility_routes
+    # Blueprints hold no model or data state; models are loaded through
+    # services.model_store and churn scores through services.scoring_service.
+    def register_blueprints():
+        from .routes import churn_routes, sales_routes, utility_routes, health_routes, dashboard_routes, metrics_routes, debug_routes, admin_routes
 
         app.register_blueprint(churn_routes.churn_bp, url_prefix='/api')
         app.register_blueprint(sales_routes.sales_bp, url_prefix='/api')
         app.register_blueprint(utility_routes.utility_bp, url_prefix='/api')
+        app.register_blueprint(health_routes.health_bp, url_prefix='/api')
+        app.register_blueprint(dashboard_routes.dashboard_bp, url_prefix='/api')
+        app.register_blueprint(metrics_routes.metrics_bp)
+        app.register_blueprint(debug_routes.debug_bp, url_prefix='/api')
+        app.register_blueprint(admin_routes.admin_bp, url_prefix='/api')
+
+    startup_service.run_phase('blueprints', register_blueprints)
+
+    # Opt-in ?profile=cpu|alloc (PROFILING_ENABLED plus a secret header); outermost, so it covers the other hooks.
+    profiling.init_app(app)
+
+    # Latency and payload sizes of every request; registered before http_cache so sizes are post-compression.
+    metrics.init_app(app)
+
+    # Read endpoints revalidate against the data/model version and compress large bodies.
+    http_cache.init_app(app, ('churn_bp', 'sales_bp', 'dashboard_bp'))
+
+    # X-Model-Version names the model versions behind each response.
+    model_store.init_app(app)
+
+    # --- Load Models and other shared resources ---
+    if startup_service.STARTUP_MODE == 'eager':
+        try:
+            startup_service.warm_up()
+        except Exception as e:
+            print(f"Error: {e}")
+            exit()
+    elif startup_service.STARTUP_MODE == 'background':
+        startup_service.start_background_warm_up()
+
+    # Hot-reloads model files replaced on disk (MODEL_WATCH_INTERVAL); loaded models only.
+    model_store.start_watcher()
 
-    return app
\ No newline at end of file
+    return app
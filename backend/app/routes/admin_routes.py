@@ -0,0 +1,52 @@
+import hmac
+import os
+from flask import Blueprint, jsonify, request
+from app.services import model_store
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+# Admin endpoints answer 404 unless ADMIN_TOKEN is set and sent in ADMIN_HEADER.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_HEADER = 'X-Admin-Token'
+
+
+def _authorized():
+    token = request.headers.get(ADMIN_HEADER, '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+@admin_bp.route('/admin/models', methods=['GET'])
+def list_models():
+    """Served and rollback versions of each model in this worker."""
+    if not _authorized():
+        return jsonify({"error": "Not found."}), 404
+    return jsonify(model_store.registry_status())
+
+
+@admin_bp.route('/admin/models/<name>/<action>', methods=['POST'])
+def change_model(name, action):
+    """Reloads a model from its file or rolls back to the previous version.
+
+    The new model is loaded, validated and warmed while the old one keeps
+    serving; a model that fails validation is not swapped in (422). Each
+    worker has its own registry, so call this once per worker (or rely on
+    the file watcher).
+    """
+    if not _authorized():
+        return jsonify({"error": "Not found."}), 404
+    if action not in ('reload', 'rollback') or name not in model_store.registry_status():
+        return jsonify({"error": "Unknown model or action."}), 404
+    try:
+        if action == 'reload':
+            current, previous = model_store.reload(name)
+        else:
+            current, previous = model_store.rollback(name)
+        return jsonify({
+            "model": name,
+            "current": current.to_dict(),
+            "previous": previous.to_dict() if previous is not None else None,
+        })
+    except model_store.ModelValidationError as e:
+        return jsonify({"error": str(e)}), 422
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
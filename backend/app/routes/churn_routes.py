@@ -1,91 +1,170 @@
-from flask import Blueprint, jsonify, request, current_app
-from app.services import db_service, ml_service
+from flask import Blueprint, jsonify, request
+from app.services import scoring_service, ml_service, model_store, dashboard_service, churn_cube
+from app.services.feature_pipeline import ChurnFeatureTransformer
+from app.services.risk_index import RiskIndex, parse_cursor, format_cursor
 import pandas as pd
-from app.services.db import engine
+import io
+import os
+from app.services.serialization import tabular_response
 
 churn_bp = Blueprint('churn_bp', __name__)
 
-customer_df = db_service.get_aggregated_data()
-customer_df_featured = ml_service.feature_engineering_for_prediction(customer_df)
-
-model_package = current_app.churn_model_package
-churn_model = model_package['model']
-scaler = model_package['scaler']
-numeric_columns = model_package['numeric_columns']
-model_columns = model_package['model_columns']
-
-df_predict = pd.get_dummies(customer_df_featured, columns=['gender', 'country'], drop_first=True)
-df_predict_aligned = df_predict.reindex(columns=model_columns, fill_value=0)
-df_predict_aligned[numeric_columns] = scaler.transform(df_predict_aligned[numeric_columns])
+SCORE_BATCH_LIMIT = int(os.getenv("SCORE_BATCH_LIMIT", "100000"))
 
 @churn_bp.route('/predict_churn', methods=['GET'])
 def predict_churn():
-    """Predicts the top N customers likely to churn with additional details."""
+    """Predicts the top N customers likely to churn with additional details.
+
+    Optional filters: country, subscription_status, min_prob and max_prob.
+    Pass the X-Next-Cursor header of a response as ?after= to get the next page.
+    ?format=columnar|arrow returns column arrays instead of row objects.
+    """
     try:
         count = request.args.get('count', default=10, type=int)
-        churn_probabilities = churn_model.predict_proba(df_predict_aligned[model_columns])[:, 1]
-        
-        results_df = customer_df_featured[[
+        min_prob = request.args.get('min_prob', type=float)
+        max_prob = request.args.get('max_prob', type=float)
+        after = request.args.get('after')
+        filters = {column: request.args.get(column) for column in RiskIndex.FILTER_COLUMNS}
+        try:
+            after = parse_cursor(after) if after else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        snapshot = scoring_service.get_snapshot()
+        rows, next_cursor = snapshot.risk_index.query(
+            count, after=after, filters=filters, min_prob=min_prob, max_prob=max_prob
+        )
+
+        top_n_churners = snapshot.customers.iloc[rows][[
             'customer_id', 
             'last_purchase_date', 
             'total_cancellations', 
-            'subscription_status'
+            'subscription_status',
+            'churn_probability'
         ]].copy()
-        results_df['churn_probability'] = churn_probabilities
-        
-        top_n_churners = results_df.sort_values(by='churn_probability', ascending=False).head(count)
         
         top_n_churners['last_purchase_date'] = top_n_churners['last_purchase_date'].dt.strftime('%Y-%m-%d')
         
-        return jsonify(top_n_churners.to_dict(orient='records'))
+        response = tabular_response(top_n_churners)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = format_cursor(next_cursor)
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @churn_bp.route('/churn_trends', methods=['GET'])
 def get_churn_trends():
+    """Predicted churners per last-purchase month, from the snapshot's churn cube."""
     try:
-        customer_df_featured['predicted_churn'] = churn_model.predict(df_predict_aligned[model_columns])
-        df_time = customer_df_featured.set_index('last_purchase_date')
-        monthly_churn = df_time['predicted_churn'].resample('M').sum()
+        trend = scoring_service.get_snapshot().cube.query(group_by=('month',), include_empty=True)
+        trend = trend[trend['month'] != churn_cube.UNKNOWN]
         trend_data = {
-            "months": monthly_churn.index.strftime('%Y-%m').tolist(),
-            "churn_counts": monthly_churn.values.tolist()
+            "months": trend['month'].tolist(),
+            "churn_counts": trend['churned'].tolist()
         }
-        return jsonify(trend_data)
+        return tabular_response(trend_data)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @churn_bp.route('/churn_segmentation', methods=['GET'])
 def get_churn_segmentation():
+    """Customers per risk segment (Low < 0.3 <= Medium < 0.7 <= High), largest first."""
     try:
-        churn_probabilities = churn_model.predict_proba(df_predict_aligned[model_columns])[:, 1]
-        def assign_segment(prob):
-            if prob < 0.3: return 'Low Risk'
-            elif prob < 0.7: return 'Medium Risk'
-            else: return 'High Risk'
-        segments = pd.Series(churn_probabilities).apply(assign_segment)
-        segment_counts = segments.value_counts().to_dict()
+        segments = scoring_service.get_snapshot().cube.query(group_by=('segment',))
+        segments = segments.sort_values('customers', ascending=False, kind='stable')
+        segment_counts = dict(zip(segments['segment'], segments['customers'].tolist()))
         return jsonify(segment_counts)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500\
-        
+        return jsonify({"error": str(e)}), 500
 
 
 @churn_bp.route('/user_distribution', methods=['GET'])
 def get_user_distribution():
     """Calculates the number of users per country."""
     try:
-        sql_query = """
-            SELECT country, COUNT(customer_id) as user_count
-            FROM customers
-            GROUP BY country
-            ORDER BY user_count DESC;
-        """
-        df = pd.read_sql(sql_query, engine)
-        
-        country_data = df.to_dict(orient='records')
-        return jsonify(country_data)
+        country_data = dashboard_service.get_section('user_distribution')
+        return tabular_response(country_data)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@churn_bp.route('/churn_cube', methods=['GET'])
+def query_churn_cube():
+    """Slices the churn cube: customers, churned, expected_churn, churn_rate and avg_probability per group.
+
+    Filter with any dimension (country, gender, age_band, segment, month), e.g.
+    ?country=Germany,UK&segment=High Risk; bound months with month_from and
+    month_to (YYYY-MM). ?group_by=month,segment drills down (no group_by
+    gives the totals); include_empty=true keeps groups without customers.
+    Supports ?format=columnar|arrow.
+    """
+    try:
+        cube = scoring_service.get_snapshot().cube
+        filters = {}
+        for dimension in cube.DIMENSIONS:
+            values = [v.strip() for value in request.args.getlist(dimension) for v in value.split(',') if v.strip()]
+            if values:
+                filters[dimension] = values
+        group_by = [d.strip() for d in request.args.get('group_by', default='').split(',') if d.strip()]
+        include_empty = request.args.get('include_empty', default='false').lower() in ('1', 'true', 'yes')
+        try:
+            result = cube.query(filters, group_by, request.args.get('month_from'), request.args.get('month_to'),
+                                include_empty=include_empty)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return tabular_response(result)
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@churn_bp.route('/churn_cube/dimensions', methods=['GET'])
+def get_churn_cube_dimensions():
+    """The values each churn cube dimension can be filtered or grouped by."""
+    try:
+        return jsonify(scoring_service.get_snapshot().cube.dimension_values())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@churn_bp.route('/score_customers', methods=['POST'])
+def score_customers():
+    """Scores a batch of ad-hoc customer records (JSON list or CSV body).
+
+    Records use the aggregated customer fields (age, gender, country,
+    signup_date, last_purchase_date, purchase_count, total_spend, ...).
+    """
+    try:
+        if request.mimetype in ('text/csv', 'application/csv'):
+            records = pd.read_csv(io.BytesIO(request.get_data()))
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get('customers')
+            if not isinstance(payload, list):
+                return jsonify({"error": "Send a JSON list of customer records or a text/csv body."}), 400
+            records = pd.DataFrame.from_records(payload)
+
+        if len(records) > SCORE_BATCH_LIMIT:
+            return jsonify({"error": f"At most {SCORE_BATCH_LIMIT} records can be scored per request."}), 413
+
+        model_package = model_store.get_churn_package()
+        transformer = ChurnFeatureTransformer.from_model_package(model_package)
+        X = transformer.transform(records)
+        probabilities, predictions = ml_service.score_feature_matrix(model_package, X)
+
+        if 'customer_id' in records:
+            customer_ids = records['customer_id'].tolist()
+        else:
+            customer_ids = list(range(len(records)))
+        results = pd.DataFrame({
+            "customer_id": customer_ids,
+            "churn_probability": probabilities.astype(float),
+            "predicted_churn": predictions.astype(int),
+        })
+        return tabular_response(results)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
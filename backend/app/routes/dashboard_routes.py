@@ -0,0 +1,33 @@
+from flask import Blueprint, jsonify, request
+from app.services import dashboard_service
+
+dashboard_bp = Blueprint('dashboard_bp', __name__)
+
+
+@dashboard_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """Returns several dashboard widgets in one response, from one database round trip.
+
+    With ANALYTICS_ENGINE=memory the widgets come from the in-process orders replica instead.
+
+    ?sections=main_kpis,monthly_sales picks a subset; all sections by default.
+    """
+    try:
+        requested = request.args.get('sections')
+        if requested:
+            sections = [s.strip() for s in requested.split(',') if s.strip()]
+        else:
+            sections = list(dashboard_service.SECTIONS)
+
+        unknown = [s for s in sections if s not in dashboard_service.SECTIONS]
+        if unknown:
+            return jsonify({
+                "error": f"Unknown sections: {', '.join(unknown)}",
+                "available_sections": list(dashboard_service.SECTIONS),
+            }), 400
+
+        data = dashboard_service.get_sections(sections)
+        return jsonify(data)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,28 @@
+from flask import Blueprint, Response, jsonify, request
+from app.services import profiling
+
+debug_bp = Blueprint('debug_bp', __name__)
+
+
+@debug_bp.route('/debug/profiles', methods=['GET'])
+def list_debug_profiles():
+    """Recent request profiles, slowest first. Needs profiling enabled and the secret header."""
+    if not profiling.authorized(request):
+        return jsonify({"error": "Not found."}), 404
+    return jsonify(profiling.list_profiles())
+
+
+@debug_bp.route('/debug/profiles/<profile_id>', methods=['GET'])
+def get_debug_profile(profile_id):
+    """One profile; ?format=collapsed returns a CPU profile's stacks for flame graph tools."""
+    if not profiling.authorized(request):
+        return jsonify({"error": "Not found."}), 404
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        return jsonify({"error": "Unknown profile."}), 404
+    data = profile.to_dict()
+    if request.args.get('format') == 'collapsed':
+        if profile.mode != 'cpu':
+            return jsonify({"error": "format=collapsed is only available for CPU profiles."}), 400
+        return Response('\n'.join(data['cpu']['collapsed']) + '\n', mimetype='text/plain')
+    return jsonify(data)
@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify
+from app.services import startup_service, db, analytics_engine
+
+health_bp = Blueprint('health_bp', __name__)
+
+
+@health_bp.route('/health/live', methods=['GET'])
+def live():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({"status": "alive"})
+
+
+@health_bp.route('/health/ready', methods=['GET'])
+def ready():
+    """Readiness: models are loaded and the scoring snapshot is built, with per-phase timings."""
+    status = startup_service.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@health_bp.route('/health/db', methods=['GET'])
+def db_pool():
+    """Connection pool occupancy, checkout wait times and read replica health for this worker."""
+    return jsonify(db.pool_stats())
+
+
+@health_bp.route('/health/analytics', methods=['GET'])
+def analytics_replica():
+    """Engine, data version and size of this worker's in-memory analytics replica."""
+    return jsonify(analytics_engine.status())
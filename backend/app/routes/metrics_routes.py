@@ -0,0 +1,25 @@
+import hmac
+import os
+from flask import Blueprint, Response, jsonify, request
+from app.services import metrics
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+# When set, /metrics answers 404 unless the scrape sends "Authorization: Bearer <token>"
+# (Prometheus: authorization.credentials). Unset keeps it open, e.g. behind a private port.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _authorized():
+    if not METRICS_TOKEN:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, SQL, model and cache metrics of this worker in Prometheus text format."""
+    if not _authorized():
+        return jsonify({"error": "Not found."}), 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
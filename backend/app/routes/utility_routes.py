@@ -1,48 +1,59 @@
-from flask import Blueprint, jsonify, request
-import pandas as pd
-import psycopg2
-from data_importer import insert_data_from_df
-import os
+from flask import Blueprint, jsonify, request, url_for
+from data_importer import SUPPORTED_EXTENSIONS
+from app.services import import_service
 
 utility_bp = Blueprint('utility_bp', __name__)
 
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_PORT = os.getenv("DB_PORT")
-DB_HOST = os.getenv("DB_HOST")
-
 
 @utility_bp.route('/upload_data', methods=['POST'])
 def upload_data():
-    """Receives an Excel file and uses the importer to add it to the database."""
+    """Accepts an Excel, CSV or Parquet file and queues it for a background import.
+
+    Responds 202 with a job id right away; progress is at /api/import_jobs/<job_id>.
+    """
     if 'file' not in request.files:
         return jsonify({"error": "No file part in the request"}), 400
-    
+
     file = request.files['file']
     if file.filename == '':
         return jsonify({"error": "No file selected for uploading"}), 400
 
-    if file and (file.filename.endswith('.xls') or file.filename.endswith('.xlsx')):
-        conn = None
+    if file and file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
         try:
-            df = pd.read_excel(file)
-            conn = psycopg2.connect(
-                database=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT
-            )
-            
-            result = insert_data_from_df(conn, df)
-            
-            if result['success']:
-                return jsonify({"message": f"Successfully processed {result['rows_processed']} rows."})
-            else:
-                return jsonify({"error": result['error']}), 500
-
+            job = import_service.submit(file)
+        except import_service.QueueFullError as e:
+            return jsonify({"error": str(e)}), 429
         except Exception as e:
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-        finally:
-            if conn is not None:
-                conn.close()
+
+        status_url = url_for('utility_bp.get_import_job', job_id=job.id)
+        response = jsonify({
+            "message": f"Upload received; importing {file.filename} in the background.",
+            "job_id": job.id,
+            "status_url": status_url,
+        })
+        response.headers['Location'] = status_url
+        return response, 202
     else:
-        return jsonify({"error": "Invalid file type. Please upload an Excel file."}), 400
+        return jsonify({"error": f"Invalid file type. Please upload one of: {', '.join(SUPPORTED_EXTENSIONS)}"}), 400
+
+
+@utility_bp.route('/import_jobs', methods=['GET'])
+def list_import_jobs():
+    """Lists recent import jobs of every worker, newest first."""
+    try:
+        return jsonify(import_service.list_jobs())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
+@utility_bp.route('/import_jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    """Reports phase, row counts, throughput and any error for one import job."""
+    try:
+        job = import_service.get_job(job_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if job is None:
+        return jsonify({"error": "Unknown import job."}), 404
+    return jsonify(job.to_dict())
@@ -0,0 +1,372 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+from app.services import data_version, metrics
+from app.services.db import connect
+
+# sql: every analytics section queries Postgres (dashboard_service.SOURCES).
+# memory: sections are answered from an in-process columnar replica of the
+# orders table, loaded once and kept current with each import.
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "sql").lower()
+# Rows fetched per round trip while the replica is loaded.
+ANALYTICS_LOAD_CHUNK_ROWS = int(os.getenv("ANALYTICS_LOAD_CHUNK_ROWS", "200000"))
+# Decimal places of unit_price kept exactly; revenue is held as integer units of 10^-scale.
+ANALYTICS_MAX_SCALE = 6
+
+NO_DATE = np.iinfo(np.int32).min
+# Same bands and the same ELSE branch (unknown and under-18 ages too) as the SQL source.
+AGE_EDGES = (18, 26, 36, 46, 61)
+AGE_GROUPS = ('60+', '18-25', '26-35', '36-45', '46-60', '60+')
+
+PRICE_SCALE_SQL = "SELECT COALESCE(MAX(scale(unit_price)), 0) FROM orders {where_clause}"
+
+# Revenue comes back as an exact integer number of 10^-scale units.
+ORDERS_SQL = """
+    SELECT
+        customer_id,
+        product_id,
+        (last_purchase_date - DATE '1970-01-01') AS day,
+        ROUND(unit_price * quantity * :factor)::bigint AS revenue,
+        quantity,
+        subscription_status = 'cancelled' AS cancelled
+    FROM orders
+    {where_clause}
+"""
+
+CUSTOMERS_SQL = "SELECT customer_id, age FROM customers {where_clause}"
+
+PRODUCTS_SQL = "SELECT product_id, product_name, category FROM products {where_clause}"
+
+SUPPORTED_SOURCES = ('order_totals', 'daily_totals', 'sales_by_age', 'top_products')
+
+
+def is_enabled():
+    return ANALYTICS_ENGINE == 'memory'
+
+
+def _read(connection, sql_query, ids=None, column='customer_id', params=None, chunksize=None):
+    """Reads a replica query, optionally restricted to ids of column."""
+    params = dict(params or {})
+    if ids is None:
+        statement = text(sql_query.format(where_clause=''))
+    else:
+        statement = text(sql_query.format(where_clause=f"WHERE {column} IN :ids")).bindparams(
+            bindparam('ids', expanding=True))
+        params['ids'] = list(ids)
+    if chunksize is None:
+        return pd.read_sql(statement, connection, params=params)
+    return pd.read_sql(statement, connection.execution_options(stream_results=True),
+                       params=params, chunksize=chunksize)
+
+
+def _price_scale(connection, customer_ids=None):
+    sql_query = PRICE_SCALE_SQL.format(
+        where_clause='WHERE customer_id IN :ids' if customer_ids is not None else '')
+    statement = text(sql_query)
+    params = {}
+    if customer_ids is not None:
+        statement = statement.bindparams(bindparam('ids', expanding=True))
+        params['ids'] = list(customer_ids)
+    return min(int(connection.execute(statement, params).scalar()), ANALYTICS_MAX_SCALE)
+
+
+class OrderColumns:
+    """Orders as parallel NumPy arrays, one entry per order row.
+
+    customer and product are codes into the replica's dictionaries (-1 when
+    the order has none), day counts days since 1970-01-01 (NO_DATE when
+    missing) and revenue is unit_price * quantity in integer 10^-scale units
+    held in float64, so sums are exact below 2^53 units.
+    """
+
+    def __init__(self, customer, product, day, revenue, quantity, cancelled):
+        self.customer = customer
+        self.product = product
+        self.day = day
+        self.revenue = revenue
+        self.quantity = quantity
+        self.cancelled = cancelled
+
+    def __len__(self):
+        return len(self.customer)
+
+    @classmethod
+    def from_frame(cls, df, customer_index, product_index):
+        return cls(
+            customer_index.get_indexer(df['customer_id']).astype(np.int32),
+            product_index.get_indexer(df['product_id']).astype(np.int32),
+            pd.to_numeric(df['day']).fillna(NO_DATE).to_numpy(dtype=np.int32),
+            pd.to_numeric(df['revenue']).fillna(0).to_numpy(dtype=np.float64),
+            pd.to_numeric(df['quantity']).fillna(0).to_numpy(dtype=np.int64),
+            df['cancelled'].eq(True).to_numpy(dtype=bool),
+        )
+
+    @classmethod
+    def concat(cls, parts):
+        fields = ('customer', 'product', 'day', 'revenue', 'quantity', 'cancelled')
+        return cls(*[np.concatenate([getattr(part, field) for part in parts]) for field in fields])
+
+    def take(self, mask):
+        return OrderColumns(self.customer[mask], self.product[mask], self.day[mask],
+                            self.revenue[mask], self.quantity[mask], self.cancelled[mask])
+
+
+class OrdersReplica:
+    """Columnar copy of orders joined to customer ages and product names at one data version.
+
+    Ids and categories are dictionary-encoded: customer and product ids map
+    to positions in pd.Index dictionaries, and products map to a (name,
+    category) group, the key the top_products source groups by. A replica is
+    read-only once built; an import produces a new one that shares the
+    dictionaries' unchanged parts. Sources are computed with np.bincount on
+    first use and kept, so later requests at the same version cost nothing.
+    """
+
+    def __init__(self, data_version, orders, customer_index, ages, product_index, product_groups, groups, scale):
+        # Database watermark (services.data_version) the replica reflects.
+        self.data_version = data_version
+        self.orders = orders
+        self.customer_index = customer_index
+        self.ages = ages
+        self.product_index = product_index
+        self.product_groups = product_groups
+        # (product_name, category) per group code.
+        self.groups = groups
+        self.scale = scale
+        self._sources = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def _money(self, units):
+        # Integer units divided once, so the float matches what Postgres' NUMERIC sum parses to.
+        value = float(units) / 10 ** self.scale
+        return int(round(value)) if self.scale == 0 else value
+
+    def order_totals(self):
+        orders = self.orders
+        return {
+            'total_revenue': self._money(orders.revenue.sum()),
+            # order_id is the primary key, so distinct orders and entries are the same count.
+            'total_orders': len(orders),
+            'total_entries': len(orders),
+            'cancelled_count': int(orders.cancelled.sum()),
+        }
+
+    def daily_totals(self):
+        orders = self.orders
+        dated = orders.day != NO_DATE
+        if not dated.any():
+            return []
+        days = orders.day[dated]
+        first = int(days.min())
+        # Day offsets are small integers, so one bincount replaces sorting every row.
+        offsets = days - first
+        rows = np.bincount(offsets)
+        revenue = np.bincount(offsets, weights=orders.revenue[dated])
+        quantity = np.bincount(offsets, weights=orders.quantity[dated])
+        present = np.flatnonzero(rows)
+        dates = np.datetime_as_string((present + first).astype('datetime64[D]'))
+        return [[date, self._money(revenue[i]), int(quantity[i])] for date, i in zip(dates.tolist(), present)]
+
+    def sales_by_age(self):
+        orders = self.orders
+        known = orders.customer >= 0
+        # Band each customer once, then look the bands up per order.
+        bands = np.where(np.isnan(self.ages), 0, np.digitize(np.nan_to_num(self.ages), AGE_EDGES))
+        customer_groups = np.asarray([AGE_GROUPS.index(group) for group in AGE_GROUPS], dtype=np.int8)[bands]
+        groups = customer_groups[orders.customer[known]]
+        rows = np.bincount(groups, minlength=len(AGE_GROUPS))
+        totals = np.bincount(groups, weights=orders.quantity[known], minlength=len(AGE_GROUPS))
+        present = np.flatnonzero(rows)
+        order = present[np.argsort(-totals[present], kind='stable')]
+        return [{'age_group': AGE_GROUPS[i], 'total_sales': int(totals[i])} for i in order]
+
+    def top_products(self, limit=10):
+        orders = self.orders
+        known = orders.product >= 0
+        groups = self.product_groups[orders.product[known]]
+        present = np.bincount(groups, minlength=len(self.groups)) > 0
+        totals = np.bincount(groups, weights=orders.revenue[known], minlength=len(self.groups))
+        candidates = np.flatnonzero(present)
+        top = candidates[np.argsort(-totals[candidates], kind='stable')[:limit]]
+        return [
+            {'product_name': self.groups[i][0], 'category': self.groups[i][1], 'total_sales': self._money(totals[i])}
+            for i in top
+        ]
+
+    def sources(self, names):
+        """{name: value} in the shape dashboard_service's SQL sources return."""
+        result = {}
+        for name in names:
+            if name not in self._sources:
+                self._sources[name] = getattr(self, name)()
+            result[name] = self._sources[name]
+        return result
+
+
+def _group_products(products, groups=None, group_codes=None):
+    """Group code of each product row by (product_name, category), extending groups."""
+    groups = list(groups or [])
+    group_codes = dict(group_codes or {})
+    codes = np.empty(len(products), dtype=np.int32)
+    names = products['product_name'].astype(object).where(products['product_name'].notna(), None)
+    categories = products['category'].astype(object).where(products['category'].notna(), None)
+    for i, key in enumerate(zip(names, categories)):
+        if key not in group_codes:
+            group_codes[key] = len(groups)
+            groups.append(key)
+        codes[i] = group_codes[key]
+    return codes, groups
+
+
+def load_replica():
+    """Reads orders, customer ages and products into a new replica."""
+    with connect(statement_timeout_ms=0, read_only=True) as connection:
+        # Read where the data comes from (a replica may be behind the primary) and before
+        # loading: a concurrent import makes the replica look older, never newer.
+        watermark = data_version.read(connection)[0]
+        scale = _price_scale(connection)
+        customers = _read(connection, CUSTOMERS_SQL)
+        products = _read(connection, PRODUCTS_SQL)
+        customer_index = pd.Index(customers['customer_id'])
+        product_index = pd.Index(products['product_id'])
+        parts = [
+            OrderColumns.from_frame(chunk, customer_index, product_index)
+            for chunk in _read(connection, ORDERS_SQL, params={'factor': 10 ** scale},
+                               chunksize=ANALYTICS_LOAD_CHUNK_ROWS)
+        ]
+    product_groups, groups = _group_products(products)
+    orders = OrderColumns.concat(parts) if parts else OrderColumns.from_frame(
+        pd.DataFrame(columns=['customer_id', 'product_id', 'day', 'revenue', 'quantity', 'cancelled']),
+        customer_index, product_index)
+    ages = pd.to_numeric(customers['age']).to_numpy(dtype=np.float64)
+    return OrdersReplica(watermark, orders, customer_index, ages, product_index, product_groups, groups, scale)
+
+
+def _with_customers_replaced(replica, customer_ids, new_data_version):
+    """A new replica whose orders of customer_ids are re-read; the rest is carried over.
+
+    Returns None when the connection has not seen new_data_version yet or the
+    new rows need more price precision than the replica holds, in which case
+    the caller reloads it in full.
+    """
+    with connect(statement_timeout_ms=0, read_only=True) as connection:
+        if data_version.read(connection)[0] < new_data_version:
+            return None
+        if _price_scale(connection, customer_ids) > replica.scale:
+            return None
+        customer_index, ages = replica.customer_index, replica.ages
+        new_customers = [c for c in customer_ids if c not in customer_index]
+        if new_customers:
+            customers = _read(connection, CUSTOMERS_SQL, new_customers)
+            customer_index = customer_index.append(pd.Index(customers['customer_id']))
+            ages = np.concatenate([ages, pd.to_numeric(customers['age']).to_numpy(dtype=np.float64)])
+        rows = _read(connection, ORDERS_SQL, customer_ids, params={'factor': 10 ** replica.scale})
+
+        product_index, product_groups, groups = replica.product_index, replica.product_groups, replica.groups
+        new_products = [p for p in rows['product_id'].dropna().unique() if p not in product_index]
+        if new_products:
+            products = _read(connection, PRODUCTS_SQL, new_products, column='product_id')
+            codes, groups = _group_products(products, groups, {key: i for i, key in enumerate(groups)})
+            product_index = product_index.append(pd.Index(products['product_id']))
+            product_groups = np.concatenate([product_groups, codes])
+
+    changed = customer_index.get_indexer(list(customer_ids))
+    kept = replica.orders.take(~np.isin(replica.orders.customer, changed[changed >= 0]))
+    orders = OrderColumns.concat([kept, OrderColumns.from_frame(rows, customer_index, product_index)])
+    return OrdersReplica(new_data_version, orders, customer_index, ages, product_index, product_groups,
+                         groups, replica.scale)
+
+
+_replica = None
+_build_lock = threading.Lock()
+
+
+def _publish(replica):
+    global _replica
+    # A single reference assignment: readers see either the old or the new replica.
+    _replica = replica
+
+
+def _catch_up(replica):
+    """Brings replica to the current watermark, re-reading only customers changed since it."""
+    if replica is None:
+        return load_replica()
+    with connect(read_only=True) as connection:
+        watermark = data_version.read(connection)[0]
+        if replica.data_version >= watermark:
+            # Nothing newer where reads go (e.g. a lagging database replica).
+            return replica
+        customer_ids = data_version.changed_customers(connection, replica.data_version)
+    updated = _with_customers_replaced(replica, customer_ids, watermark) if customer_ids else None
+    return updated if updated is not None else load_replica()
+
+
+def get_replica():
+    """Returns the replica at the current data version, loading it on first use.
+
+    A replica behind the database watermark (an import committed by another
+    worker) catches up first, so responses always match their ETag.
+    """
+    replica = _replica
+    stale = replica is None or replica.data_version < data_version.current()[0]
+    if stale:
+        with _build_lock:
+            if _replica is None or _replica.data_version < data_version.current()[0]:
+                _publish(_catch_up(_replica))
+            replica = _replica
+    metrics.record_cache('analytics_replica', not stale)
+    return replica
+
+
+def refresh_replica():
+    """Reloads the replica from the database and swaps it in atomically."""
+    with _build_lock:
+        replica = load_replica()
+        _publish(replica)
+    return replica
+
+
+def apply_customer_updates(customer_ids, new_data_version=None):
+    """Re-reads the orders of the given customers after an import.
+
+    Only loaded replicas are updated; one that missed an earlier version
+    catches up through changed_customers instead. Does nothing when the
+    engine is disabled.
+    """
+    if not is_enabled() or not customer_ids or _replica is None:
+        return _replica
+    with _build_lock:
+        current = _replica
+        if new_data_version is None or current.data_version != new_data_version - 1:
+            replica = _catch_up(current)
+        else:
+            replica = _with_customers_replaced(current, customer_ids, new_data_version) or load_replica()
+        _publish(replica)
+    return replica
+
+
+def get_sources(names):
+    """The named dashboard sources from the replica, or None when SQL has to answer them."""
+    if not is_enabled() or any(name not in SUPPORTED_SOURCES for name in names):
+        return None
+    if _replica is None and _build_lock.locked():
+        # The first load is running (e.g. in warm-up); answer from SQL rather than wait for it.
+        return None
+    return get_replica().sources(names)
+
+
+def status():
+    """Size and version of the replica in this process."""
+    replica = _replica
+    return {
+        "engine": ANALYTICS_ENGINE,
+        "loaded": replica is not None,
+        "data_version": replica.data_version if replica is not None else None,
+        "orders": len(replica) if replica is not None else 0,
+        "customers": len(replica.customer_index) if replica is not None else 0,
+        "products": len(replica.product_index) if replica is not None else 0,
+    }
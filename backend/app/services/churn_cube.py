@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+# Age bands as in the sales_by_age dashboard section.
+AGE_EDGES = (18, 26, 36, 46, 61)
+AGE_BANDS = ('under 18', '18-25', '26-35', '36-45', '46-60', '60+')
+# Churn probability below 0.3 is Low Risk, below 0.7 Medium Risk, otherwise High Risk.
+SEGMENT_EDGES = (0.3, 0.7)
+SEGMENTS = ('Low Risk', 'Medium Risk', 'High Risk')
+UNKNOWN = 'Unknown'
+
+
+def risk_segments(probabilities):
+    """Segment code (index into SEGMENTS) of each churn probability."""
+    return np.digitize(probabilities, SEGMENT_EDGES)
+
+
+class ChurnCube:
+    """Customer counts and churn measures over country x gender x age band x risk segment x last-purchase month.
+
+    Built once per scoring snapshot: every customer is binned with vectorized
+    operations and summed into a dense array with np.bincount. A query only
+    touches the cube's cells (a few tens of thousands at most), so its cost
+    does not depend on the number of customers. Read-only once built.
+    """
+
+    DIMENSIONS = ('country', 'gender', 'age_band', 'segment', 'month')
+
+    def __init__(self, customers):
+        probabilities = customers['churn_probability'].to_numpy(dtype=np.float64)
+        predictions = customers['predicted_churn'].to_numpy(dtype=np.float64)
+
+        codes = {}
+        self.values = {}
+        for column in ('country', 'gender'):
+            # Hash-based factorize: sorting millions of strings (np.unique) is far slower.
+            codes[column], uniques = pd.factorize(customers[column].fillna(UNKNOWN).astype(str), sort=True)
+            self.values[column] = list(uniques)
+
+        ages = pd.to_numeric(customers['age'], errors='coerce').to_numpy(dtype=np.float64)
+        missing_age = np.isnan(ages)
+        codes['age_band'] = np.where(missing_age, len(AGE_BANDS), np.digitize(np.nan_to_num(ages), AGE_EDGES))
+        self.values['age_band'] = list(AGE_BANDS) + ([UNKNOWN] if missing_age.any() else [])
+
+        codes['segment'] = risk_segments(probabilities)
+        self.values['segment'] = list(SEGMENTS)
+
+        # Months from the first to the last purchase month, with none missing, so trends include empty months.
+        dates = pd.to_datetime(customers['last_purchase_date'], errors='coerce')
+        month_numbers = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.float64)
+        known = ~np.isnan(month_numbers)
+        first = int(month_numbers[known].min()) if known.any() else 0
+        last = int(month_numbers[known].max()) if known.any() else -1
+        self.values['month'] = [f"{n // 12:04d}-{n % 12 + 1:02d}" for n in range(first, last + 1)]
+        if not known.all():
+            self.values['month'].append(UNKNOWN)
+        codes['month'] = np.where(known, np.nan_to_num(month_numbers) - first, last - first + 1).astype(np.intp)
+
+        self.shape = tuple(len(self.values[dimension]) for dimension in self.DIMENSIONS)
+        cells = np.ravel_multi_index([codes[dimension] for dimension in self.DIMENSIONS], self.shape)
+        size = int(np.prod(self.shape))
+        self.measures = {
+            'customers': np.bincount(cells, minlength=size).reshape(self.shape),
+            'churned': np.bincount(cells, weights=predictions, minlength=size).reshape(self.shape),
+            'probability_sum': np.bincount(cells, weights=probabilities, minlength=size).reshape(self.shape),
+        }
+        for array in self.measures.values():
+            array.flags.writeable = False
+        self._positions = {dimension: {value: i for i, value in enumerate(values)} for dimension, values in self.values.items()}
+
+    def dimension_values(self):
+        """Values of every dimension, in cube order (months ascending; Unknown last when present)."""
+        return {dimension: list(values) for dimension, values in self.values.items()}
+
+    def query(self, filters=None, group_by=(), month_from=None, month_to=None, include_empty=False):
+        """Sums the measures over the matching cells, one row per combination of group_by values.
+
+        filters maps a dimension to the list of values to keep (values not in
+        the cube match nothing); month_from/month_to ('YYYY-MM') bound the month
+        dimension, inclusive. Groups without customers are dropped unless
+        include_empty is set. Raises ValueError for an unknown dimension.
+        """
+        filters = filters or {}
+        for dimension in list(filters) + list(group_by):
+            if dimension not in self.DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{dimension}'. Use one of: {', '.join(self.DIMENSIONS)}.")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("A dimension can appear in group_by only once.")
+
+        selections = {}
+        for dimension, wanted in filters.items():
+            selections[dimension] = [self._positions[dimension][v] for v in dict.fromkeys(wanted) if v in self._positions[dimension]]
+        if month_from is not None or month_to is not None:
+            months = selections.get('month', range(len(self.values['month'])))
+            selections['month'] = [
+                i for i in months
+                if self.values['month'][i] != UNKNOWN
+                and (month_from is None or self.values['month'][i] >= month_from)
+                and (month_to is None or self.values['month'][i] <= month_to)
+            ]
+
+        # Restrict every filtered axis, then sum away the axes not grouped by.
+        index = np.ix_(*[selections.get(dimension, range(size)) for dimension, size in zip(self.DIMENSIONS, self.shape)])
+        other_axes = tuple(axis for axis, dimension in enumerate(self.DIMENSIONS) if dimension not in group_by)
+        # Axes that remain are in DIMENSIONS order; put them in group_by order.
+        kept = [dimension for dimension in self.DIMENSIONS if dimension in group_by]
+        order = [kept.index(dimension) for dimension in group_by]
+        summed = {name: np.transpose(array[index].sum(axis=other_axes), order) for name, array in self.measures.items()}
+
+        counts = summed['customers'].ravel().astype(np.int64)
+        churned = summed['churned'].ravel()
+        probability_sum = summed['probability_sum'].ravel()
+        result = {}
+        if group_by:
+            grid = np.indices(summed['customers'].shape).reshape(len(group_by), -1)
+            for dimension, positions in zip(group_by, grid):
+                values = np.asarray(self.values[dimension], dtype=object)
+                result[dimension] = values[np.asarray(selections.get(dimension, range(len(values))), dtype=np.intp)[positions]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result.update({
+                'customers': counts,
+                'churned': np.rint(churned).astype(np.int64),
+                'expected_churn': probability_sum,
+                'churn_rate': np.where(counts > 0, churned / counts, 0.0),
+                'avg_probability': np.where(counts > 0, probability_sum / counts, 0.0),
+            })
+        if not include_empty:
+            keep = counts > 0
+            result = {name: column[keep] for name, column in result.items()}
+        return pd.DataFrame(result)
@@ -0,0 +1,216 @@
+import pandas as pd
+from sqlalchemy import text
+from app.services import scoring_service, analytics_engine
+from app.services.db import connect
+
+# Each source is a scalar subquery returning JSON. Every section a request
+# asks for is answered from one SELECT over the union of their sources, so
+# the whole dashboard costs one round trip and each table is scanned once
+# per source rather than once per widget.
+SOURCES = {
+    # Order-level totals shared by main_kpis and db_stats.
+    'order_totals': """
+        (SELECT json_build_object(
+            'total_revenue', COALESCE(SUM(unit_price * quantity), 0),
+            'total_orders', COUNT(DISTINCT order_id),
+            'total_entries', COUNT(*),
+            'cancelled_count', COUNT(*) FILTER (WHERE subscription_status = 'cancelled')
+        ) FROM orders)
+    """,
+    # Per-day totals from the daily_sales rollup, shared by the time-series sections.
+    'daily_totals': """
+        (SELECT COALESCE(json_agg(json_build_array(d.sale_date, d.revenue, d.quantity) ORDER BY d.sale_date), '[]')
+         FROM (
+            SELECT sale_date, SUM(revenue) AS revenue, SUM(quantity) AS quantity
+            FROM daily_sales
+            GROUP BY sale_date
+         ) d)
+    """,
+    'sales_by_age': """
+        (SELECT COALESCE(json_agg(a ORDER BY a.total_sales DESC), '[]')
+         FROM (
+            SELECT
+                CASE
+                    WHEN c.age BETWEEN 18 AND 25 THEN '18-25'
+                    WHEN c.age BETWEEN 26 AND 35 THEN '26-35'
+                    WHEN c.age BETWEEN 36 AND 45 THEN '36-45'
+                    WHEN c.age BETWEEN 46 AND 60 THEN '46-60'
+                    -- Assuming anyone 61 or older is 60+
+                    ELSE '60+'
+                END AS age_group,
+                SUM(o.quantity) AS total_sales
+            FROM customers c
+            JOIN orders o ON c.customer_id = o.customer_id
+            GROUP BY age_group
+         ) a)
+    """,
+    'top_products': """
+        (SELECT COALESCE(json_agg(t ORDER BY t.total_sales DESC), '[]')
+         FROM (
+            SELECT p.product_name, p.category, SUM(o.unit_price * o.quantity) AS total_sales
+            FROM products p
+            JOIN orders o ON p.product_id = o.product_id
+            GROUP BY p.product_name, p.category
+            ORDER BY total_sales DESC
+            LIMIT 10
+         ) t)
+    """,
+    'user_distribution': """
+        (SELECT COALESCE(json_agg(u ORDER BY u.user_count DESC), '[]')
+         FROM (
+            SELECT country, COUNT(customer_id) AS user_count
+            FROM customers
+            GROUP BY country
+         ) u)
+    """,
+}
+
+
+def _daily_frame(rows):
+    daily = pd.DataFrame(rows, columns=['sale_date', 'revenue', 'quantity'])
+    daily['sale_date'] = pd.to_datetime(daily['sale_date'])
+    daily['revenue'] = daily['revenue'].astype(float)
+    return daily.set_index('sale_date')
+
+
+def main_kpis(sources):
+    """Revenue, orders, AOV and the churn rate of the current scoring snapshot."""
+    totals = sources['order_totals']
+    total_revenue = float(totals['total_revenue'])
+    total_orders = int(totals['total_orders'])
+    average_order_value = total_revenue / total_orders if total_orders > 0 else 0
+
+    predictions = scoring_service.get_snapshot().predictions
+    churn_rate = (predictions.sum() / len(predictions)) * 100 if len(predictions) > 0 else 0
+    return {
+        "total_revenue": total_revenue,
+        "total_orders": total_orders,
+        "average_order_value": float(average_order_value),
+        "churn_rate": float(churn_rate),
+    }
+
+
+def sales_kpis(sources):
+    daily_sales = _daily_frame(sources['daily_totals'])['revenue']
+    monthly_sales = daily_sales.resample('M').sum()
+    best_month = monthly_sales.idxmax()
+    worst_month = monthly_sales.idxmin()
+    return {
+        "total_revenue": float(daily_sales.sum()),
+        "average_daily_sales": float(daily_sales.mean()),
+        "best_month": best_month.strftime('%B %Y'),
+        "best_month_sales": float(monthly_sales.max()),
+        "worst_month": worst_month.strftime('%B %Y'),
+        "worst_month_sales": float(monthly_sales.min()),
+    }
+
+
+def monthly_sales(sources):
+    daily = _daily_frame(sources['daily_totals'])
+    totals = daily['quantity'].groupby(daily.index.to_period("M")).sum()
+    return [
+        {"month": month.strftime('%B %Y'), "total_quantity": int(quantity)}
+        for month, quantity in totals.items()
+    ]
+
+
+def yearly_sales(sources):
+    daily = _daily_frame(sources['daily_totals'])
+    totals = daily['quantity'].groupby(daily.index.year).sum()
+    return [
+        {"year": int(year), "total_quantity": int(quantity)}
+        for year, quantity in totals.items()
+    ]
+
+
+def db_stats(sources):
+    totals = sources['order_totals']
+    total_count = int(totals['total_entries'])
+    cancelled_count = int(totals['cancelled_count'])
+    cancelled_percentage = (cancelled_count / total_count) * 100 if total_count > 0 else 0
+    return {
+        "total_entries": total_count,
+        "cancelled_count": cancelled_count,
+        "cancelled_percentage": round(cancelled_percentage, 2),
+    }
+
+
+def sales_by_age(sources):
+    return sources['sales_by_age']
+
+
+def top_products(sources):
+    return sources['top_products']
+
+
+def user_distribution(sources):
+    return sources['user_distribution']
+
+
+# section name -> (sources it reads, function building it)
+SECTIONS = {
+    'main_kpis': (('order_totals',), main_kpis),
+    'sales_kpis': (('daily_totals',), sales_kpis),
+    'monthly_sales': (('daily_totals',), monthly_sales),
+    'yearly_sales': (('daily_totals',), yearly_sales),
+    'sales_by_age': (('sales_by_age',), sales_by_age),
+    'db_stats': (('order_totals',), db_stats),
+    'top_products': (('top_products',), top_products),
+    'user_distribution': (('user_distribution',), user_distribution),
+}
+
+
+def fetch_sources(connection, names):
+    """Runs every requested source in a single SELECT and returns {name: parsed JSON}."""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    columns = ",\n".join(f"{SOURCES[name]} AS {name}" for name in names)
+    row = connection.execute(text(f"SELECT {columns};")).mappings().one()
+    return {name: row[name] for name in names}
+
+
+def _source_names(sections):
+    for section in sections:
+        if section not in SECTIONS:
+            raise KeyError(section)
+    return sorted({s for section in sections for s in SECTIONS[section][0]})
+
+
+def build_sections(connection, sections):
+    """Builds the named sections from one database round trip.
+
+    Raises KeyError for an unknown section name.
+    """
+    sources = fetch_sources(connection, _source_names(sections))
+    return {section: SECTIONS[section][1](sources) for section in sections}
+
+
+def build_section(connection, section):
+    return build_sections(connection, [section])[section]
+
+
+def get_sections(sections):
+    """Builds the named sections from the in-memory analytics replica, or from SQL.
+
+    Sources the replica does not hold, and every source when ANALYTICS_ENGINE
+    is not 'memory' or the replica cannot be loaded, are answered by one SQL
+    round trip. Raises KeyError for an unknown section name.
+    """
+    names = _source_names(sections)
+    sources = {}
+    replica_names = [name for name in names if name in analytics_engine.SUPPORTED_SOURCES]
+    if replica_names:
+        try:
+            sources = analytics_engine.get_sources(replica_names) or {}
+        except Exception as e:
+            print(f"Warning: Analytics replica unavailable, querying the database instead: {e}")
+    missing = [name for name in names if name not in sources]
+    if missing:
+        with connect(read_only=True) as connection:
+            sources = {**sources, **fetch_sources(connection, missing)}
+    return {section: SECTIONS[section][1](sources) for section in sections}
+
+
+def get_section(section):
+    return get_sections([section])[section]
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app.services import metrics
+from app.services.db import connect
+
+# How long a worker trusts its last read of the watermark before asking the database again.
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "2"))
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+BUMP_SQL = """
+    INSERT INTO data_version (id, version, updated_at) VALUES (1, 1, now())
+    ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1, updated_at = now()
+    RETURNING version, updated_at;
+"""
+
+# Last data version in which each customer's orders changed; lets jobs such as
+# incremental training pick up only the customers changed since their last run.
+CUSTOMER_VERSIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS customer_versions (
+        customer_id TEXT PRIMARY KEY,
+        data_version BIGINT NOT NULL
+    );
+"""
+
+MARK_CUSTOMERS_SQL = """
+    INSERT INTO customer_versions (customer_id, data_version)
+    SELECT DISTINCT customer_id, %(version)s FROM {table}
+    ON CONFLICT (customer_id) DO UPDATE SET data_version = EXCLUDED.data_version;
+"""
+
+_lock = threading.Lock()
+_cached = None
+_cached_at = 0.0
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def ensure_table(cursor):
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def bump(cursor):
+    """Advances the watermark on the caller's transaction, so it moves exactly when the data commits.
+
+    The new value is only remembered locally once the transaction is known to
+    have committed; until then readers keep seeing the old version.
+    """
+    ensure_table(cursor)
+    cursor.execute(BUMP_SQL)
+    return cursor.fetchone()
+
+
+def mark_customers(cursor, table_name, version):
+    """Stamps the customers in table_name (a customer_id column) as changed in version."""
+    from psycopg2 import sql
+
+    cursor.execute(CUSTOMER_VERSIONS_SQL)
+    cursor.execute(sql.SQL(MARK_CUSTOMERS_SQL).format(table=sql.Identifier(table_name)), {'version': version})
+
+
+def changed_customers(connection, since_version):
+    """Ids of customers whose orders changed after since_version."""
+    rows = connection.execute(
+        text("SELECT customer_id FROM customer_versions WHERE data_version > :version ORDER BY customer_id"),
+        {'version': since_version})
+    return [row[0] for row in rows]
+
+
+def remember(version, updated_at):
+    """Publishes a freshly committed watermark to this process without waiting for the TTL."""
+    global _cached, _cached_at
+    with _lock:
+        if _cached is None or version > _cached[0]:
+            _cached = (version, updated_at)
+            _cached_at = time.monotonic()
+
+
+def read(connection):
+    """(version, updated_at) as seen by connection, (0, epoch) before the first import.
+
+    Read it on the connection the data comes from (which may be a replica)
+    and before the data, so what was read is at least as new as the version.
+    """
+    if not connection.execute(text("SELECT to_regclass('data_version') IS NOT NULL")).scalar():
+        return (0, _EPOCH)
+    row = connection.execute(text("SELECT version, updated_at FROM data_version WHERE id = 1")).fetchone()
+    return (row[0], row[1]) if row else (0, _EPOCH)
+
+
+def _read():
+    with connect() as connection:
+        return read(connection)
+
+
+def current():
+    """(version, updated_at) of the data, re-read from the database at most every DATA_VERSION_TTL seconds."""
+    global _cached, _cached_at
+    if _cached is not None and time.monotonic() - _cached_at < DATA_VERSION_TTL:
+        metrics.record_cache('data_version', True)
+        return _cached
+    metrics.record_cache('data_version', False)
+    with _lock:
+        if _cached is None or time.monotonic() - _cached_at >= DATA_VERSION_TTL:
+            try:
+                _cached = _read()
+            except Exception:
+                # Table not created yet (no import since deploy): version 0.
+                if _cached is None:
+                    _cached = (0, _EPOCH)
+            _cached_at = time.monotonic()
+        return _cached
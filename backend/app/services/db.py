@@ -1,21 +1,337 @@
+import itertools
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
 from urllib.parse import quote_plus
+from app.services import metrics
 
 # Load environment variables
 load_dotenv()
 
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
-DB_PASS = quote_plus(os.getenv("DB_PASS")) 
+DB_PASS = quote_plus(os.getenv("DB_PASS"))
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
+# Pool settings. Every process (each gunicorn worker, each script) has its own pool,
+# so DB_MAX_CONNECTIONS, when set, is split across WEB_CONCURRENCY workers.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Default statement timeout for every transaction, and per-endpoint overrides as
+# "endpoint=ms,endpoint=ms" keyed by Flask endpoint name (0 disables the limit).
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_STATEMENT_TIMEOUTS = {
+    name.strip(): int(ms)
+    for name, ms in (item.split('=') for item in os.getenv("DB_STATEMENT_TIMEOUTS", "").split(',') if '=' in item)
+}
+
+# Read replicas for read-only queries (connect(read_only=True)), comma separated. Each entry is
+# host:port, sharing DB_NAME/DB_USER/DB_PASS with the primary, or a full SQLAlchemy URL.
+# Writes and everything not marked read-only stay on the primary (DB_HOST/DB_PORT).
+DB_REPLICAS = [item.strip() for item in os.getenv("DB_REPLICAS", "").split(',') if item.strip()]
+# Seconds between replica health checks.
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# A replica that has been missing the latest import for longer than this leaves the rotation.
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30"))
+# Route a read to a replica only once it has the data version this process last saw (its own
+# imports included), so reads after an import see it and responses match their ETag. Turn off
+# to let replicas within DB_REPLICA_MAX_LAG_SECONDS serve slightly older data.
+DB_READ_YOUR_WRITES = os.getenv("DB_READ_YOUR_WRITES", "true").lower() in ("1", "true", "yes")
+
 # Build SQLAlchemy connection string
 DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+
+def _replica_url(entry):
+    if '://' in entry:
+        return entry
+    host, _, port = entry.partition(':')
+    return f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{host}:{port or DB_PORT}/{DB_NAME}"
+
+
+def _pool_sizing():
+    """(pool_size, max_overflow) for this process."""
+    if DB_MAX_CONNECTIONS > 0:
+        per_worker = max(1, DB_MAX_CONNECTIONS // max(1, WEB_CONCURRENCY))
+        pool_size = min(DB_POOL_SIZE, per_worker)
+        return pool_size, max(0, per_worker - pool_size)
+    return DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            metrics.observe_pool_wait(waited)
+
+
+_pool_size, _max_overflow = _pool_sizing()
+
+
+# Session settings are applied per transaction (SET LOCAL / SET TRANSACTION) rather than as
+# startup options: transaction-mode poolers such as PgBouncer or Supabase's ignore or reject those.
+def _create_engine(url):
+    created = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=_pool_size,
+        max_overflow=_max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={
+            "connect_timeout": DB_CONNECT_TIMEOUT,
+            "application_name": os.getenv("DB_APPLICATION_NAME", "company_dashboard"),
+        },
+    )
+    metrics.instrument_engine(created)
+    return created
+
+
+class Replica:
+    """A read replica's engine and what its last health check found."""
+
+    def __init__(self, url):
+        self.engine = _create_engine(url)
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        self.healthy = False
+        self.in_recovery = None
+        # data_version watermark the replica had at the last check.
+        self.data_version = None
+        self.lag_seconds = None
+        self.checked_at = None
+        self.error = None
+        self.reads = 0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "in_recovery": self.in_recovery,
+            "data_version": self.data_version,
+            "lag_seconds": self.lag_seconds,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "reads": self.reads,
+        }
+
+
 # Create engine
-engine = create_engine(DATABASE_URL)
+engine = _create_engine(DATABASE_URL)
+replicas = [Replica(_replica_url(entry)) for entry in DB_REPLICAS]
+_checker_pid = None
+_checker_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def _after_fork():
+    global _checker_pid
+    engine.dispose(close=False)
+    for replica in replicas:
+        replica.engine.dispose(close=False)
+    # The health-check thread did not survive the fork; the child starts its own.
+    _checker_pid = None
+
+
+# A forked worker must not reuse the parent's sockets; give it a fresh pool.
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _endpoint_timeout():
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return None
+    if has_request_context() and request.endpoint:
+        return DB_STATEMENT_TIMEOUTS.get(request.endpoint)
+    return None
+
+
+def _timeout_for(statement_timeout_ms):
+    if statement_timeout_ms is None:
+        statement_timeout_ms = _endpoint_timeout()
+    if statement_timeout_ms is None:
+        statement_timeout_ms = DB_STATEMENT_TIMEOUT_MS
+    return statement_timeout_ms
+
+
+# --- Read replicas --------------------------------------------------------------
+
+def check_replica(replica):
+    """Connects to replica and compares its data_version with the primary's; updates its health."""
+    from app.services import data_version
+
+    try:
+        with replica.engine.connect() as connection:
+            in_recovery = connection.execute(text("SELECT pg_is_in_recovery()")).scalar()
+            version = data_version.read(connection)[0]
+        primary_version, updated_at = data_version.current()
+        # How long the replica has been missing the newest import (0 when it has it).
+        lag = 0.0 if version >= primary_version else max(0.0, time.time() - updated_at.timestamp())
+        replica.in_recovery = bool(in_recovery)
+        replica.data_version = version
+        replica.lag_seconds = round(lag, 3)
+        replica.error = None
+        replica.healthy = lag <= DB_REPLICA_MAX_LAG_SECONDS
+    except Exception as e:
+        replica.healthy = False
+        replica.error = str(e)
+    replica.checked_at = time.time()
+    return replica.healthy
+
+
+def _check_replicas():
+    while True:
+        for replica in replicas:
+            check_replica(replica)
+        time.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+
+def _start_replica_checks():
+    global _checker_pid
+    if _checker_pid == os.getpid():
+        return
+    with _checker_lock:
+        if _checker_pid != os.getpid():
+            _checker_pid = os.getpid()
+            threading.Thread(target=_check_replicas, name='replica-health', daemon=True).start()
+
+
+def _pick_replica():
+    """A healthy replica for a read-only query, round robin, or None to use the primary.
+
+    Replicas are unhealthy until their first check passes, so reads start on the primary.
+    """
+    if not replicas:
+        return None
+    _start_replica_checks()
+    candidates = [replica for replica in replicas if replica.healthy]
+    if DB_READ_YOUR_WRITES and candidates:
+        from app.services import data_version
+
+        required = data_version.current()[0]
+        candidates = [replica for replica in candidates if replica.data_version >= required]
+    if not candidates:
+        return None
+    return candidates[next(_round_robin) % len(candidates)]
+
+
+@contextmanager
+def connect(statement_timeout_ms=None, read_only=False):
+    """Pooled SQLAlchemy connection, the way every query should get one.
+
+    The statement timeout is, in order: the argument, the DB_STATEMENT_TIMEOUTS
+    entry for the current Flask endpoint, or DB_STATEMENT_TIMEOUT_MS. It is set
+    with SET LOCAL, so it covers the first transaction (callers that commit and
+    carry on set their own) and never leaks into the pool.
+    read_only connections go to a healthy DB_REPLICAS entry when there is one
+    (see DB_READ_YOUR_WRITES) and to the primary otherwise; only pass it for
+    queries that never write. On a replica the transaction is READ ONLY, so a
+    misrouted write fails instead of diverging from the primary.
+    """
+    statement_timeout_ms = _timeout_for(statement_timeout_ms)
+    replica = _pick_replica() if read_only else None
+    connection = None
+    if replica is not None:
+        try:
+            connection = replica.engine.connect()
+            replica.reads += 1
+        except Exception as e:
+            # Down since its last check: out of rotation until the next one passes.
+            replica.healthy = False
+            replica.error = str(e)
+            print(f"Warning: Replica {replica.name} is unavailable, reading from the primary: {e}")
+    on_replica = connection is not None
+    if read_only:
+        metrics.record_read('replica' if on_replica else 'primary')
+    if connection is None:
+        connection = engine.connect()
+    with connection:
+        if on_replica:
+            # Must come first in the transaction.
+            connection.execute(text("SET TRANSACTION READ ONLY"))
+        connection.execute(text(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}"))
+        yield connection
+
+
+def raw_connection(statement_timeout_ms=None):
+    """Pooled DBAPI (psycopg2) connection for COPY and other driver-level work.
+
+    close() returns it to the pool. The timeout (see connect) covers the first
+    transaction only, which is how the importer uses it.
+    """
+    statement_timeout_ms = _timeout_for(statement_timeout_ms)
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+    finally:
+        cursor.close()
+    return conn
+
+
+def pool_stats():
+    """Pool occupancy and checkout wait times for this process, and each read replica's last health check."""
+    pool = engine.pool
+    checkouts = pool.checkouts
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": _max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "checkouts": checkouts,
+        "checkout_timeouts": pool.checkout_timeouts,
+        "wait_seconds_avg": round(pool.wait_seconds_total / checkouts, 6) if checkouts else 0.0,
+        "wait_seconds_max": round(pool.wait_seconds_max, 6),
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+        "replicas": [replica.to_dict() for replica in replicas],
+    }
+
+
+def _pool_gauges():
+    stats = pool_stats()
+    return [
+        ('db_pool_size', 'Configured pool size for this process.', stats['pool_size']),
+        ('db_pool_checked_out', 'Connections currently checked out.', stats['checked_out']),
+        ('db_pool_overflow', 'Overflow connections currently open.', stats['overflow']),
+        ('db_pool_checkout_timeouts', 'Checkouts that timed out waiting for a connection.', stats['checkout_timeouts']),
+        ('db_replicas_healthy', 'Read replicas currently in rotation.', sum(1 for replica in replicas if replica.healthy)),
+    ]
 
 
+metrics.register_collector(_pool_gauges)
@@ -1,12 +1,8 @@
 import pandas as pd
-from decimal import Decimal
-import datetime
-from app.services.db import engine
+from sqlalchemy import text, bindparam
+from app.services.db import connect
 
-
-def get_aggregated_data():
-    """Fetches and returns aggregated customer data."""
-    sql_query = """
+AGGREGATION_SQL = """
         SELECT
             c.customer_id, c.age, c.gender, c.country,
             MIN(c.signup_date) as signup_date,
@@ -18,13 +14,28 @@ def get_aggregated_data():
             SUM(o.cancellations_count) as total_cancellations,
             MAX(o.subscription_status) as subscription_status
         FROM customers c JOIN orders o ON c.customer_id = o.customer_id
+        {where_clause}
         GROUP BY c.customer_id, c.age, c.gender, c.country;
     """
-    df = pd.read_sql(sql_query, engine)
-    return df
 
 
-def json_converter(obj):
-    if isinstance(obj, Decimal): return float(obj)
-    if isinstance(obj, (datetime.datetime, datetime.date)): return obj.isoformat()
-    raise TypeError ("Type %s not serializable" % type(obj))
\ No newline at end of file
+def get_aggregated_data(customer_ids=None, statement_timeout_ms=None):
+    """Fetches and returns aggregated customer data.
+
+    When customer_ids is given only those customers are aggregated, so the
+    cost follows the number of customers rather than the size of the table.
+    Offline jobs pass statement_timeout_ms=0 to lift the request timeout.
+    """
+    with connect(statement_timeout_ms, read_only=True) as connection:
+        return read_aggregated_data(connection, customer_ids)
+
+
+def read_aggregated_data(connection, customer_ids=None):
+    """get_aggregated_data on the caller's connection, e.g. to read data_version alongside."""
+    where_clause = "WHERE c.customer_id IN :customer_ids" if customer_ids is not None else ""
+    sql_query = AGGREGATION_SQL.format(where_clause=where_clause)
+    if customer_ids is None:
+        return pd.read_sql(sql_query, connection)
+
+    statement = text(sql_query).bindparams(bindparam('customer_ids', expanding=True))
+    return pd.read_sql(statement, connection, params={'customer_ids': list(customer_ids)})
@@ -0,0 +1,30 @@
+import time
+import pandas as pd
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+FORECAST_DAYS = 30
+
+
+def forecast_demand(dates, quantities):
+    """Forecasts the next 30 days of demand for one product's daily history.
+
+    Runs in a worker process, so it only takes plain lists. Returns the
+    forecast as an int and the seconds spent in ExponentialSmoothing.fit
+    (None for the fallback), since the worker cannot record metrics itself.
+    Falls back to the average daily rate when there are 7 or fewer sale days.
+    """
+    daily_demand = pd.Series(quantities, index=pd.to_datetime(dates)).groupby(level=0).sum().asfreq('D').fillna(0)
+
+    if len(daily_demand[daily_demand > 0]) > 7:
+        started = time.perf_counter()
+        model = ExponentialSmoothing(daily_demand, trend='add', seasonal=None).fit(smoothing_level=0.2)
+        fit_seconds = time.perf_counter() - started
+        forecast = model.forecast(FORECAST_DAYS)
+        return int(abs(round(forecast.sum()))), fit_seconds
+
+    total_units = daily_demand.sum()
+    days_with_sales = (daily_demand.index.max() - daily_demand.index.min()).days
+    if days_with_sales > 0:
+        avg_daily_rate = total_units / days_with_sales
+        return int(abs(round(avg_daily_rate * FORECAST_DAYS))), None
+    return int(total_units), None
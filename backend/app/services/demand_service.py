@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from sqlalchemy import text, bindparam
+from app.services import metrics
+from app.services.demand_model import forecast_demand
+
+DEMAND_FORECAST_WORKERS = int(os.getenv("DEMAND_FORECAST_WORKERS", str(os.cpu_count() or 1)))
+
+# Ranking plus a per-product watermark; a product whose watermark is unchanged
+# has had no new orders and its cached forecast is reused. Only products with
+# a products row are ranked, since HISTORY_SQL needs their name.
+TOP_PRODUCTS_SQL = """
+    SELECT
+        d.product_id,
+        SUM(d.quantity) AS total_quantity,
+        SUM(d.order_count) AS order_count,
+        MAX(d.sale_date) AS last_sale_date
+    FROM daily_sales d
+    JOIN products p ON p.product_id = d.product_id
+    GROUP BY d.product_id
+    ORDER BY total_quantity DESC, d.product_id
+    LIMIT :limit;
+"""
+
+HISTORY_SQL = text("""
+    SELECT d.product_id, d.sale_date, d.quantity, p.product_name
+    FROM daily_sales d
+    JOIN products p ON d.product_id = p.product_id
+    WHERE d.product_id IN :product_ids
+    ORDER BY d.product_id, d.sale_date;
+""").bindparams(bindparam('product_ids', expanding=True))
+
+_cache = {}
+_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the web process is multi-threaded, so forking it is not safe.
+                # Each worker re-imports the parent's __main__, so entry points must
+                # not build the app at import time in one (see run.py).
+                _pool = ProcessPoolExecutor(
+                    max_workers=DEMAND_FORECAST_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _pool
+
+
+def _watermark(row):
+    return (int(row.order_count), str(row.last_sale_date), int(row.total_quantity))
+
+
+def get_demand_forecasts(connection, top=5):
+    """30-day demand forecasts for the `top` best-selling products (all when top is None).
+
+    Only products with new orders since their cached forecast are refitted;
+    their histories come from one bulk query and the fits run in parallel.
+    """
+    top_products = pd.read_sql(text(TOP_PRODUCTS_SQL), connection, params={'limit': top})
+    if top_products.empty:
+        return []
+
+    with _cache_lock:
+        cached = {pid: _cache.get(pid) for pid in top_products['product_id']}
+    stale = [
+        row for row in top_products.itertuples(index=False)
+        if cached[row.product_id] is None or cached[row.product_id][0] != _watermark(row)
+    ]
+
+    metrics.record_cache('demand_forecast', True, len(top_products) - len(stale))
+    metrics.record_cache('demand_forecast', False, len(stale))
+
+    if stale:
+        history = pd.read_sql(HISTORY_SQL, connection, params={'product_ids': [row.product_id for row in stale]})
+        histories = {pid: group for pid, group in history.groupby('product_id', sort=False)}
+
+        jobs = []
+        for row in stale:
+            group = histories[row.product_id]
+            jobs.append((row, group['product_name'].iloc[0], group['sale_date'].astype(str).tolist(), group['quantity'].tolist()))
+
+        if len(jobs) == 1 or DEMAND_FORECAST_WORKERS <= 1:
+            outcomes = [forecast_demand(dates, quantities) for _, _, dates, quantities in jobs]
+        else:
+            pool = _get_pool()
+            outcomes = list(pool.map(forecast_demand, [j[2] for j in jobs], [j[3] for j in jobs]))
+        demands = [demand for demand, _ in outcomes]
+        for _, fit_seconds in outcomes:
+            if fit_seconds is not None:
+                metrics.observe_model('product_demand', 'ExponentialSmoothing.fit', fit_seconds)
+
+        with _cache_lock:
+            for (row, product_name, _, _), demand in zip(jobs, demands):
+                result = {
+                    "product_id": row.product_id,
+                    "product_name": product_name,
+                    "forecasted_demand_30_days": demand,
+                }
+                _cache[row.product_id] = (_watermark(row), result)
+                cached[row.product_id] = _cache[row.product_id]
+
+    return [cached[pid][1] for pid in top_products['product_id']]
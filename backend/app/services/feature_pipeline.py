@@ -0,0 +1,115 @@
+import datetime
+import numpy as np
+import pandas as pd
+
+REFERENCE_DATE = datetime.datetime(2025, 9, 27)
+CATEGORICAL_COLUMNS = ['gender', 'country']
+
+
+class ChurnFeatureTransformer:
+    """Fitted churn feature pipeline compiled down to plain arrays and lookups.
+
+    Turns aggregated customer records (as returned by get_aggregated_data)
+    into the model's feature matrix without get_dummies/reindex: derived
+    features are computed column-wise, missing values take training-time
+    fill values, numeric columns are scaled with the fitted scaler, and
+    categories are written through fixed category-to-column maps straight
+    into a preallocated float32 matrix. The input is never modified.
+    """
+
+    def __init__(self, numeric_columns, model_columns, fill_values, scaler, reference_date=REFERENCE_DATE):
+        self.numeric_columns = list(numeric_columns)
+        self.model_columns = list(model_columns)
+        self.fill_values = {c: float(v) for c, v in fill_values.items()}
+        self.scaler = scaler
+        self.reference_date = reference_date
+
+        position = {column: i for i, column in enumerate(self.model_columns)}
+        self.numeric_positions = np.array([position[c] for c in self.numeric_columns], dtype=np.intp)
+        self.mean = np.asarray(getattr(scaler, 'mean_', None) if scaler.with_mean else 0.0, dtype=np.float64)
+        scale = getattr(scaler, 'scale_', None) if scaler.with_std else None
+        self.scale = np.asarray(scale if scale is not None else 1.0, dtype=np.float64)
+
+        # e.g. {'country': {'India': 12, 'UK': 14, ...}}; the dropped first level maps nowhere.
+        self.category_maps = {}
+        for column in CATEGORICAL_COLUMNS:
+            prefix = column + '_'
+            self.category_maps[column] = {
+                name[len(prefix):]: i for i, name in enumerate(self.model_columns) if name.startswith(prefix)
+            }
+
+    @classmethod
+    def from_model_package(cls, model_package):
+        """Returns the package's transformer, compiling one for older packages.
+
+        Packages saved before the transformer existed carry no training-time
+        medians, so the scaler's training means are used as fill values.
+        """
+        transformer = model_package.get('transformer')
+        if transformer is None:
+            scaler = model_package['scaler']
+            fill_values = dict(zip(model_package['numeric_columns'], scaler.mean_))
+            transformer = cls(model_package['numeric_columns'], model_package['model_columns'], fill_values, scaler)
+            model_package['transformer'] = transformer
+        return transformer
+
+    def transform(self, records):
+        """Builds the float32 feature matrix for a DataFrame or dict of columns."""
+        if isinstance(records, pd.DataFrame):
+            n_rows = len(records)
+        else:
+            n_rows = len(next(iter(records.values()), []))
+        X = np.zeros((n_rows, len(self.model_columns)), dtype=np.float32)
+
+        features = self._numeric_features(records, n_rows)
+        numeric = np.empty((n_rows, len(self.numeric_columns)), dtype=np.float64)
+        for j, column in enumerate(self.numeric_columns):
+            values = features[column]
+            numeric[:, j] = np.where(np.isnan(values), self.fill_values.get(column, 0.0), values)
+        X[:, self.numeric_positions] = (numeric - self.mean) / self.scale
+
+        rows = np.arange(n_rows)
+        for column, mapping in self.category_maps.items():
+            if column not in records or not mapping:
+                continue
+            categories = list(mapping)
+            codes = pd.Categorical(_as_array(records, column, object), categories=categories).codes
+            known = codes >= 0
+            targets = np.array([mapping[c] for c in categories], dtype=np.intp)
+            X[rows[known], targets[codes[known]]] = 1.0
+        return X
+
+    def _numeric_features(self, records, n_rows):
+        def number(column):
+            if column not in records:
+                return np.full(n_rows, np.nan)
+            return pd.to_numeric(_as_array(records, column, object), errors='coerce').astype(np.float64)
+
+        def days_before_reference(column):
+            if column not in records:
+                return np.full(n_rows, np.nan)
+            dates = pd.to_datetime(_as_array(records, column, object), errors='coerce')
+            return (self.reference_date - dates).days.to_numpy(dtype=np.float64, na_value=np.nan)
+
+        features = {}
+        days_since_last_purchase = days_before_reference('last_purchase_date')
+        tenure_days = days_before_reference('signup_date')
+        features['days_since_last_purchase'] = np.where(np.isnan(days_since_last_purchase), 9999, days_since_last_purchase)
+        features['tenure_days'] = np.where(np.isnan(tenure_days), -1, tenure_days)
+
+        purchase_count = number('purchase_count')
+        total_spend = number('total_spend')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features['avg_spend_per_order'] = total_spend / np.where(purchase_count == 0, 1, purchase_count)
+            features['purchases_per_year'] = (purchase_count * 365) / (features['tenure_days'] + 1)
+
+        for column in self.numeric_columns:
+            features.setdefault(column, number(column))
+        return features
+
+
+def _as_array(records, column, dtype):
+    values = records[column]
+    if isinstance(values, pd.Series):
+        return values.to_numpy()
+    return np.asarray(values, dtype=dtype)
@@ -0,0 +1,85 @@
+import os
+import threading
+from app.services import model_store, metrics
+
+# Longest horizon served; shorter requests are slices of this one forecast.
+MAX_FORECAST_DAYS = int(os.getenv("MAX_FORECAST_DAYS", "365"))
+
+
+class ForecastCache:
+    """The longest allowed forecast of one fitted forecaster, formatted once.
+
+    State-space forecasts are deterministic, so the first n steps of the
+    MAX_FORECAST_DAYS forecast (and their confidence intervals) are exactly
+    what get_forecast(steps=n) would return.
+    """
+
+    def __init__(self, forecaster, horizon):
+        self.forecaster = forecaster
+        self.horizon = horizon
+        with metrics.time_model('sales_forecaster', 'get_forecast'):
+            forecast_results = forecaster.get_forecast(steps=horizon)
+        predicted_mean = forecast_results.predicted_mean
+        confidence_interval = forecast_results.conf_int()
+        self.dates = predicted_mean.index.strftime('%Y-%m-%d').tolist()
+        self.predicted_sales = predicted_mean.values.tolist()
+        self.confidence_lower = confidence_interval.iloc[:, 0].values.tolist()
+        self.confidence_upper = confidence_interval.iloc[:, 1].values.tolist()
+
+    def slice(self, days):
+        return {
+            "dates": self.dates[:days],
+            "predicted_sales": self.predicted_sales[:days],
+            "confidence_lower": self.confidence_lower[:days],
+            "confidence_upper": self.confidence_upper[:days],
+        }
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_forecast(days):
+    """Returns the first `days` forecast steps, or None when no forecaster is loaded.
+
+    Raises ValueError when days is outside 1..MAX_FORECAST_DAYS.
+    """
+    global _cache
+    if days < 1 or days > MAX_FORECAST_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_FORECAST_DAYS}.")
+
+    forecaster = model_store.get_sales_forecaster()
+    if forecaster is None:
+        return None
+
+    cache = _cache
+    # Keyed on the forecaster object itself: loading a new model invalidates the cache.
+    hit = cache is not None and cache.forecaster is forecaster
+    if not hit:
+        with _lock:
+            cache = _cache
+            if cache is None or cache.forecaster is not forecaster:
+                cache = ForecastCache(forecaster, MAX_FORECAST_DAYS)
+                _cache = cache
+    metrics.record_cache('sales_forecast', hit)
+    return cache.slice(days)
+
+
+def invalidate():
+    global _cache
+    _cache = None
+
+
+def _prepare_model_swap(model_version):
+    """Forecasts with a sales forecaster about to be swapped in, so its first request is a cache hit."""
+    if model_version.model is None:
+        return invalidate
+    cache = ForecastCache(model_version.model, MAX_FORECAST_DAYS)
+
+    def commit():
+        global _cache
+        _cache = cache
+    return commit
+
+
+model_store.on_swap('sales_forecaster', _prepare_model_swap)
@@ -0,0 +1,133 @@
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from app.services import model_store
+from app.services.db import connect
+
+ORDER = (1, 1, 1)
+SEASONAL_ORDER = (1, 1, 1, 7)
+MIN_TRAINING_DAYS = 14
+# Days added with fixed parameters before an update re-estimates them (warm-started).
+FORECAST_REFIT_DAYS = int(os.getenv("FORECAST_REFIT_DAYS", "28"))
+# Update the saved forecaster after every import (see import_service.refresh_derived_data).
+FORECAST_AUTO_UPDATE = os.getenv("FORECAST_AUTO_UPDATE", "true").lower() in ("1", "true", "yes")
+# pg_advisory_xact_lock key held while the saved forecaster is rewritten.
+FORECASTER_LOCK_KEY = 0x53414c4553
+
+DAILY_SALES_SQL = """
+    SELECT sale_date, SUM(revenue) AS revenue
+    FROM daily_sales
+    {where_clause}
+    GROUP BY sale_date
+"""
+
+
+def daily_sales_series(connection, completed_only=False):
+    """Daily revenue from the daily_sales rollup, one row per day (gaps are zero).
+
+    A full fit uses every day, as it always has. Updates pass completed_only
+    to leave out today, whose total is still growing: appended days are final.
+    """
+    where_clause = "WHERE sale_date < CURRENT_DATE" if completed_only else ""
+    df = pd.read_sql(text(DAILY_SALES_SQL.format(where_clause=where_clause)), connection)
+    df['sale_date'] = pd.to_datetime(df['sale_date'], errors='coerce')
+    df = df.dropna(subset=['sale_date', 'revenue'])
+    return df.groupby('sale_date')['revenue'].sum().astype(float).asfreq('D').fillna(0)
+
+
+def _model(series):
+    return SARIMAX(series, order=ORDER, seasonal_order=SEASONAL_ORDER)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _record(forecaster, series, mode, started, estimated_at, days_since_estimate):
+    through = pd.Timestamp(forecaster.model._index[-1])
+    forecaster.training = {
+        'mode': mode,
+        'updated_at': _now(),
+        'estimated_at': estimated_at,
+        'through': through.strftime('%Y-%m-%d'),
+        # Revenue up to `through`; a different total later means past days were revised.
+        'observed_total': float(series[series.index <= through].sum()),
+        'days_since_estimate': days_since_estimate,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+    return forecaster.training
+
+
+def fit(series, start_params=None):
+    """Estimates the SARIMAX forecaster on the whole series (optionally warm-started)."""
+    started = time.perf_counter()
+    forecaster = _model(series).fit(start_params=start_params, disp=False)
+    _record(forecaster, series, 'full' if start_params is None else 'refit', started, _now(), 0)
+    return forecaster
+
+
+def update(forecaster, series, refit=False):
+    """Brings a fitted forecaster up to date with series. Returns (forecaster, record).
+
+    New days at the end are appended with the parameters held fixed; only
+    they are filtered, so the cost follows the number of new days. If earlier
+    days were revised (or the forecaster predates these records) the whole
+    series is filtered again, still without estimating. Parameters are
+    re-estimated, warm-started from the current ones, once FORECAST_REFIT_DAYS
+    days were added since the last estimate, or when refit is set.
+    The given forecaster is never modified; (forecaster, None) means it is current.
+    """
+    started = time.perf_counter()
+    previous = getattr(forecaster, 'training', None) or {}
+    through = pd.Timestamp(forecaster.model._index[-1])
+    new_days = series[series.index > through]
+    observed_total = series[series.index <= through].sum()
+    revised = 'observed_total' not in previous or not np.isclose(observed_total, previous['observed_total'], rtol=1e-9, atol=0.005)
+    days_since_estimate = previous.get('days_since_estimate', 0) + len(new_days)
+
+    if refit or days_since_estimate >= FORECAST_REFIT_DAYS:
+        updated = fit(series, start_params=forecaster.params)
+        return updated, updated.training
+    if revised:
+        updated, mode = _model(series).filter(forecaster.params), 'refilter'
+    elif len(new_days):
+        updated, mode = forecaster.extend(new_days), 'extend'
+    else:
+        return forecaster, None
+    return updated, _record(updated, series, mode, started, previous.get('estimated_at'), days_since_estimate)
+
+
+def update_saved_forecaster(refit=False, serve=False):
+    """Updates the saved forecaster with the latest completed days. Returns the update record.
+
+    The served forecaster is reused when it is the saved one, so nothing is
+    unpickled. With serve, a loaded forecaster is swapped for the update in
+    this process; other processes pick the new file up through the
+    model_store watcher. An advisory lock makes concurrent updates take turns,
+    each starting from the file the last one wrote. Returns None when the
+    forecaster is current or none was trained yet.
+    """
+    with connect(statement_timeout_ms=0) as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": FORECASTER_LOCK_KEY})
+        forecaster = model_store.saved_model('sales_forecaster')
+        if forecaster is None:
+            return None
+        forecaster, record = update(forecaster, daily_sales_series(connection, completed_only=True), refit)
+        if record is None:
+            return None
+        if serve and model_store.is_loaded('sales_forecaster'):
+            model_store.publish('sales_forecaster', forecaster)
+        else:
+            model_store.save_artifact(forecaster, model_store.SALES_FORECASTER_PATH)
+    return record
+
+
+def refresh_after_import():
+    """Updates the saved forecaster after an import and serves it in this process (FORECAST_AUTO_UPDATE)."""
+    if not FORECAST_AUTO_UPDATE:
+        return None
+    return update_saved_forecaster(serve=True)
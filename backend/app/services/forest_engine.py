@@ -0,0 +1,170 @@
+import json
+import os
+import numpy as np
+
+_ARRAYS = ('feature', 'threshold', 'children', 'is_leaf', 'leaf_value', 'roots')
+_META_FILE = 'forest.json'
+
+# Upper bound on (trees x rows) evaluated at once, keeps the traversal state small.
+_BLOCK_CELLS = 1 << 21
+_STEPS_PER_COMPACTION = 4
+
+
+class FlatForest:
+    """A trained random forest flattened into contiguous NumPy node arrays.
+
+    All trees live in one set of arrays: roots[t] is the first node of tree t,
+    children[2 * n] and children[2 * n + 1] are node n's left and right child,
+    leaves point to themselves and carry normalized class probabilities in
+    leaf_value. A batch is evaluated for every tree at once, one tree level
+    per step, instead of sklearn's per-tree Python loop. That wins on small
+    batches only; above a few hundred rows sklearn's compiled traversal is
+    faster (see ml_service.FOREST_MAX_BATCH).
+    """
+
+    def __init__(self, feature, threshold, children, is_leaf, leaf_value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        # Everything the traversal reads is stored, so a memory-mapped forest builds nothing per process.
+        self.children = children
+        self.is_leaf = is_leaf
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flattens a fitted RandomForestClassifier (or any forest of decision trees)."""
+        features, thresholds, children, leaves, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            # Leaves loop back to themselves so the traversal needs no branch.
+            pairs = np.empty(2 * n_nodes, dtype=np.int32)
+            pairs[0::2] = np.where(is_leaf, node_ids, tree.children_left) + offset
+            pairs[1::2] = np.where(is_leaf, node_ids, tree.children_right) + offset
+            children.append(pairs)
+            leaves.append(is_leaf)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(children), np.concatenate(leaves),
+            np.concatenate(values), np.asarray(roots, dtype=np.int32),
+            max_depth, model.classes_,
+        )
+
+    def predict_proba(self, X):
+        """Class probabilities averaged over all trees, like sklearn's predict_proba."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        proba = np.empty((n_rows, self.leaf_value.shape[1]), dtype=np.float64)
+        block = max(1, _BLOCK_CELLS // max(self.n_trees, 1))
+        for start in range(0, n_rows, block):
+            X_block = X[start:start + block]
+            leaves = self._leaves(X_block).reshape(self.n_trees, len(X_block))
+            # Reducing over the tree axis adds trees in order, matching sklearn's accumulation.
+            proba[start:start + len(X_block)] = self.leaf_value[leaves].sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict_scores(self, X):
+        """Returns (probability of the last class, predicted labels) from one pass."""
+        proba = self.predict_proba(X)
+        return proba[:, -1], self.classes_.take(np.argmax(proba, axis=1))
+
+    def _leaves(self, X):
+        """Leaf node of every (tree, row) cell, tree-major."""
+        n_rows, n_features = X.shape
+        X_flat = X.reshape(-1)
+        is_leaf, children = self.is_leaf, self.children
+
+        leaves = np.repeat(self.roots, n_rows)
+        offsets = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+        active = np.flatnonzero(~is_leaf[leaves])
+        nodes = leaves[active]
+        offsets = offsets[active]
+        while active.size:
+            # Leaves loop back to themselves, so a few unconditional steps are safe;
+            # compacting only between them keeps the work close to the real path lengths.
+            for _ in range(_STEPS_PER_COMPACTION):
+                # float32 features against float64 thresholds, as sklearn compares them
+                go_right = np.take(X_flat, np.take(self.feature, nodes) + offsets) > np.take(self.threshold, nodes)
+                nodes = np.take(children, 2 * nodes + go_right)
+            done = np.take(is_leaf, nodes)
+            leaves[active[done]] = nodes[done]
+            pending = np.flatnonzero(~done)
+            active, nodes, offsets = active[pending], nodes[pending], offsets[pending]
+        return leaves
+
+    def save(self, directory):
+        """Writes one .npy file per array so the forest can be memory-mapped."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, _META_FILE), 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'classes': self.classes_.tolist()}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Loads a saved forest; with mmap_mode='r' all processes share the page cache copy.
+
+        Raises FileNotFoundError for an export missing an array (e.g. one
+        written before children and is_leaf were stored).
+        """
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in _ARRAYS}
+        with open(os.path.join(directory, _META_FILE)) as f:
+            meta = json.load(f)
+        return cls(max_depth=meta['max_depth'], classes=meta['classes'], **arrays)
+
+
+def check_parity(model, forest, X, tolerance=1e-9):
+    """Compares the flattened forest against sklearn on X.
+
+    Returns a dict with the largest probability difference and whether all
+    labels agree; 'ok' is True when both are within tolerance.
+    """
+    expected = model.predict_proba(X)
+    actual = forest.predict_proba(X)
+    max_abs_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    labels_match = bool(np.array_equal(model.predict(X), forest.classes_.take(np.argmax(actual, axis=1))))
+    return {'max_abs_diff': max_abs_diff, 'labels_match': labels_match, 'ok': labels_match and max_abs_diff <= tolerance}
+
+
+if __name__ == '__main__':
+    # Usage: python -m app.services.forest_engine [churn_model.pkl] [churn_forest]
+    import sys
+    import joblib
+
+    package_path = sys.argv[1] if len(sys.argv) > 1 else 'churn_model.pkl'
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else 'churn_forest'
+
+    model = joblib.load(package_path)['model']
+    forest = FlatForest.from_sklearn(model)
+    probe = np.random.default_rng(0).normal(size=(1000, model.n_features_in_)).astype(np.float32)
+    parity = check_parity(model, forest, probe)
+    print(f"Parity check: {parity}")
+    if not parity['ok']:
+        sys.exit("Error: flattened forest does not match the sklearn model; nothing was written.")
+    forest.save(output_dir)
+    print(f"Success: {forest.n_trees} trees exported to '{output_dir}'. Set CHURN_FOREST_DIR={output_dir} to memory-map it.")
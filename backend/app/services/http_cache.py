@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import math
+import os
+import time
+from datetime import datetime, timezone
+from flask import g, request, make_response
+from app.services import data_version, model_store, metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+
+def current_validators():
+    """(etag, last_modified) for the data and models this process serves right now.
+
+    HTTP dates have whole seconds, so last_modified is rounded up to the end
+    of the second the data last changed in.
+    """
+    version, updated_at = data_version.current()
+    model_token, model_mtime = model_store.model_version()
+    etag = hashlib.sha1(f"{version}:{model_token}".encode()).hexdigest()[:20]
+    modified = max(updated_at.timestamp(), model_mtime)
+    return etag, datetime.fromtimestamp(math.floor(modified) + 1, tz=timezone.utc)
+
+
+def _settled(last_modified):
+    """True once no change this process has yet to see can share last_modified's second.
+
+    Before that, an import in the same second (or one the DATA_VERSION_TTL
+    cache has not shown yet) would get the same Last-Modified, and clients
+    revalidating with it would be told their stale copy is current.
+    """
+    return time.time() >= last_modified.timestamp() + data_version.DATA_VERSION_TTL
+
+
+def _not_modified(validators):
+    # The ETag names the exact version, so If-Modified-Since only counts without it.
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(validators[0])
+    if request.if_modified_since:
+        return _settled(validators[1]) and validators[1] <= request.if_modified_since
+    return False
+
+
+def _applies():
+    return request.blueprint in _blueprints
+
+
+def _check_conditional():
+    """Answers a matching If-None-Match / If-Modified-Since with 304 before the view runs."""
+    if request.method not in ('GET', 'HEAD') or not _applies():
+        return None
+    g.http_validators = current_validators()
+    not_modified = _not_modified(g.http_validators)
+    metrics.record_cache('http_conditional', not_modified)
+    if not_modified:
+        response = make_response('', 304)
+        _set_validators(response, g.http_validators)
+        return response
+    return None
+
+
+def _set_validators(response, validators):
+    etag, last_modified = validators
+    # Weak: the compressed and plain bodies are the same resource.
+    response.set_etag(etag, weak=True)
+    if _settled(last_modified):
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+
+
+def _compress(response):
+    if (response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.status_code != 200):
+        return
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return
+    response.vary.add('Accept-Encoding')
+
+
+def _finish(response):
+    if not _applies():
+        return response
+    validators = g.pop('http_validators', None)
+    if validators is not None and response.status_code == 200:
+        _set_validators(response, validators)
+    _compress(response)
+    return response
+
+
+_blueprints = set()
+
+
+def init_app(app, blueprint_names):
+    """Adds ETag/Last-Modified revalidation and response compression to the named blueprints.
+
+    The validators come from the data_version watermark and the loaded model
+    files, so a 304 costs no query and no model call.
+    """
+    _blueprints.update(blueprint_names)
+    if HTTP_CACHE_ENABLED:
+        app.before_request(_check_conditional)
+    app.after_request(_finish)
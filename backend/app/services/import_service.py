@@ -0,0 +1,338 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text, bindparam
+from data_importer import import_file
+from app.services import scoring_service, forecaster_training, analytics_engine
+from app.services.db import connect, raw_connection
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+IMPORT_MAX_PENDING = int(os.getenv("IMPORT_MAX_PENDING", "10"))
+IMPORT_JOB_HISTORY = int(os.getenv("IMPORT_JOB_HISTORY", "100"))
+IMPORT_UPLOAD_DIR = os.getenv("IMPORT_UPLOAD_DIR") or tempfile.gettempdir()
+# Seconds between progress writes to import_jobs while a chunked import runs.
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "1"))
+# A queued or running job whose worker has not checked in for this long is reported
+# as failed (the worker died) and no longer counts against IMPORT_MAX_PENDING.
+IMPORT_JOB_STALE_SECONDS = float(os.getenv("IMPORT_JOB_STALE_SECONDS", "60"))
+# pg_advisory_xact_lock key that makes the IMPORT_MAX_PENDING check and the insert atomic.
+IMPORT_QUEUE_LOCK_KEY = 0x494d504f5254
+
+# Jobs live in the database so every worker can report them: a job runs in
+# the worker that received the upload, but status polls may land anywhere.
+JOBS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        job_id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        status TEXT NOT NULL,
+        phase TEXT NOT NULL,
+        rows_parsed BIGINT NOT NULL DEFAULT 0,
+        rows_inserted BIGINT NOT NULL DEFAULT 0,
+        customers_updated BIGINT NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at DOUBLE PRECISION NOT NULL,
+        started_at DOUBLE PRECISION,
+        finished_at DOUBLE PRECISION,
+        worker TEXT,
+        heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+JOB_COLUMNS = ['job_id', 'filename', 'status', 'phase', 'rows_parsed', 'rows_inserted', 'customers_updated',
+               'error', 'created_at', 'started_at', 'finished_at']
+
+# Unfinished jobs whose worker stopped checking in read as failed.
+SELECT_JOBS_SQL = f"""
+    SELECT {', '.join(JOB_COLUMNS)},
+           status IN ('queued', 'running')
+               AND heartbeat_at < now() - make_interval(secs => :stale_seconds) AS stale
+    FROM import_jobs
+"""
+
+PENDING_COUNT_SQL = """
+    SELECT COUNT(*) FROM import_jobs
+    WHERE status IN ('queued', 'running') AND heartbeat_at >= now() - make_interval(secs => :stale_seconds)
+"""
+
+PRUNE_SQL = """
+    DELETE FROM import_jobs WHERE job_id IN (
+        SELECT job_id FROM import_jobs WHERE finished_at IS NOT NULL
+        ORDER BY created_at DESC OFFSET :keep
+    )
+"""
+
+
+class QueueFullError(Exception):
+    """Raised when IMPORT_MAX_PENDING jobs are already queued or running."""
+
+
+class ImportJob:
+    """Progress of one background import, mirrored to the import_jobs table as it runs."""
+
+    def __init__(self, filename, path=None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.status = 'queued'
+        self.phase = 'queued'
+        self.rows_parsed = 0
+        self.rows_inserted = 0
+        self.customers_updated = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(row['filename'])
+        job.id = row['job_id']
+        for column in JOB_COLUMNS[2:]:
+            setattr(job, column, row[column])
+        if row['stale']:
+            job.status = 'failed'
+            job.phase = 'done'
+            job.error = job.error or "The worker running this import stopped before it finished."
+        return job
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "phase": self.phase,
+            "rows_parsed": self.rows_parsed,
+            "rows_inserted": self.rows_inserted,
+            "customers_updated": self.customers_updated,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows_parsed / elapsed, 1) if elapsed > 0 else 0.0,
+            "error": self.error,
+        }
+
+    def save(self, connection=None):
+        """Writes the job's current state to import_jobs and refreshes its heartbeat."""
+        values = {column: getattr(self, column) for column in JOB_COLUMNS[1:]}
+        values.update(job_id=self.id, worker=_WORKER)
+        statement = text(f"""
+            INSERT INTO import_jobs ({', '.join(JOB_COLUMNS)}, worker, heartbeat_at)
+            VALUES ({', '.join(':' + column for column in JOB_COLUMNS)}, :worker, now())
+            ON CONFLICT (job_id) DO UPDATE SET
+                {', '.join(f'{column} = EXCLUDED.{column}' for column in JOB_COLUMNS[1:])},
+                heartbeat_at = now()
+        """)
+        if connection is not None:
+            connection.execute(statement, values)
+            return
+        with connect() as connection:
+            connection.execute(statement, values)
+            connection.commit()
+
+
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+# Jobs queued or running in this worker, for the heartbeat.
+_local_jobs = {}
+_jobs_lock = threading.Lock()
+_table_ready = False
+_heartbeat_pid = None
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+
+
+def ensure_table(connection):
+    """Creates import_jobs if needed; callers hold IMPORT_QUEUE_LOCK_KEY so workers do not race."""
+    global _table_ready
+    if not _table_ready:
+        connection.execute(text(JOBS_TABLE_SQL))
+        _table_ready = True
+
+
+def _table_exists(connection):
+    global _table_ready
+    if not _table_ready:
+        _table_ready = connection.execute(text("SELECT to_regclass('import_jobs') IS NOT NULL")).scalar()
+    return _table_ready
+
+
+def _heartbeat():
+    while True:
+        time.sleep(IMPORT_JOB_STALE_SECONDS / 4)
+        with _jobs_lock:
+            job_ids = list(_local_jobs)
+        if not job_ids:
+            continue
+        try:
+            with connect() as connection:
+                connection.execute(
+                    text("UPDATE import_jobs SET heartbeat_at = now() WHERE job_id IN :job_ids").bindparams(
+                        bindparam('job_ids', expanding=True)),
+                    {'job_ids': job_ids})
+                connection.commit()
+        except Exception as e:
+            print(f"Warning: Could not record the import heartbeat: {e}")
+
+
+def _start_heartbeat():
+    global _heartbeat_pid
+    with _jobs_lock:
+        if _heartbeat_pid == os.getpid():
+            return
+        _heartbeat_pid = os.getpid()
+    threading.Thread(target=_heartbeat, name='import-heartbeat', daemon=True).start()
+
+
+def refresh_derived_data(customer_ids, new_data_version):
+    """Brings caches and models built from the database up to date after an import.
+
+    daily_sales and the data_version watermark are updated inside the import
+    transaction and demand forecasts are keyed on per-product watermarks, so
+    scoring, the analytics replica and the sales forecaster are what need a push here.
+    """
+    try:
+        scoring_service.apply_customer_updates(customer_ids, new_data_version)
+    except Exception as e:
+        # The import is committed; the snapshot is now behind data_version, so the
+        # next get_snapshot rebuilds it.
+        print(f"Warning: Could not update churn scores: {e}")
+    try:
+        analytics_engine.apply_customer_updates(customer_ids, new_data_version)
+    except Exception as e:
+        # Requests catch the replica up (or fall back to SQL) on their own.
+        print(f"Warning: Could not update the analytics replica: {e}")
+    try:
+        record = forecaster_training.refresh_after_import()
+        if record is not None:
+            print(f"Success: Sales forecaster updated ({record['mode']}) through {record['through']} in {record['seconds']}s.")
+    except Exception as e:
+        # The import itself is committed; the next import or a train_forcaster.py run catches up.
+        print(f"Warning: Could not update the sales forecaster: {e}")
+
+
+def _save_quietly(job):
+    # A lost progress write only delays what pollers see; the import goes on.
+    try:
+        job.save()
+    except Exception as e:
+        print(f"Warning: Could not record progress of import {job.id}: {e}")
+
+
+def _run(job):
+    job.status = 'running'
+    job.phase = 'parsing'
+    job.started_at = time.time()
+    _save_quietly(job)
+    last_saved = time.monotonic()
+
+    def progress(phase, rows_parsed):
+        nonlocal last_saved
+        changed_phase = phase != job.phase
+        job.phase = phase
+        job.rows_parsed = rows_parsed
+        if changed_phase or time.monotonic() - last_saved >= IMPORT_PROGRESS_INTERVAL:
+            _save_quietly(job)
+            last_saved = time.monotonic()
+
+    conn = None
+    try:
+        # Bulk loads are bounded by the job queue, not by the web statement timeout.
+        conn = raw_connection(statement_timeout_ms=0)
+        with open(job.path, 'rb') as file:
+            result = import_file(conn, file, job.filename, progress=progress)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        job.rows_parsed = result['rows_processed']
+        job.rows_inserted = result['rows_inserted']
+
+        job.phase = 'refreshing'
+        _save_quietly(job)
+        refresh_derived_data(result['customer_ids'], result['data_version'])
+        job.customers_updated = len(result['customer_ids'])
+        job.status = 'succeeded'
+        print(f"Import {job.id} finished: {job.rows_parsed} rows parsed, {job.rows_inserted} orders inserted.")
+    except Exception as e:
+        job.error = str(e)
+        job.status = 'failed'
+        print(f"Import {job.id} failed: {e}")
+    finally:
+        job.phase = 'done'
+        job.finished_at = time.time()
+        if conn is not None:
+            conn.close()
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+        _save_quietly(job)
+        with _jobs_lock:
+            _local_jobs.pop(job.id, None)
+
+
+def submit(file_storage):
+    """Saves an uploaded file to disk and queues it for import. Returns the job.
+
+    The upload is spooled to IMPORT_UPLOAD_DIR first because the request's
+    stream is gone once the response is sent. The job runs in this worker,
+    but IMPORT_MAX_PENDING counts the jobs of every worker, and any worker
+    can report the job's progress.
+    """
+    suffix = os.path.splitext(file_storage.filename)[1].lower()
+    fd, path = tempfile.mkstemp(prefix='import_', suffix=suffix, dir=IMPORT_UPLOAD_DIR)
+    os.close(fd)
+    job = ImportJob(file_storage.filename, path)
+    try:
+        with connect() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": IMPORT_QUEUE_LOCK_KEY})
+            ensure_table(connection)
+            pending = connection.execute(text(PENDING_COUNT_SQL), {'stale_seconds': IMPORT_JOB_STALE_SECONDS}).scalar()
+            if pending >= IMPORT_MAX_PENDING:
+                raise QueueFullError(f"{IMPORT_MAX_PENDING} imports are already pending; try again later.")
+            job.save(connection)
+            connection.execute(text(PRUNE_SQL), {'keep': IMPORT_JOB_HISTORY})
+            connection.commit()
+    except Exception:
+        os.remove(path)
+        raise
+
+    try:
+        file_storage.save(path)
+    except Exception as e:
+        os.remove(path)
+        job.status, job.phase, job.error, job.finished_at = 'failed', 'done', str(e), time.time()
+        _save_quietly(job)
+        raise
+    with _jobs_lock:
+        _local_jobs[job.id] = job
+    _start_heartbeat()
+    _executor.submit(_run, job)
+    return job
+
+
+def _select_jobs(where_clause='', params=None, limit=None):
+    sql_query = SELECT_JOBS_SQL + where_clause + " ORDER BY created_at DESC"
+    if limit is not None:
+        sql_query += f" LIMIT {int(limit)}"
+    with connect() as connection:
+        if not _table_exists(connection):
+            # No upload since the table was introduced.
+            return []
+        rows = connection.execute(text(sql_query), {'stale_seconds': IMPORT_JOB_STALE_SECONDS, **(params or {})})
+        return [ImportJob.from_row(row) for row in rows.mappings()]
+
+
+def get_job(job_id):
+    """The job as last recorded by the worker running it, or None."""
+    jobs = _select_jobs(" WHERE job_id = :job_id", {'job_id': job_id})
+    return jobs[0] if jobs else None
+
+
+def list_jobs():
+    """Most recent jobs first."""
+    return [job.to_dict() for job in _select_jobs(limit=IMPORT_JOB_HISTORY + IMPORT_MAX_PENDING)]
@@ -0,0 +1,262 @@
+import bisect
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Counters and histograms are per process: with several workers, each scrape
+# of /metrics sees the worker that answered it (label it by instance/pod).
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Distinct SQL shapes tracked before new ones are folded into query="other".
+METRICS_MAX_QUERIES = int(os.getenv("METRICS_MAX_QUERIES", "500"))
+# Also export db_query_info, the normalized SQL text behind each fingerprint. Off by
+# default: it describes the schema to anyone who can scrape (see METRICS_TOKEN).
+METRICS_QUERY_INFO = os.getenv("METRICS_QUERY_INFO", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in items]
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set; observe() is a bisect and an add under a lock."""
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="{}"'.format(bound if bound == '+Inf' else _number(float(bound)))
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent in a request, by route template, method and status.',
+    ('route', 'method', 'status'))
+REQUEST_SIZE = Histogram(
+    'http_request_size_bytes', 'Request body size, by route template.', ('route',), SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Response body size as sent (after compression), by route template.',
+    ('route',), SIZE_BUCKETS)
+QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'SQL statement execution time, by statement fingerprint (see db_query_info, METRICS_QUERY_INFO).',
+    ('query',))
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled database connection.')
+MODEL_LATENCY = Histogram(
+    'model_call_duration_seconds', 'Time spent in model calls, by model and operation.', ('model', 'operation'))
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups, by cache and result (hit or miss).', ('cache', 'result'))
+DB_READS = Counter(
+    'db_read_only_connections_total', 'Read-only connections, by where they were served (replica or primary).', ('target',))
+
+
+def observe_model(model, operation, seconds):
+    if METRICS_ENABLED:
+        MODEL_LATENCY.observe(seconds, model, operation)
+
+
+@contextmanager
+def time_model(model, operation):
+    """Times the enclosed model call into model_call_duration_seconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_model(model, operation, time.perf_counter() - started)
+
+
+def record_cache(cache, hit, count=1):
+    if METRICS_ENABLED and count:
+        CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss', amount=count)
+
+
+def record_read(target):
+    if METRICS_ENABLED:
+        DB_READS.inc(target)
+
+
+def observe_pool_wait(seconds):
+    if METRICS_ENABLED:
+        POOL_WAIT.observe(seconds)
+
+
+def register_collector(collect):
+    """Adds gauges read at scrape time; collect() returns a list of (name, help, value)."""
+    _collectors.append(collect)
+
+
+# --- SQL statements -------------------------------------------------------------
+
+_WHITESPACE = re.compile(r'\s+')
+# Expanded IN lists ("IN (%(ids_1)s, %(ids_2)s, ...)") and literal lists vary in length per call.
+_PARAMETER_LIST = re.compile(r'\(\s*(?:%\(\w+\)s|%s|\$\d+|\d+|\'[^\']*\')(?:\s*,\s*(?:%\(\w+\)s|%s|\$\d+|\d+|\'[^\']*\'))*\s*\)')
+_LITERAL = re.compile(r"'[^']*'|\b\d+\b")
+
+_fingerprints = {}
+_statements = {}
+_fingerprint_lock = threading.Lock()
+
+
+def query_fingerprint(statement):
+    """Short stable id for a statement's shape, so label cardinality stays bounded."""
+    fingerprint = _fingerprints.get(statement)
+    if fingerprint is not None:
+        return fingerprint
+    normalized = _WHITESPACE.sub(' ', statement).strip()
+    normalized = _LITERAL.sub('?', _PARAMETER_LIST.sub('(...)', normalized))
+    fingerprint = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+    with _fingerprint_lock:
+        if fingerprint not in _statements:
+            if len(_statements) >= METRICS_MAX_QUERIES:
+                fingerprint = 'other'
+            else:
+                _statements[fingerprint] = normalized[:300]
+        if len(_fingerprints) < 10 * METRICS_MAX_QUERIES:
+            _fingerprints[statement] = fingerprint
+    return fingerprint
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_started'].pop()
+    QUERY_LATENCY.observe(time.perf_counter() - started, query_fingerprint(statement))
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('metrics_query_started'):
+        connection.info['metrics_query_started'].pop()
+
+
+def instrument_engine(engine):
+    """Times every statement run through the engine (not raw DBAPI cursors such as COPY)."""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+# --- Flask ----------------------------------------------------------------------
+
+def _start_request():
+    from flask import g
+
+    g.metrics_started = time.perf_counter()
+
+
+def _finish_request(response):
+    from flask import g, request
+
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+    REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+    if request.content_length:
+        REQUEST_SIZE.observe(request.content_length, route)
+    if not response.direct_passthrough and not response.is_streamed:
+        RESPONSE_SIZE.observe(response.calculate_content_length() or 0, route)
+    return response
+
+
+def init_app(app):
+    """Records latency and payload sizes for every request.
+
+    Register before other after_request hooks (Flask runs them in reverse),
+    so sizes are measured on the final, compressed body.
+    """
+    if METRICS_ENABLED:
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+
+    if METRICS_QUERY_INFO:
+        with _fingerprint_lock:
+            statements = sorted(_statements.items())
+        lines += ["# HELP db_query_info Normalized SQL text of each query fingerprint.", "# TYPE db_query_info gauge"]
+        lines += [f'db_query_info{{query="{fingerprint}",statement="{_escape(sql)}"}} 1'
+                  for fingerprint, sql in statements]
+
+    for collect in _collectors:
+        for name, documentation, value in collect():
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+    return '\n'.join(lines) + '\n'
@@ -1,9 +1,23 @@
 import pandas as pd
 import numpy as np
 import datetime
+import os
+import warnings
+from app.services.feature_pipeline import ChurnFeatureTransformer
+from app.services.forest_engine import FlatForest, check_parity
+from app.services import metrics
+
+# 'sklearn' (default) or 'auto' (flattened forest for batches up to FOREST_MAX_BATCH rows,
+# sklearn above). The flattened forest is only faster for small batches (a 10k-row
+# snapshot scores 2-3x slower), so 'forest' is accepted as a synonym of 'auto'
+# and the sklearn model is always kept for large batches.
+CHURN_INFERENCE = os.getenv("CHURN_INFERENCE", "sklearn")
+CHURN_FOREST_DIR = os.getenv("CHURN_FOREST_DIR")
+FOREST_MAX_BATCH = int(os.getenv("FOREST_MAX_BATCH", "500"))
 
 def feature_engineering_for_prediction(df):
-    """Applies the same feature engineering as the training script."""
+    """Applies the same feature engineering as the training script, on a copy of df."""
+    df = df.copy()
     df['signup_date'] = pd.to_datetime(df['signup_date'], errors='coerce')
     df['last_purchase_date'] = pd.to_datetime(df['last_purchase_date'], errors='coerce')
     
@@ -19,23 +33,55 @@ def feature_engineering_for_prediction(df):
         
     return df
 
+def prepare_inference(model_package):
+    """Attaches the inference backend selected by CHURN_INFERENCE to a loaded package.
+
+    With CHURN_FOREST_DIR pointing at an exported forest the node arrays are
+    memory-mapped, so every worker shares one page-cache copy; an export that
+    does not match the pickled model is ignored.
+    """
+    if CHURN_INFERENCE not in ('forest', 'auto'):
+        return model_package
+
+    model = model_package['model']
+    forest = None
+    if CHURN_FOREST_DIR and os.path.isdir(CHURN_FOREST_DIR):
+        try:
+            forest = FlatForest.load(CHURN_FOREST_DIR)
+        except FileNotFoundError as e:
+            print(f"Warning: '{CHURN_FOREST_DIR}' is incomplete or outdated, re-export it ({e}); flattening it in memory.")
+        probe = np.random.default_rng(0).normal(size=(256, len(model_package['model_columns']))).astype(np.float32)
+        if forest is not None and (forest.n_trees != len(model.estimators_) or not check_parity(model, forest, probe)['ok']):
+            print(f"Warning: '{CHURN_FOREST_DIR}' does not match the loaded churn model; flattening it in memory.")
+            forest = None
+    if forest is None:
+        forest = FlatForest.from_sklearn(model)
+
+    model_package['forest'] = forest
+    return model_package
+
+def score_feature_matrix(model_package, X):
+    """Returns churn probabilities and labels from a single pass over the model."""
+    forest = model_package.get('forest')
+    churn_model = model_package.get('model')
+    if forest is not None and (churn_model is None or len(X) <= FOREST_MAX_BATCH):
+        with metrics.time_model('churn', 'forest_predict'):
+            return forest.predict_scores(X)
+
+    with warnings.catch_warnings(), metrics.time_model('churn', 'predict_proba'):
+        # The model was fitted on a DataFrame; the compiled pipeline feeds it a plain array.
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        proba = churn_model.predict_proba(X)
+    # The label is the most likely class, exactly as predict() derives it
+    return proba[:, 1], churn_model.classes_.take(np.argmax(proba, axis=1))
+
 def get_churn_predictions(customer_df, model_package):
     """Prepares data and returns churn probabilities and predictions."""
-    churn_model = model_package['model']
-    scaler = model_package['scaler']
-    numeric_columns = model_package['numeric_columns']
-    model_columns = model_package['model_columns']
+    transformer = ChurnFeatureTransformer.from_model_package(model_package)
+    X = transformer.transform(customer_df)
+    probabilities, predictions = score_feature_matrix(model_package, X)
 
-    # Apply feature engineering
-    customer_df_featured = feature_engineering_for_prediction(customer_df)
-    
-    # Prepare for prediction
-    df_predict = pd.get_dummies(customer_df_featured, columns=['gender', 'country'], drop_first=True)
-    df_predict_aligned = df_predict.reindex(columns=model_columns, fill_value=0)
-    df_predict_aligned[numeric_columns] = scaler.transform(df_predict_aligned[numeric_columns])
-    
-    # Predict
-    probabilities = churn_model.predict_proba(df_predict_aligned[model_columns])[:, 1]
-    predictions = churn_model.predict(df_predict_aligned[model_columns])
-    
-    return customer_df_featured, probabilities, predictions
\ No newline at end of file
+    customers = customer_df.copy()
+    customers['signup_date'] = pd.to_datetime(customers['signup_date'], errors='coerce')
+    customers['last_purchase_date'] = pd.to_datetime(customers['last_purchase_date'], errors='coerce')
+    return customers, probabilities, predictions
@@ -0,0 +1,400 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+import joblib
+import numpy as np
+from app.services import ml_service
+
+CHURN_MODEL_PATH = 'churn_model.pkl'
+SALES_FORECASTER_PATH = 'sales_forecaster.pkl'
+# Seconds between checks of the model files for a new artifact; 0 turns the watcher off.
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "10"))
+# Replaced versions kept in memory for rollback, per model.
+MODEL_HISTORY = int(os.getenv("MODEL_HISTORY", "1"))
+# Synthetic rows a new churn model must score before it is swapped in.
+MODEL_PROBE_ROWS = int(os.getenv("MODEL_PROBE_ROWS", "256"))
+MODEL_VERSION_HEADER = 'X-Model-Version'
+
+_PATHS = {'churn': CHURN_MODEL_PATH, 'sales_forecaster': SALES_FORECASTER_PATH}
+
+
+class ModelValidationError(Exception):
+    """A new model artifact failed validation and was not swapped in."""
+
+
+class ModelVersion:
+    """One loaded model artifact; never mutated once it is being served."""
+
+    def __init__(self, name, model, version, file_stat, path, validation=None):
+        self.name = name
+        self.model = model
+        # Content hash of the artifact, so every worker names the same file the same way.
+        self.version = version
+        # (mtime_ns, size) of the file it was loaded from.
+        self.file_stat = file_stat
+        self.mtime = file_stat[0] / 1e9 if file_stat else 0.0
+        self.path = path
+        self.validation = validation or {}
+        self.loaded_at = time.time()
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "file_modified_at": self.mtime,
+            "loaded_at": self.loaded_at,
+            "validation": self.validation,
+        }
+
+
+_lock = threading.Lock()
+# Serializes reloads and rollbacks; requests never wait on it.
+_swap_lock = threading.Lock()
+_current = {}
+_history = {name: collections.deque(maxlen=MODEL_HISTORY) for name in _PATHS}
+_swap_hooks = {name: [] for name in _PATHS}
+# (mtime_ns, size) of the file each model was last loaded from; rollbacks leave it alone.
+_loaded_files = {}
+# pid of the process running the watcher thread; threads do not survive a fork.
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_version(path):
+    stat = _file_stat(path)
+    if stat is None:
+        return '0', 0.0
+    return f"{stat[0]:x}.{stat[1]:x}", stat[0] / 1e9
+
+
+def _content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def save_artifact(obj, path):
+    """Dumps a model next to path and renames it into place, so watchers never see a partial file."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_churn_package(path=CHURN_MODEL_PATH):
+    """Unpickles the churn model package and attaches the configured inference backend."""
+    try:
+        model_package = joblib.load(path)
+    except FileNotFoundError:
+        raise RuntimeError(f"'{path}' not found. Please run the train_model.py script first.")
+    print("Success: New Random Forest model package loaded.")
+    return ml_service.prepare_inference(model_package)
+
+
+def load_sales_forecaster(path=SALES_FORECASTER_PATH):
+    """Unpickles the SARIMAX results, or returns None when no forecaster was trained."""
+    try:
+        sales_forecaster = joblib.load(path)
+    except FileNotFoundError:
+        print(f"Warning: '{path}' not found. Sales forecasting will not work.")
+        return None
+    print("Success: SARIMAX (Sales) model loaded.")
+    return sales_forecaster
+
+
+def validate_churn_package(model_package):
+    """Scores MODEL_PROBE_ROWS synthetic rows; also warms the model's code paths."""
+    missing = [key for key in ('model_columns', 'numeric_columns') if key not in model_package]
+    if missing:
+        raise ModelValidationError(f"The churn model package has no {', '.join(missing)}.")
+    if model_package.get('model') is None and model_package.get('forest') is None:
+        raise ModelValidationError("The churn model package has no model.")
+
+    probe = np.random.default_rng(0).normal(size=(MODEL_PROBE_ROWS, len(model_package['model_columns'])))
+    start = time.perf_counter()
+    probabilities, predictions = ml_service.score_feature_matrix(model_package, probe.astype(np.float32))
+    seconds = time.perf_counter() - start
+    probabilities = np.asarray(probabilities, dtype=float)
+    if len(probabilities) != MODEL_PROBE_ROWS or len(predictions) != MODEL_PROBE_ROWS:
+        raise ModelValidationError("The churn model returned the wrong number of scores.")
+    if not np.all(np.isfinite(probabilities)) or probabilities.min() < 0 or probabilities.max() > 1:
+        raise ModelValidationError("The churn model returned probabilities outside [0, 1].")
+    return {"probe_rows": MODEL_PROBE_ROWS, "probe_ms": round(seconds * 1000, 3),
+            "training": model_package.get('training')}
+
+
+def validate_sales_forecaster(forecaster):
+    """Forecasts one week ahead and checks the values are finite."""
+    if forecaster is None:
+        return {"available": False}
+    start = time.perf_counter()
+    try:
+        predicted = np.asarray(forecaster.get_forecast(steps=7).predicted_mean, dtype=float)
+    except Exception as e:
+        raise ModelValidationError(f"The sales forecaster could not forecast: {e}")
+    if len(predicted) != 7 or not np.all(np.isfinite(predicted)):
+        raise ModelValidationError("The sales forecaster returned non-finite values.")
+    return {"available": True, "probe_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+_LOADERS = {
+    'churn': (load_churn_package, validate_churn_package),
+    'sales_forecaster': (load_sales_forecaster, validate_sales_forecaster),
+}
+
+
+def load_version(name):
+    """Loads and validates the artifact at the model's path without serving it."""
+    path = _PATHS[name]
+    loader, validate = _LOADERS[name]
+    stat = _file_stat(path)
+    version = _content_hash(path) if stat is not None else 'missing'
+    try:
+        model = loader(path)
+        validation = validate(model)
+    except ModelValidationError:
+        raise
+    except Exception as e:
+        raise ModelValidationError(f"Could not load the {name} model from '{path}': {e}") from e
+    return ModelVersion(name, model, version, stat, path, validation)
+
+
+def saved_model(name):
+    """The model saved at name's path (None without a file), reusing the served object when it is that file."""
+    path = _PATHS[name]
+    stat = _file_stat(path)
+    if stat is None:
+        return None
+    current = _current.get(name)
+    if current is not None and current.file_stat == stat:
+        return current.model
+    return _LOADERS[name][0](path)
+
+
+def on_swap(name, prepare):
+    """Registers prepare(new_version), called before a swap; it may return a commit() run right after.
+
+    Services use it to rebuild what depends on the model (scores, forecast
+    caches) off the request path, so the first request after a swap is warm.
+    """
+    _swap_hooks[name].append(prepare)
+
+
+def _swap(name, new_version):
+    commits = [prepare(new_version) for prepare in _swap_hooks[name]]
+    with _lock:
+        previous = _current.get(name)
+        # A single reference assignment: requests see either the old or the new version.
+        _current[name] = new_version
+        if previous is not None:
+            _history[name].append(previous)
+    for commit in commits:
+        if commit is not None:
+            commit()
+    print(f"Success: Serving {name} model {new_version.version}"
+          f" (previously {previous.version if previous is not None else 'none'}).")
+    return previous
+
+
+def reload(name):
+    """Loads, validates and warms the model file, then swaps it in. Returns (new, previous)."""
+    if name not in _PATHS:
+        raise KeyError(name)
+    with _swap_lock:
+        new_version = load_version(name)
+        previous = _swap(name, new_version)
+        _loaded_files[name] = new_version.file_stat
+    return new_version, previous
+
+
+def publish(name, model):
+    """Validates a model built in this process, saves it to name's path and serves it.
+
+    Used for updates computed in-process (see forecaster_training), so the
+    model does not have to be unpickled again; the file makes other
+    processes load it too. Returns (new, previous).
+    """
+    path = _PATHS[name]
+    with _swap_lock:
+        try:
+            validation = _LOADERS[name][1](model)
+        except ModelValidationError:
+            raise
+        except Exception as e:
+            raise ModelValidationError(f"The new {name} model failed validation: {e}") from e
+        save_artifact(model, path)
+        stat = _file_stat(path)
+        new_version = ModelVersion(name, model, _content_hash(path), stat, path, validation)
+        previous = _swap(name, new_version)
+        _loaded_files[name] = stat
+    return new_version, previous
+
+
+def rollback(name):
+    """Swaps the most recently replaced version back in. Returns (restored, replaced)."""
+    if name not in _PATHS:
+        raise KeyError(name)
+    with _swap_lock:
+        if not _history[name]:
+            raise ModelValidationError(f"No previous {name} model is kept for rollback.")
+        restored = _history[name].pop()
+        replaced = _swap(name, restored)
+    return restored, replaced
+
+
+def _get_version(name):
+    start_watcher()
+    version = _current.get(name)
+    if version is None:
+        with _swap_lock:
+            version = _current.get(name)
+            if version is None:
+                version = load_version(name)
+                with _lock:
+                    _current[name] = version
+                _loaded_files[name] = version.file_stat
+    note_served(name, version.version)
+    return version
+
+
+def get_churn_version():
+    """Returns the ModelVersion of the churn model, loading it on first use."""
+    return _get_version('churn')
+
+
+def get_churn_package():
+    """Returns the churn model package, loading it on first use."""
+    return _get_version('churn').model
+
+
+def get_sales_forecaster():
+    """Returns the sales forecaster (or None), loading it on first use."""
+    return _get_version('sales_forecaster').model
+
+
+def is_loaded(name):
+    return name in _current
+
+
+def loaded_version(name):
+    """Version id being served for name, or None when it is not loaded yet."""
+    version = _current.get(name)
+    return version.version if version is not None else None
+
+
+def model_version():
+    """(token, mtime) identifying the models this process serves (or would load).
+
+    Loaded models report the version they serve; models not loaded yet report
+    the file on disk, which is what the next request will load.
+    """
+    versions = []
+    for name, path in sorted(_PATHS.items()):
+        current = _current.get(name)
+        versions.append((current.version, current.mtime) if current is not None else _file_version(path))
+    return '-'.join(token for token, _ in versions), max(mtime for _, mtime in versions)
+
+
+def registry_status():
+    """Served and rollback versions of every model, for the admin API."""
+    with _lock:
+        current = dict(_current)
+        history = {name: list(versions) for name, versions in _history.items()}
+    return {
+        name: {
+            "loaded": name in current,
+            "current": current[name].to_dict() if name in current else None,
+            "previous": [version.to_dict() for version in reversed(history[name])],
+        }
+        for name in sorted(_PATHS)
+    }
+
+
+# --- File watcher ---------------------------------------------------------------
+
+def _watch():
+    seen = {}
+    rejected = {}
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        for name, path in _PATHS.items():
+            if name not in _current:
+                # Not loaded yet: the first use loads whatever is on disk.
+                continue
+            stat = _file_stat(path)
+            if stat is None or stat == _loaded_files.get(name) or stat == rejected.get(name):
+                continue
+            # Load only once the file has stayed unchanged for a whole interval.
+            if seen.get(name) != stat:
+                seen[name] = stat
+                continue
+            try:
+                reload(name)
+            except Exception as e:
+                print(f"Error: New {name} model at '{path}' was rejected: {e}")
+                rejected[name] = stat
+
+
+def start_watcher():
+    """Starts the thread that hot-reloads model files when they change (MODEL_WATCH_INTERVAL)."""
+    global _watcher_pid
+    if MODEL_WATCH_INTERVAL <= 0 or _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid != os.getpid():
+            _watcher_pid = os.getpid()
+            threading.Thread(target=_watch, name='model-watcher', daemon=True).start()
+
+
+def _after_fork():
+    global _watcher_pid, _watcher_lock, _lock, _swap_lock
+    # The watcher thread did not survive the fork (e.g. gunicorn --preload);
+    # the worker starts its own on its first model access. Locks it held mid-reload
+    # would never be released in the child.
+    _watcher_pid = None
+    _watcher_lock = threading.Lock()
+    _lock = threading.Lock()
+    _swap_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# --- Flask ----------------------------------------------------------------------
+
+def note_served(name, version):
+    """Records that the current request's response came from this model version."""
+    from flask import g, has_request_context
+
+    if has_request_context():
+        g.setdefault('model_versions', {})[name] = version
+
+
+def _set_version_header(response):
+    from flask import g
+
+    served = g.get('model_versions')
+    if served:
+        response.headers[MODEL_VERSION_HEADER] = ', '.join(f"{name}={version}" for name, version in sorted(served.items()))
+    return response
+
+
+def init_app(app):
+    """Adds X-Model-Version (e.g. "churn=3f2a9c1b0d4e") to responses a model contributed to."""
+    app.after_request(_set_version_header)
@@ -0,0 +1,321 @@
+import collections
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Off unless enabled and given a secret; requests must send it in PROFILE_HEADER.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Profiles kept for /api/debug/profiles (the oldest is dropped first).
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "50"))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "25"))
+
+PROFILE_MODES = ('cpu', 'alloc')
+
+# Where a sample's time goes, by the innermost matching frame (first match wins).
+CATEGORIES = (
+    ('sql', ('sqlalchemy', 'psycopg2')),
+    ('model', ('sklearn', 'statsmodels', 'forest_engine', 'ml_service', 'demand_model', 'concurrent/futures')),
+    ('pandas', ('pandas', 'numpy')),
+    ('serialization', ('serialization', 'orjson', '/json/', 'gzip', 'brotli')),
+)
+
+
+def enabled():
+    return PROFILING_ENABLED and bool(PROFILING_SECRET)
+
+
+def authorized(request):
+    """True when profiling is on and the request carries the secret."""
+    token = request.headers.get(PROFILE_HEADER, '')
+    return enabled() and hmac.compare_digest(token.encode(), PROFILING_SECRET.encode())
+
+
+def _frame_key(code, lineno):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno})"
+
+
+def _category(stack):
+    for filename in reversed([code.co_filename for code, _ in stack]):
+        for name, patterns in CATEGORIES:
+            if any(pattern in filename for pattern in patterns):
+                return name
+    return 'app'
+
+
+class CpuSampler:
+    """Samples one thread's stack every PROFILE_SAMPLE_INTERVAL seconds from a helper thread.
+
+    Each sample is weighted by the wall time since the previous one, so stacks
+    seen after a long GIL-holding call (pandas, NumPy) still carry that time.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return True
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += now - last
+            self.samples += 1
+            last = now
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self):
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        categories = collections.Counter()
+        collapsed = collections.Counter()
+        for stack, seconds in self.stacks.items():
+            keys = [_frame_key(code, lineno) for code, lineno in stack]
+            own[keys[-1]] += seconds
+            for key in set(f"{code.co_name} ({os.path.basename(code.co_filename)})" for code, _ in stack):
+                inclusive[key] += seconds
+            categories[_category(stack)] += seconds
+            collapsed[';'.join(f"{code.co_name} ({os.path.basename(code.co_filename)})" for code, _ in stack)] += seconds
+        sampled = sum(self.stacks.values())
+        return {
+            "sampled_seconds": round(sampled, 4),
+            "samples": self.samples,
+            "by_category": {name: round(seconds, 4) for name, seconds in categories.most_common()},
+            "top_self": [{"frame": key, "seconds": round(seconds, 4)} for key, seconds in own.most_common(PROFILE_TOP)],
+            "top_inclusive": [{"function": key, "seconds": round(seconds, 4)} for key, seconds in inclusive.most_common(PROFILE_TOP)],
+            # Brendan Gregg's collapsed format in milliseconds, for flamegraph.pl / speedscope.
+            "collapsed": [f"{stack} {max(1, round(seconds * 1000))}" for stack, seconds in collapsed.most_common()],
+        }
+
+
+class AllocTracer:
+    """tracemalloc difference between the start and the end of one request.
+
+    tracemalloc is process-wide, so one allocation profile runs at a time and
+    allocations of concurrent requests are included.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.acquired = False
+        self.started_tracing = False
+
+    def start(self):
+        self.acquired = self._lock.acquire(blocking=False)
+        if not self.acquired:
+            return False
+        if not tracemalloc.is_tracing():
+            # One frame per trace: results are grouped by line, and deeper tracebacks slow every allocation.
+            tracemalloc.start(1)
+            self.started_tracing = True
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+        self.before_size = tracemalloc.get_traced_memory()[0]
+        return True
+
+    def stop(self):
+        try:
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+            diffs = after.filter_traces(ignore).compare_to(self.before.filter_traces(ignore), 'lineno')
+            self.result = {
+                "net_bytes": current - self.before_size,
+                "peak_bytes": peak - self.before_size,
+                "top_allocations": [
+                    {
+                        "location": str(diff.traceback[0]),
+                        "size_diff_bytes": diff.size_diff,
+                        "count_diff": diff.count_diff,
+                    }
+                    for diff in diffs[:PROFILE_TOP] if diff.size_diff
+                ],
+            }
+        finally:
+            if self.started_tracing:
+                tracemalloc.stop()
+            self._lock.release()
+            self.acquired = False
+
+    def report(self):
+        return self.result
+
+
+class RequestProfile:
+    """One profiled request: the sampler or tracer, plus the SQL it ran."""
+
+    def __init__(self, mode, method, path):
+        self.id = uuid.uuid4().hex[:16]
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.queries = collections.OrderedDict()
+        self.collector = CpuSampler(threading.get_ident()) if mode == 'cpu' else AllocTracer()
+        self.started_at = time.time()
+        self.started = None
+        self.seconds = None
+        self.status = None
+
+    def start(self):
+        if not self.collector.start():
+            return False
+        self.started = time.perf_counter()
+        return True
+
+    def record_query(self, statement, seconds):
+        entry = self.queries.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def stop(self, status):
+        self.seconds = time.perf_counter() - self.started
+        self.status = status
+        self.collector.stop()
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.seconds * 1000, 3),
+            "sql_ms": round(sum(seconds for _, seconds in self.queries.values()) * 1000, 3),
+        }
+
+    def to_dict(self):
+        profile = self.summary()
+        profile["sql"] = [
+            {"statement": " ".join(statement.split())[:500], "calls": calls, "ms": round(seconds * 1000, 3)}
+            for statement, (calls, seconds) in sorted(self.queries.items(), key=lambda item: -item[1][1])
+        ]
+        profile[self.mode] = self.collector.report()
+        return profile
+
+
+_profiles = collections.deque(maxlen=PROFILE_HISTORY)
+_profiles_lock = threading.Lock()
+_local = threading.local()
+
+
+def _store(profile):
+    with _profiles_lock:
+        _profiles.append(profile)
+
+
+def list_profiles():
+    """Summaries of the kept profiles, slowest first."""
+    with _profiles_lock:
+        profiles = list(_profiles)
+    return [profile.summary() for profile in sorted(profiles, key=lambda p: p.seconds, reverse=True)]
+
+
+def get_profile(profile_id):
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile.id == profile_id:
+                return profile
+    return None
+
+
+# --- SQL ------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'profile', None) is not None:
+        conn.info.setdefault('profile_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = getattr(_local, 'profile', None)
+    started = conn.info.get('profile_query_started')
+    if profile is not None and started:
+        profile.record_query(statement, time.perf_counter() - started.pop())
+
+
+def _instrument_engine():
+    from sqlalchemy import event
+    from app.services.db import engine
+
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# --- Flask ----------------------------------------------------------------------
+
+def _start_request():
+    from flask import request
+
+    mode = request.args.get('profile')
+    if mode not in PROFILE_MODES or not authorized(request):
+        return None
+    profile = RequestProfile(mode, request.method, request.full_path.rstrip('?'))
+    if profile.start():
+        _local.profile = profile
+    return None
+
+
+def _finish(status):
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return None
+    _local.profile = None
+    profile.stop(status)
+    _store(profile)
+    return profile
+
+
+def _finish_request(response):
+    from flask import request, url_for
+
+    if request.args.get('profile') in PROFILE_MODES and authorized(request):
+        profile = _finish(response.status_code)
+        if profile is None:
+            response.headers['X-Profile-Id'] = 'busy'
+        else:
+            response.headers['X-Profile-Id'] = profile.id
+            response.headers['X-Profile-Url'] = url_for('debug_bp.get_debug_profile', profile_id=profile.id)
+    return response
+
+
+def _teardown_request(exception):
+    # after_request does not run when a view raises; never leave a sampler running.
+    _finish(500)
+
+
+def init_app(app):
+    """Profiles requests sent with ?profile=cpu|alloc and the secret header.
+
+    Register before the other request hooks, so the profile covers them too.
+    """
+    if not enabled():
+        return
+    _instrument_engine()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,115 @@
+import numpy as np
+
+
+class RiskIndex:
+    """Customers ordered by churn probability (highest first), then customer_id.
+
+    Built once per scoring snapshot. Each filterable column keeps a posting
+    list per value (positions in risk order), so filtered, paginated top-N
+    queries are a couple of binary searches and a slice instead of a sort.
+    """
+
+    FILTER_COLUMNS = ('country', 'subscription_status')
+
+    def __init__(self, customers):
+        probabilities = customers['churn_probability'].to_numpy(dtype=np.float64)
+        customer_ids = customers['customer_id'].astype(str).to_numpy(dtype=object)
+
+        self.order = np.lexsort((customer_ids, -probabilities))
+        self._neg_probs = -probabilities[self.order]
+        self._customer_ids = customer_ids[self.order]
+
+        self._codes = {}
+        self._values = {}
+        for column in self.FILTER_COLUMNS:
+            codes, values = _factorize(customers[column].astype(str).to_numpy(dtype=object)[self.order])
+            self._codes[column] = codes
+            self._values[column] = {value: code for code, value in enumerate(values)}
+
+        self._postings = {}
+        for column in self.FILTER_COLUMNS:
+            self._postings[(column,)] = _postings(self._codes[column], len(self._values[column]))
+        first, second = self.FILTER_COLUMNS
+        width = len(self._values[second])
+        combined = self._codes[first] * width + self._codes[second]
+        self._postings[self.FILTER_COLUMNS] = _postings(combined, len(self._values[first]) * width)
+
+    def __len__(self):
+        return len(self.order)
+
+    def query(self, count, after=None, filters=None, min_prob=None, max_prob=None):
+        """Returns (row positions into the snapshot, next cursor or None).
+
+        after is a (probability, customer_id) cursor as returned by a
+        previous page; filters maps a FILTER_COLUMNS name to a value.
+        """
+        start, end = 0, len(self.order)
+        if max_prob is not None:
+            start = int(np.searchsorted(self._neg_probs, -max_prob, side='left'))
+        if min_prob is not None:
+            end = int(np.searchsorted(self._neg_probs, -min_prob, side='right'))
+        if after is not None:
+            start = max(start, self._position_after(*after))
+        if count <= 0 or start >= end:
+            return self.order[:0], None
+
+        positions = self._candidates(filters or {})
+        if positions is None:
+            selected = np.arange(start, min(start + count, end))
+            has_more = start + count < end
+        else:
+            lo = int(np.searchsorted(positions, start, side='left'))
+            hi = int(np.searchsorted(positions, end, side='left'))
+            selected = positions[lo:min(lo + count, hi)]
+            has_more = lo + count < hi
+
+        next_cursor = None
+        if has_more and len(selected):
+            last = selected[-1]
+            next_cursor = (float(-self._neg_probs[last]), self._customer_ids[last])
+        return self.order[selected], next_cursor
+
+    def _position_after(self, probability, customer_id):
+        lo = int(np.searchsorted(self._neg_probs, -probability, side='left'))
+        hi = int(np.searchsorted(self._neg_probs, -probability, side='right'))
+        return lo + int(np.searchsorted(self._customer_ids[lo:hi], customer_id, side='right'))
+
+    def _candidates(self, filters):
+        columns = tuple(c for c in self.FILTER_COLUMNS if filters.get(c) is not None)
+        if not columns:
+            return None
+        codes = []
+        for column in columns:
+            code = self._values[column].get(filters[column])
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            codes.append(code)
+        if len(columns) == 2:
+            key = codes[0] * len(self._values[columns[1]]) + codes[1]
+        else:
+            key = codes[0]
+        return self._postings[columns][key]
+
+
+def parse_cursor(value):
+    """Parses an 'after' cursor of the form '<probability>,<customer_id>'."""
+    probability, sep, customer_id = value.partition(',')
+    if not sep or not customer_id:
+        raise ValueError("Cursor must look like '<probability>,<customer_id>'.")
+    return float(probability), customer_id
+
+
+def format_cursor(cursor):
+    return f"{cursor[0]!r},{cursor[1]}"
+
+
+def _factorize(values):
+    uniques, codes = np.unique(values, return_inverse=True)
+    return codes.astype(np.intp), list(uniques)
+
+
+def _postings(codes, size):
+    """Splits positions 0..n-1 by code; each list stays in ascending (risk) order."""
+    perm = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=size))[:-1]
+    return np.split(perm, bounds)
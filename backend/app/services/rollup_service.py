@@ -0,0 +1,199 @@
+import pandas as pd
+from psycopg2 import extras, sql
+from sqlalchemy import text
+from app.services import data_version
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS daily_sales (
+        sale_date DATE NOT NULL,
+        product_id TEXT NOT NULL,
+        category TEXT,
+        revenue NUMERIC NOT NULL DEFAULT 0,
+        quantity BIGINT NOT NULL DEFAULT 0,
+        order_count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (sale_date, product_id)
+    );
+"""
+
+# Adds a batch of per-(day, product) deltas; category comes from the products table.
+UPSERT_SQL = """
+    INSERT INTO daily_sales (sale_date, product_id, category, revenue, quantity, order_count)
+    SELECT v.sale_date, v.product_id, p.category, v.revenue, v.quantity, v.order_count
+    FROM (VALUES %s) AS v(sale_date, product_id, revenue, quantity, order_count)
+    LEFT JOIN products p ON p.product_id = v.product_id
+    ON CONFLICT (sale_date, product_id) DO UPDATE SET
+        revenue = daily_sales.revenue + EXCLUDED.revenue,
+        quantity = daily_sales.quantity + EXCLUDED.quantity,
+        order_count = daily_sales.order_count + EXCLUDED.order_count
+"""
+
+# Same upsert, aggregated server-side from a table of newly inserted orders.
+UPSERT_FROM_TABLE_SQL = """
+    INSERT INTO daily_sales (sale_date, product_id, category, revenue, quantity, order_count)
+    SELECT
+        o.last_purchase_date::date,
+        o.product_id,
+        MAX(p.category),
+        SUM(o.unit_price * o.quantity),
+        SUM(o.quantity),
+        COUNT(*)
+    FROM {table} o
+    LEFT JOIN products p ON p.product_id = o.product_id
+    WHERE o.last_purchase_date IS NOT NULL
+    GROUP BY o.last_purchase_date::date, o.product_id
+    ON CONFLICT (sale_date, product_id) DO UPDATE SET
+        revenue = daily_sales.revenue + EXCLUDED.revenue,
+        quantity = daily_sales.quantity + EXCLUDED.quantity,
+        order_count = daily_sales.order_count + EXCLUDED.order_count
+"""
+
+BACKFILL_SQL = """
+    INSERT INTO daily_sales (sale_date, product_id, category, revenue, quantity, order_count)
+    SELECT
+        o.last_purchase_date::date,
+        o.product_id,
+        MAX(p.category),
+        SUM(o.unit_price * o.quantity),
+        SUM(o.quantity),
+        COUNT(*)
+    FROM orders o
+    LEFT JOIN products p ON p.product_id = o.product_id
+    WHERE o.last_purchase_date IS NOT NULL
+    GROUP BY o.last_purchase_date::date, o.product_id
+"""
+
+# BACKFILL_SQL for a database whose orders predate the rollup: fills daily_sales only
+# while it is still empty, so running it again (or after imports) changes nothing.
+BACKFILL_IF_EMPTY_SQL = """
+    INSERT INTO daily_sales (sale_date, product_id, category, revenue, quantity, order_count)
+    SELECT
+        o.last_purchase_date::date,
+        o.product_id,
+        MAX(p.category),
+        SUM(o.unit_price * o.quantity),
+        SUM(o.quantity),
+        COUNT(*)
+    FROM orders o
+    LEFT JOIN products p ON p.product_id = o.product_id
+    WHERE o.last_purchase_date IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM daily_sales)
+    GROUP BY o.last_purchase_date::date, o.product_id
+"""
+
+def backfill_if_empty(cursor):
+    """Runs BACKFILL_IF_EMPTY_SQL on the caller's transaction; bumps data_version only if it wrote rows."""
+    cursor.execute(BACKFILL_IF_EMPTY_SQL)
+    rows = cursor.rowcount
+    if rows:
+        data_version.bump(cursor)
+    return rows
+
+
+# True when orders has rows the rollup has never seen (daily_sales empty, orders not).
+NEEDS_BACKFILL_SQL = """
+    SELECT NOT EXISTS (SELECT 1 FROM daily_sales) AND EXISTS (SELECT 1 FROM orders)
+"""
+
+DAILY_TOTALS_SQL = """
+    SELECT
+        sale_date,
+        SUM(revenue) AS revenue,
+        SUM(quantity) AS quantity,
+        SUM(order_count) AS order_count
+    FROM daily_sales
+    {where_clause}
+    GROUP BY sale_date
+    ORDER BY sale_date;
+"""
+
+# Column order expected by apply_inserted_orders; matches the importer's RETURNING clause.
+ORDER_COLUMNS = ['last_purchase_date', 'product_id', 'unit_price', 'quantity']
+
+
+def ensure_table(cursor):
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def apply_inserted_orders(cursor, order_rows):
+    """Adds newly inserted orders to daily_sales on the caller's transaction.
+
+    order_rows are (last_purchase_date, product_id, unit_price, quantity)
+    tuples of orders that were actually inserted, so re-importing a file
+    does not count its orders twice.
+    """
+    orders = pd.DataFrame(order_rows, columns=ORDER_COLUMNS)
+    orders['last_purchase_date'] = pd.to_datetime(orders['last_purchase_date'], errors='coerce')
+    orders = orders.dropna(subset=['last_purchase_date'])
+    if orders.empty:
+        return 0
+
+    orders['sale_date'] = orders['last_purchase_date'].dt.date
+    # Keep the database's own number types (Decimal for NUMERIC) so sums stay exact.
+    orders['revenue'] = orders['unit_price'] * orders['quantity']
+    daily = orders.groupby(['sale_date', 'product_id']).agg(
+        revenue=('revenue', 'sum'),
+        quantity=('quantity', 'sum'),
+        order_count=('product_id', 'size'),
+    ).reset_index()
+
+    ensure_table(cursor)
+    rows = [
+        (sale_date, product_id, revenue, int(quantity), int(order_count))
+        for sale_date, product_id, revenue, quantity, order_count in daily.itertuples(index=False)
+    ]
+    extras.execute_values(cursor, UPSERT_SQL, rows)
+    return len(rows)
+
+
+def apply_inserted_orders_table(cursor, table_name):
+    """Like apply_inserted_orders, for orders staged in a table on the caller's transaction.
+
+    The table needs last_purchase_date, product_id, unit_price and quantity columns.
+    """
+    ensure_table(cursor)
+    cursor.execute(sql.SQL(UPSERT_FROM_TABLE_SQL).format(table=sql.Identifier(table_name)))
+    return cursor.rowcount
+
+
+def get_daily_totals(connection, last_days=None):
+    """Returns revenue, quantity and order_count per day, indexed by date.
+
+    With last_days, only days within that many days of the latest sale are returned.
+    """
+    where_clause = ""
+    if last_days is not None:
+        where_clause = "WHERE sale_date >= (SELECT MAX(sale_date) FROM daily_sales) - :last_days"
+    sql_query = DAILY_TOTALS_SQL.format(where_clause=where_clause)
+    params = {'last_days': last_days} if last_days is not None else None
+    df = pd.read_sql(text(sql_query), connection, params=params)
+    df['sale_date'] = pd.to_datetime(df['sale_date'])
+    return df.set_index('sale_date')
+
+
+def backfill(conn):
+    """Rebuilds daily_sales from every order in one transaction."""
+    cursor = conn.cursor()
+    try:
+        ensure_table(cursor)
+        cursor.execute("TRUNCATE daily_sales")
+        cursor.execute(BACKFILL_SQL)
+        rows = cursor.rowcount
+        data_version.bump(cursor)
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    # One-shot backfill for existing data: python -m app.services.rollup_service
+    from app.services.db import raw_connection
+
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        print(f"Success: daily_sales rebuilt with {backfill(conn)} rows.")
+    finally:
+        conn.close()
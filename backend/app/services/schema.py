@@ -0,0 +1,292 @@
+import json
+import os
+import sys
+from app.services import rollup_service, data_version, import_service
+from app.services.db import raw_connection
+
+# What the app does with the schema at startup. check: only report what is missing.
+# apply: run pending migrations (the index builds lock orders against writes, so on a
+# populated database run `python -m app.services.schema migrate` off-peak instead). off: skip.
+SCHEMA_MIGRATE = os.getenv("SCHEMA_MIGRATE", "check")
+# Sequential scans over fewer rows than this are reported but not flagged.
+SEQ_SCAN_MIN_ROWS = int(os.getenv("SEQ_SCAN_MIN_ROWS", "10000"))
+
+# Serializes migrations when several workers start at once.
+MIGRATION_LOCK_ID = 80420017
+
+MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+# (version, description, statements). Append only; never edit an applied migration.
+# A statement is SQL, or a function taking the migration's cursor.
+# Everything is IF NOT EXISTS so databases created by hand adopt the history cleanly.
+MIGRATIONS = [
+    (1, "base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS customers (
+            customer_id TEXT PRIMARY KEY,
+            age INTEGER,
+            gender TEXT,
+            country TEXT,
+            signup_date DATE
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            product_name TEXT,
+            category TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id TEXT PRIMARY KEY,
+            customer_id TEXT REFERENCES customers (customer_id),
+            product_id TEXT REFERENCES products (product_id),
+            last_purchase_date DATE,
+            cancellations_count INTEGER,
+            subscription_status TEXT,
+            unit_price NUMERIC,
+            quantity INTEGER,
+            purchase_frequency INTEGER,
+            ratings NUMERIC
+        );
+        """,
+    ]),
+    (2, "derived tables", [
+        rollup_service.CREATE_TABLE_SQL,
+        data_version.CREATE_TABLE_SQL,
+    ]),
+    (3, "indexes for the dashboard, scoring and import queries", [
+        # Partial re-aggregation of imported customers (db_service.get_aggregated_data
+        # with customer_ids) reads every column it needs from the index.
+        """
+        CREATE INDEX IF NOT EXISTS orders_customer_id_idx ON orders (customer_id)
+            INCLUDE (order_id, last_purchase_date, cancellations_count, subscription_status,
+                     unit_price, quantity, purchase_frequency, ratings);
+        """,
+        # Product joins (top products, demand ranking) and the rollup backfill.
+        """
+        CREATE INDEX IF NOT EXISTS orders_product_id_idx ON orders (product_id)
+            INCLUDE (unit_price, quantity);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS orders_last_purchase_date_idx ON orders (last_purchase_date)
+            INCLUDE (product_id, unit_price, quantity);
+        """,
+        # Cancelled-subscription counts.
+        """
+        CREATE INDEX IF NOT EXISTS orders_subscription_status_idx ON orders (subscription_status);
+        """,
+        # Per-product history for demand forecasting (WHERE product_id IN ...).
+        """
+        CREATE INDEX IF NOT EXISTS daily_sales_product_id_idx ON daily_sales (product_id, sale_date)
+            INCLUDE (quantity, order_count);
+        """,
+        "CREATE INDEX IF NOT EXISTS customers_country_idx ON customers (country);",
+    ]),
+    (4, "per-customer change watermark for incremental training", [
+        data_version.CUSTOMER_VERSIONS_SQL,
+        "CREATE INDEX IF NOT EXISTS customer_versions_data_version_idx ON customer_versions (data_version);",
+    ]),
+    (5, "import jobs shared by all workers", [
+        import_service.JOBS_TABLE_SQL,
+    ]),
+    # Migration 2 created daily_sales empty, so databases that already had orders served
+    # empty sales sections until a manual backfill. The lock keeps imports out until the
+    # rollup matches orders; data_version only moves when rows were written, so caches
+    # survive deploys to databases that were already filled.
+    (6, "backfill daily_sales on databases that predate it", [
+        "LOCK TABLE orders, daily_sales IN SHARE MODE;",
+        rollup_service.backfill_if_empty,
+    ]),
+]
+
+EXPECTED_INDEXES = {
+    'orders': ['orders_customer_id_idx', 'orders_product_id_idx', 'orders_last_purchase_date_idx',
+               'orders_subscription_status_idx'],
+    'daily_sales': ['daily_sales_product_id_idx'],
+    'customers': ['customers_country_idx'],
+    'customer_versions': ['customer_versions_data_version_idx'],
+}
+
+
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_TABLE_SQL)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    """Applies pending migrations, each in its own transaction. Returns the versions applied.
+
+    raw_connection's timeout only covers its first transaction, so every
+    migration lifts the statement timeout itself.
+    """
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        cursor = conn.cursor()
+        try:
+            # Index builds on large tables outlast any request timeout.
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            if version in applied_versions(cursor):
+                conn.commit()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description))
+            conn.commit()
+            applied.append(version)
+            print(f"Success: Applied schema migration {version} ({description}).")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    return applied
+
+
+def check(conn):
+    """Reports pending migrations and missing indexes without changing anything."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+        else:
+            done = set()
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+        present = {row[0] for row in cursor.fetchall()}
+        needs_backfill = False
+        cursor.execute("SELECT to_regclass('daily_sales') IS NOT NULL AND to_regclass('orders') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute(rollup_service.NEEDS_BACKFILL_SQL)
+            needs_backfill = cursor.fetchone()[0]
+        conn.rollback()
+    finally:
+        cursor.close()
+    return {
+        "pending_migrations": [version for version, _, _ in MIGRATIONS if version not in done],
+        "missing_indexes": [name for names in EXPECTED_INDEXES.values() for name in names if name not in present],
+        "daily_sales_needs_backfill": needs_backfill,
+    }
+
+
+def ensure_schema():
+    """Startup step: applies or checks the schema according to SCHEMA_MIGRATE."""
+    if SCHEMA_MIGRATE == 'off':
+        return None
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        if SCHEMA_MIGRATE == 'apply':
+            migrate(conn)
+        report = check(conn)
+    finally:
+        conn.close()
+    if report['pending_migrations'] or report['missing_indexes']:
+        print(f"Warning: Schema is behind: {report}. Run `python -m app.services.schema migrate`.")
+    elif report['daily_sales_needs_backfill']:
+        # Sales sections read daily_sales and would be empty.
+        print("Error: daily_sales is empty but orders is not. Run `python -m app.services.rollup_service`.")
+    return report
+
+
+def endpoint_queries(cursor):
+    """(label, SQL, params) for the queries behind each read endpoint.
+
+    Parameterized queries are run with a sample of real ids, so their plans
+    match what the endpoints send.
+    """
+    from app.services import dashboard_service, demand_service, db_service
+
+    cursor.execute("SELECT customer_id FROM customers LIMIT 50")
+    customer_ids = tuple(row[0] for row in cursor.fetchall()) or ('',)
+    cursor.execute("SELECT product_id FROM daily_sales GROUP BY product_id ORDER BY SUM(quantity) DESC LIMIT 5")
+    product_ids = tuple(row[0] for row in cursor.fetchall()) or ('',)
+
+    queries = [(f"dashboard:{name}", f"SELECT {sql}", None) for name, sql in dashboard_service.SOURCES.items()]
+    queries.append(("churn:aggregated_customers", db_service.AGGREGATION_SQL.format(where_clause=""), None))
+    queries.append(("churn:aggregated_customers(ids)", db_service.AGGREGATION_SQL.format(
+        where_clause="WHERE c.customer_id IN %(customer_ids)s"), {'customer_ids': customer_ids}))
+    queries.append(("sales:demand_top_products",
+                    demand_service.TOP_PRODUCTS_SQL.replace(':limit', '%(limit)s'), {'limit': 5}))
+    queries.append(("sales:demand_history", demand_service.HISTORY_SQL.text.replace(
+        ':product_ids', '%(product_ids)s'), {'product_ids': product_ids}))
+    queries.append(("sales:full_sales_view_history", rollup_service.DAILY_TOTALS_SQL.format(
+        where_clause="WHERE sale_date >= (SELECT MAX(sale_date) FROM daily_sales) - 180"), None))
+    return queries
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _walk(child)
+
+
+def explain(conn):
+    """Runs EXPLAIN ANALYZE on every endpoint query and lists their sequential scans.
+
+    Scans over at least SEQ_SCAN_MIN_ROWS rows are flagged; smaller tables are
+    cheaper to scan than to index and are only listed.
+    """
+    report = []
+    cursor = conn.cursor()
+    try:
+        for label, sql, params in endpoint_queries(cursor):
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+            result = cursor.fetchone()[0]
+            plan = (json.loads(result) if isinstance(result, str) else result)[0]
+            scans = [
+                {
+                    "relation": node.get('Relation Name'),
+                    "rows": int(node.get('Actual Rows', 0) * node.get('Actual Loops', 1)),
+                    "flagged": node.get('Actual Rows', 0) * node.get('Actual Loops', 1) >= SEQ_SCAN_MIN_ROWS,
+                }
+                for node in _walk(plan['Plan']) if node['Node Type'] == 'Seq Scan'
+            ]
+            report.append({
+                "query": label,
+                "execution_ms": round(plan['Execution Time'], 3),
+                "seq_scans": scans,
+            })
+        conn.rollback()
+    finally:
+        cursor.close()
+    return report
+
+
+if __name__ == '__main__':
+    # python -m app.services.schema [migrate|status|explain]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        if command == 'migrate':
+            applied = migrate(conn)
+            print(f"Success: {len(applied)} migration(s) applied.")
+            print(json.dumps(check(conn), indent=2))
+        elif command == 'status':
+            print(json.dumps(check(conn), indent=2))
+        elif command == 'explain':
+            report = explain(conn)
+            print(json.dumps(report, indent=2))
+            flagged = [(entry['query'], scan['relation']) for entry in report for scan in entry['seq_scans'] if scan['flagged']]
+            for query, relation in flagged:
+                print(f"Warning: {query} sequentially scans {relation}.")
+            sys.exit(1 if flagged else 0)
+        else:
+            print(f"Error: unknown command '{command}'. Use migrate, status or explain.")
+            sys.exit(2)
+    finally:
+        conn.close()
@@ -0,0 +1,154 @@
+import threading
+import pandas as pd
+from app.services import db_service, ml_service, model_store, data_version, metrics
+from app.services.risk_index import RiskIndex
+from app.services.churn_cube import ChurnCube
+from app.services.db import connect
+
+
+class ScoringSnapshot:
+    """Churn scores for every customer, computed once per data version.
+
+    Snapshots are shared by all endpoints and must be treated as read-only;
+    a data change produces a new snapshot instead of mutating this one.
+    """
+
+    def __init__(self, version, customers, data_version=0, model_version=None):
+        self.version = version
+        # Database watermark (services.data_version) the scores reflect.
+        self.data_version = data_version
+        # Churn model (model_store version id) that produced the scores.
+        self.model_version = model_version
+        self.customers = customers
+        self.probabilities = customers['churn_probability'].to_numpy()
+        self.predictions = customers['predicted_churn'].to_numpy()
+        self.probabilities.flags.writeable = False
+        self.predictions.flags.writeable = False
+        self.risk_index = RiskIndex(customers)
+        self.cube = ChurnCube(customers)
+
+    def __len__(self):
+        return len(self.customers)
+
+
+_snapshot = None
+_version = 0
+_build_lock = threading.Lock()
+
+
+def _score(customer_df, model_package):
+    customers, probabilities, predictions = ml_service.get_churn_predictions(customer_df, model_package)
+    customers['churn_probability'] = probabilities
+    customers['predicted_churn'] = predictions
+    return customers
+
+
+def _next_version():
+    global _version
+    _version += 1
+    return _version
+
+
+def build_snapshot(model_version, customer_df=None):
+    """Aggregates, featurizes and scores all customers with a model_store.ModelVersion into a new snapshot."""
+    with connect(read_only=True) as connection:
+        # Read where the data comes from (a replica may be behind the primary) and before
+        # aggregating: a concurrent import makes the snapshot look older, never newer.
+        watermark = data_version.read(connection)[0]
+        if customer_df is None:
+            customer_df = db_service.read_aggregated_data(connection)
+    customers = _score(customer_df, model_version.model)
+    return ScoringSnapshot(_next_version(), customers, watermark, model_version.version)
+
+
+def _is_stale(snapshot):
+    if snapshot is None or snapshot.data_version < data_version.current()[0]:
+        return True
+    # A model swapped in without a rebuilt snapshot (e.g. the rebuild failed) is caught here.
+    served_model = model_store.loaded_version('churn')
+    return served_model is not None and snapshot.model_version != served_model
+
+
+def get_snapshot():
+    """Returns the current snapshot, building it on demand.
+
+    A snapshot older than the database watermark (an import committed by
+    another worker) is rebuilt, so responses always match their ETag.
+    """
+    snapshot = _snapshot
+    stale = _is_stale(snapshot)
+    if stale:
+        with _build_lock:
+            if _is_stale(_snapshot):
+                _publish(build_snapshot(model_store.get_churn_version()))
+            snapshot = _snapshot
+    metrics.record_cache('scoring_snapshot', not stale)
+    model_store.note_served('churn', snapshot.model_version)
+    return snapshot
+
+
+def refresh_snapshot():
+    """Rebuilds the snapshot from the database and swaps it in atomically."""
+    with _build_lock:
+        snapshot = build_snapshot(model_store.get_churn_version())
+        _publish(snapshot)
+    return snapshot
+
+
+def apply_customer_updates(customer_ids, new_data_version=None):
+    """Re-aggregates and rescores only the given customers.
+
+    The rest of the current snapshot is carried over unchanged, so the cost
+    of a refresh follows the size of the import rather than the database.
+    new_data_version is the watermark the import committed; if the snapshot
+    missed an earlier version it is rebuilt in full instead.
+    """
+    if not customer_ids:
+        return _snapshot
+
+    with _build_lock:
+        current = _snapshot
+        model_version = model_store.get_churn_version()
+        if new_data_version is None:
+            new_data_version = current.data_version if current is not None else 0
+        updates = None
+        if (current is not None and current.data_version == new_data_version - 1
+                and current.model_version == model_version.version):
+            with connect(read_only=True) as connection:
+                # A connection that has not seen the import yet cannot supply its rows.
+                if data_version.read(connection)[0] >= new_data_version:
+                    updates = db_service.read_aggregated_data(connection, customer_ids)
+        if updates is None:
+            snapshot = build_snapshot(model_version)
+        else:
+            # The compiled pipeline uses training-time fill values, so a partial batch
+            # scores exactly as it would inside a full rebuild.
+            updated = _score(updates, model_version.model)
+            unchanged = current.customers[~current.customers['customer_id'].isin(updated['customer_id'])]
+            customers = pd.concat([unchanged, updated], ignore_index=True)
+            snapshot = ScoringSnapshot(_next_version(), customers, new_data_version, model_version.version)
+        _publish(snapshot)
+    return snapshot
+
+
+def _publish(snapshot):
+    global _snapshot
+    # A single reference assignment: readers see either the old or the new snapshot.
+    _snapshot = snapshot
+
+
+def _prepare_model_swap(model_version):
+    """Rescores every customer with a churn model about to be swapped in."""
+    if _snapshot is None:
+        # Nothing built yet: the first request builds with whatever model is served then.
+        return None
+    snapshot = build_snapshot(model_version)
+
+    def commit():
+        with _build_lock:
+            # An import may have published newer data meanwhile; get_snapshot then rebuilds.
+            _publish(snapshot)
+    return commit
+
+
+model_store.on_swap('churn', _prepare_model_swap)
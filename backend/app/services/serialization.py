@@ -0,0 +1,137 @@
+import datetime
+import io
+import json
+import math
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from flask import jsonify, request, current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+RESPONSE_FORMATS = ('records', 'columnar', 'arrow')
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def _default(obj):
+    """Types the JSON encoders do not know: Decimal, dates, NumPy scalars and arrays."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj):
+    """obj with NaN and infinities replaced by None, which is how orjson writes them (null)."""
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    if isinstance(obj, (float, np.floating, Decimal)) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson when installed and knows NumPy, Decimal and datetime.
+
+    Keys stay sorted, like Flask's default provider. NaN and infinities are
+    written as null with or without orjson (the stdlib would write NaN, which
+    is not valid JSON), so both paths decode to the same values; orjson writes
+    non-ASCII text as UTF-8 rather than \\u escapes.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None:
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+            if kwargs.get('indent'):
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=_default, option=option).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        try:
+            return json.dumps(obj, **{**kwargs, 'allow_nan': False})
+        except ValueError:
+            # Only bodies with a non-finite number pay for the extra pass.
+            return json.dumps(_finite(obj), **kwargs)
+
+
+def _records(df):
+    """df.to_dict(orient='records') without its per-cell boxing overhead."""
+    names = list(df.columns)
+    columns = [df[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _columns(data):
+    """(column names, {name: values}) for a DataFrame, a list of row dicts or a dict of columns."""
+    if isinstance(data, pd.DataFrame):
+        names = [str(name) for name in data.columns]
+        return names, {str(name): data[name].to_numpy() for name in data.columns}
+    if isinstance(data, dict):
+        return list(data), data
+    names = list(data[0]) if data else []
+    return names, {name: [row.get(name) for row in data] for name in names}
+
+
+def _arrow_response(names, columns, data):
+    if isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    else:
+        table = pa.table({name: columns[name] for name in names})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return current_app.response_class(sink.getvalue(), mimetype=ARROW_MIMETYPE)
+
+
+def _error(message, status):
+    response = jsonify({"error": message})
+    response.status_code = status
+    return response
+
+
+def tabular_response(data):
+    """Responds with a table in the format asked for by ?format=.
+
+    records (default): the endpoint's usual JSON (a DataFrame becomes a list of row objects).
+    columnar: {"columns": [...], "data": {column: [values...]}} with one array per column.
+    arrow: an Arrow IPC stream (needs pyarrow).
+    Always returns a Response object, so callers can add headers.
+    """
+    response_format = request.args.get('format', default='records')
+    if response_format not in RESPONSE_FORMATS:
+        return _error(f"format must be one of: {', '.join(RESPONSE_FORMATS)}", 400)
+
+    if response_format == 'records':
+        if isinstance(data, pd.DataFrame):
+            data = _records(data)
+        return jsonify(data)
+
+    names, columns = _columns(data)
+    if response_format == 'columnar':
+        return jsonify({"columns": names, "data": columns})
+
+    if pa is None:
+        return _error("format=arrow requires pyarrow to be installed.", 406)
+    return _arrow_response(names, columns, data)
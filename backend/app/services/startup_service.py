@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+import traceback
+from app.services import model_store, scoring_service, forecast_service, schema, analytics_engine
+
+# eager: load everything inside create_app (a failure stops the process).
+# background: serve immediately and warm up on a background thread.
+# lazy: serve immediately and load each resource on first use.
+# Background mode needs the app to be created in each worker (no gunicorn --preload),
+# since threads do not survive fork.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+# Phases that must finish before the instance reports ready.
+REQUIRED_PHASES = ('schema', 'churn_model', 'sales_forecaster', 'forecast_cache', 'scoring_snapshot')
+
+_phases = {}
+_phases_lock = threading.Lock()
+_started_at = time.time()
+_warmup_thread = None
+
+
+def _record(name, **fields):
+    with _phases_lock:
+        _phases.setdefault(name, {'status': 'pending', 'attempts': 0}).update(fields)
+
+
+def run_phase(name, fn):
+    """Runs one startup step, recording its status, attempts and duration."""
+    with _phases_lock:
+        attempts = _phases.get(name, {}).get('attempts', 0) + 1
+    _record(name, status='running', attempts=attempts)
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        _record(name, status='failed', seconds=round(time.perf_counter() - start, 3), error=str(e))
+        raise
+    _record(name, status='done', seconds=round(time.perf_counter() - start, 3), error=None)
+    return result
+
+
+def _warm_up_steps():
+    return (
+        ('schema', schema.ensure_schema),
+        ('churn_model', model_store.get_churn_package),
+        ('sales_forecaster', model_store.get_sales_forecaster),
+        ('forecast_cache', lambda: forecast_service.get_forecast(1)),
+        ('scoring_snapshot', scoring_service.get_snapshot),
+    )
+
+
+def _optional_steps():
+    # Until the replica is loaded (or if it cannot be), analytics sections query SQL.
+    if analytics_engine.is_enabled():
+        return (('analytics_replica', analytics_engine.get_replica),)
+    return ()
+
+
+def warm_up():
+    """Loads models and builds the scoring snapshot, failing on the first error.
+
+    Phases that already finished are skipped, so a retry resumes where it failed.
+    Optional phases run last; their failures are recorded and logged, never raised.
+    """
+    for name, step in _warm_up_steps():
+        with _phases_lock:
+            done = _phases.get(name, {}).get('status') == 'done'
+        if not done:
+            run_phase(name, step)
+    for name, step in _optional_steps():
+        with _phases_lock:
+            done = _phases.get(name, {}).get('status') == 'done'
+        if not done:
+            try:
+                run_phase(name, step)
+            except Exception as e:
+                print(f"Warning: Optional startup phase '{name}' failed; continuing without it: {e}")
+
+
+def _warm_up_until_ready():
+    # Retry so that an instance started while the database was down becomes ready once it is back.
+    while True:
+        try:
+            warm_up()
+            return
+        except Exception:
+            traceback.print_exc()
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+
+def start_background_warm_up():
+    global _warmup_thread
+    for name in REQUIRED_PHASES:
+        _record(name)
+    _warmup_thread = threading.Thread(target=_warm_up_until_ready, name='warm-up', daemon=True)
+    _warmup_thread.start()
+
+
+def is_ready():
+    # In lazy mode the work happens inside requests, so being up is all readiness can mean.
+    if STARTUP_MODE == 'lazy':
+        return True
+    with _phases_lock:
+        return all(_phases.get(name, {}).get('status') == 'done' for name in REQUIRED_PHASES)
+
+
+def status():
+    with _phases_lock:
+        phases = {name: dict(info) for name, info in _phases.items()}
+    return {
+        'mode': STARTUP_MODE,
+        'ready': is_ready(),
+        'uptime_seconds': round(time.time() - _started_at, 3),
+        'phases': phases,
+    }
@@ -0,0 +1,268 @@
+"""Deterministic synthetic customers/products/orders shaped like the sample .xls.
+
+Usage (from backend/):
+    BENCH_DB_NAME=churn_bench python -m benchmarks.datagen --scale 1m [--seed 0] [--append]
+    python -m benchmarks.datagen --orders 50000 --csv upload.csv
+
+Columns, categories and value ranges follow 'E-Commerce Customer Insights and
+Churn Dataset': the same 16 source columns, the same 5 categories x 8 product
+names, the same country/gender/status mix and the same date ranges. Unlike the
+sample (one order per customer and product) customers repeat about every
+ORDERS_PER_CUSTOMER orders and products every ORDERS_PER_PRODUCT orders, so
+aggregation, top-product and demand queries have real work to do.
+
+The same (orders, seed) always gives the same rows, whatever the chunk size.
+Loading goes through data_importer.import_chunks, so daily_sales and the
+data_version watermark are maintained exactly as for an upload.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+ORDERS_PER_CUSTOMER = 4
+ORDERS_PER_PRODUCT = 250
+MIN_PRODUCTS = 40
+# Rows are generated in fixed blocks so the output does not depend on chunk sizes.
+BLOCK_ROWS = 100_000
+# Orders per import transaction when loading; bounds the staging table.
+LOAD_BATCH_ROWS = 1_000_000
+
+CATEGORIES = {
+    'Beauty': ['Conditioner', 'Nail Polish', 'Perfume', 'Face Wash', 'Lipstick', 'Foundation', 'Moisturizer', 'Shampoo'],
+    'Clothing': ['Hoodie', 'Jacket', 'Sneakers', 'Dress', 'T-Shirt', 'Shirt', 'Jeans', 'Skirt'],
+    'Electronics': ['Smartwatch', 'Tablet', 'Camera', 'Headphones', 'Smartphone', 'Laptop', 'Bluetooth Speaker', 'Gaming Console'],
+    'Home': ['Refrigerator', 'Vacuum Cleaner', 'Sofa', 'Blender', 'Lamp', 'Chair', 'Dining Table', 'Microwave'],
+    'Sports': ['Football', 'Dumbbells', 'Cycling Helmet', 'Cricket Bat', 'Tennis Racket', 'Basketball', 'Running Shoes', 'Yoga Mat'],
+}
+CATALOG = [(category, name) for category, names in CATEGORIES.items() for name in names]
+GENDERS = (['Female', 'Male', 'Other'], [0.507, 0.459, 0.034])
+COUNTRIES = (['Germany', 'UK', 'Pakistan', 'India', 'USA', 'Canada'], [0.18, 0.175, 0.166, 0.162, 0.159, 0.158])
+STATUSES = (['active', 'cancelled', 'paused'], [0.602, 0.246, 0.152])
+SIGNUP_RANGE = (np.datetime64('2020-01-09'), np.datetime64('2023-12-08'))
+LAST_PURCHASE_END = np.datetime64('2025-12-08')
+# unit_price is log-normal around the sample's median (206.5) and mean (324.7).
+PRICE_MEDIAN, PRICE_SIGMA, PRICE_RANGE = 206.5, 0.95, (2.85, 1991.63)
+
+ID_OFFSETS = {'order': 5000, 'customer': 1000, 'product': 200}
+
+
+def entity_counts(n_orders):
+    """(customers, products) generated for n_orders orders."""
+    customers = max(1, n_orders // ORDERS_PER_CUSTOMER)
+    products = max(MIN_PRODUCTS, n_orders // ORDERS_PER_PRODUCT)
+    return customers, products
+
+
+def _ids(prefix, offset, numbers):
+    return np.char.add(prefix, (numbers + offset).astype(str)).astype(object)
+
+
+class _Entities:
+    """Per-customer and per-product attributes, drawn once so repeated ids stay consistent."""
+
+    def __init__(self, n_customers, n_products, seed):
+        rng = np.random.default_rng([seed, 0])
+        self.age = rng.integers(18, 70, size=n_customers)
+        self.gender = rng.choice(GENDERS[0], size=n_customers, p=GENDERS[1])
+        self.country = rng.choice(COUNTRIES[0], size=n_customers, p=COUNTRIES[1])
+        span = int((SIGNUP_RANGE[1] - SIGNUP_RANGE[0]).astype(int))
+        self.signup = SIGNUP_RANGE[0] + rng.integers(0, span + 1, size=n_customers).astype('timedelta64[D]')
+        self.catalog = rng.integers(0, len(CATALOG), size=n_products)
+        self.catalog[:min(n_products, len(CATALOG))] = np.arange(min(n_products, len(CATALOG)))
+        # Skewed popularity, so top-N product queries have a clear head.
+        weights = 1.0 / np.arange(1, n_products + 1) ** 0.8
+        self.product_weights = rng.permutation(weights / weights.sum())
+
+
+def _block(entities, start, stop, seed, order_offset):
+    rng = np.random.default_rng([seed, 1, start])
+    n = stop - start
+    customer = rng.integers(0, len(entities.age), size=n)
+    product = rng.choice(len(entities.catalog), size=n, p=entities.product_weights)
+    signup = entities.signup[customer]
+    days_open = (LAST_PURCHASE_END - signup).astype(int)
+    last_purchase = signup + (rng.random(n) * (days_open + 1)).astype(int).astype('timedelta64[D]')
+    price = np.clip(rng.lognormal(np.log(PRICE_MEDIAN), PRICE_SIGMA, size=n), *PRICE_RANGE)
+    catalog = entities.catalog[product]
+
+    return pd.DataFrame({
+        'order_id': _ids('ORD', ID_OFFSETS['order'] + order_offset, np.arange(start, stop)),
+        'customer_id': _ids('CUST', ID_OFFSETS['customer'], customer),
+        'age': entities.age[customer],
+        'gender': entities.gender[customer],
+        'product_id': _ids('PROD', ID_OFFSETS['product'], product),
+        'country': entities.country[customer],
+        'signup_date': pd.to_datetime(signup),
+        'last_purchase_date': pd.to_datetime(last_purchase),
+        'cancellations_count': rng.integers(0, 6, size=n),
+        'subscription_status': rng.choice(STATUSES[0], size=n, p=STATUSES[1]),
+        'unit_price': price.round(2),
+        'quantity': rng.integers(1, 10, size=n),
+        'purchase_frequency': rng.integers(1, 50, size=n),
+        'product_name': np.asarray([CATALOG[i][1] for i in range(len(CATALOG))], dtype=object)[catalog],
+        'category': np.asarray([CATALOG[i][0] for i in range(len(CATALOG))], dtype=object)[catalog],
+        'Ratings': np.clip(rng.normal(4.07, 0.31, size=n), 2.0, 5.0).round(1),
+    })
+
+
+def generate_chunks(n_orders, seed=0, order_offset=0, entity_orders=None):
+    """Yields DataFrames of up to BLOCK_ROWS orders with the upload file's columns.
+
+    order_offset shifts the order ids, so a second batch (e.g. a benchmark
+    upload) adds new orders for the customers and products of a loaded scale;
+    entity_orders is that scale's order count.
+    """
+    n_customers, n_products = entity_counts(entity_orders or n_orders)
+    entities = _Entities(n_customers, n_products, seed)
+    for start in range(0, n_orders, BLOCK_ROWS):
+        yield _block(entities, start, min(start + BLOCK_ROWS, n_orders), seed, order_offset)
+
+
+def extra_order_offset(n_orders):
+    """Order id offset for batches added on top of a loaded scale, clear of its own ids."""
+    return 10 * n_orders
+
+
+def is_loaded(cursor, n_orders):
+    """True when the database holds exactly the n_orders scale (plus any extra batches)."""
+    last, past = _ids('ORD', ID_OFFSETS['order'], np.array([n_orders - 1, n_orders]))
+    cursor.execute("SELECT COUNT(*) FROM orders WHERE order_id IN (%s, %s)", (last, past))
+    if cursor.fetchone()[0] != 1:
+        return False
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM orders WHERE order_id = %s)", (last,))
+    return cursor.fetchone()[0]
+
+
+def write_csv(path, n_orders, seed=0, order_offset=0, entity_orders=None):
+    """Writes generated orders to a CSV file in the upload format."""
+    header = True
+    for chunk in generate_chunks(n_orders, seed, order_offset, entity_orders):
+        chunk.to_csv(path, mode='w' if header else 'a', header=header, index=False, date_format='%Y-%m-%d')
+        header = False
+    return path
+
+
+def _run(statement):
+    from app.services.db import raw_connection
+
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def load(n_orders, seed=0, append=False, progress=None):
+    """Migrates the schema and loads n_orders generated orders. Returns timing and row counts.
+
+    Each transaction gets its own connection: raw_connection lifts the
+    statement timeout for the first transaction only.
+    """
+    from app.services import schema
+    from app.services.db import raw_connection
+    from data_importer import import_chunks
+
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        schema.migrate(conn)
+    finally:
+        conn.close()
+    if not append:
+        _run("TRUNCATE orders, customers, products, daily_sales, customer_versions")
+
+    start = time.perf_counter()
+    chunks = generate_chunks(n_orders, seed)
+    inserted = 0
+    while True:
+        batch, rows = [], 0
+        for chunk in chunks:
+            batch.append(chunk)
+            rows += len(chunk)
+            if rows >= LOAD_BATCH_ROWS:
+                break
+        if not batch:
+            break
+        conn = raw_connection(statement_timeout_ms=0)
+        try:
+            result = import_chunks(conn, batch)
+        finally:
+            conn.close()
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        inserted += result['rows_inserted']
+        if progress:
+            progress(inserted)
+    _run("ANALYZE")
+
+    seconds = time.perf_counter() - start
+    n_customers, n_products = entity_counts(n_orders)
+    return {
+        'orders': n_orders,
+        'rows_inserted': inserted,
+        'customers': n_customers,
+        'products': n_products,
+        'seed': seed,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(n_orders / seconds, 1) if seconds else None,
+    }
+
+
+def use_bench_database():
+    """Points the app's DB settings at BENCH_DB_NAME (default churn_bench), creating it if needed.
+
+    Must run before app.services.db is imported. Never touches DB_NAME's database.
+    """
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    name = os.getenv("BENCH_DB_NAME", "churn_bench")
+    os.environ["DB_NAME"] = name
+    conn = psycopg2.connect(dbname='postgres', user=os.getenv("DB_USER"), password=os.getenv("DB_PASS"),
+                            host=os.getenv("DB_HOST", "localhost"), port=os.getenv("DB_PORT", "5432"))
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+        if cursor.fetchone() is None:
+            cursor.execute(f'CREATE DATABASE "{name}"')
+            print(f"Success: Created benchmark database '{name}'.")
+    finally:
+        conn.close()
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--orders', type=int, help='overrides --scale')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--append', action='store_true', help='keep existing rows instead of truncating')
+    parser.add_argument('--csv', help='write an upload file here instead of loading the database')
+    args = parser.parse_args()
+    n_orders = args.orders or SCALES[args.scale]
+
+    if args.csv:
+        write_csv(args.csv, n_orders, args.seed)
+        print(f"Success: Wrote {n_orders} orders to '{args.csv}'.")
+        return
+
+    use_bench_database()
+    report = load(n_orders, args.seed, append=args.append,
+                  progress=lambda rows: print(f"Success: {rows} orders loaded.", file=sys.stderr))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""Times every sales, churn and utility route and both training scripts against synthetic data.
+
+Usage (from backend/):
+    BENCH_DB_NAME=churn_bench python -m benchmarks.endpoint_bench --scales 10k,1m [--output report.json]
+        [--thresholds benchmarks/thresholds.json] [--baseline previous.json --tolerance 1.5]
+        [--repeat 5] [--seed 0] [--reuse-data]
+
+For each scale the run loads datagen's orders into the benchmark database
+(BENCH_DB_NAME, never DB_NAME's), trains both models with train_model.py and
+train_forcaster.py in a scratch directory, starts the app there with the
+Flask test client and requests each route: once cold, then --repeat times.
+The upload is timed from the POST until its import job finishes.
+
+Prints one JSON document (also written to --output). A result regresses when
+its median exceeds its threshold for that scale, or --tolerance times the
+median of the same result in --baseline (and by more than --min-delta-ms).
+The exit status is 1 if anything regressed or failed, so the run can gate CI.
+Thresholds are checked in for 10k and 1m; 10m runs rely on --baseline.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from benchmarks import datagen
+
+BENCHMARKED_BLUEPRINTS = ('sales_bp', 'churn_bp', 'utility_bp')
+TRAINING_SCRIPTS = ('train_model.py', 'train_forcaster.py')
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+SCORE_BATCH_ROWS = 1000
+# Upload size as a share of the scale, so the import cost grows with it.
+UPLOAD_FRACTION = 0.01
+UPLOAD_POLL_SECONDS = 0.05
+
+
+def summarize(name, kind, timings, status=200, size=None, **extra):
+    """Cold (first) call plus min/median/p95 of the rest, in milliseconds."""
+    warm = timings[1:] or timings
+    ordered = sorted(warm)
+    result = {
+        'name': name,
+        'kind': kind,
+        'status': status,
+        'cold_ms': round(timings[0] * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+        'runs': len(timings),
+    }
+    if size is not None:
+        result['bytes'] = size
+    result.update(extra)
+    return result
+
+
+def run_training(script, workdir, env):
+    """Runs one training script in workdir; returns wall time and the child's peak RSS."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, script)], cwd=workdir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.stdout.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    failed = process.returncode != 0 or b'Error:' in output
+    result = summarize(script, 'training', [seconds], status=500 if failed else 200,
+                       max_rss_kb=usage.ru_maxrss)
+    if failed:
+        result['error'] = output.decode(errors='replace')[-2000:]
+    return result
+
+
+def time_requests(client, method, url, repeat, **kwargs):
+    timings = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()
+        timings.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            break
+    return summarize(f"{method} {url}", 'route', timings, status=response.status_code,
+                     size=len(response.get_data()))
+
+
+def score_payload(n_rows, seed):
+    """Aggregated customer records, as a client would send to /score_customers."""
+    import numpy as np
+
+    rng = np.random.default_rng([seed, 2])
+    signup = datagen.SIGNUP_RANGE[0] + rng.integers(0, 1400, size=n_rows).astype('timedelta64[D]')
+    purchases = rng.integers(1, 20, size=n_rows)
+    spend = (rng.lognormal(np.log(datagen.PRICE_MEDIAN), datagen.PRICE_SIGMA, size=n_rows) * purchases).round(2)
+    return [
+        {
+            'customer_id': f"BENCH{i}",
+            'age': int(rng.integers(18, 70)),
+            'gender': datagen.GENDERS[0][i % 3],
+            'country': datagen.COUNTRIES[0][i % 6],
+            'signup_date': str(signup[i]),
+            'last_purchase_date': str(signup[i] + int(rng.integers(0, 700))),
+            'purchase_count': int(purchases[i]),
+            'total_spend': float(spend[i]),
+            'total_cancellations': int(rng.integers(0, 6)),
+            'avg_rating': round(float(rng.normal(4.07, 0.31)), 1),
+        }
+        for i in range(n_rows)
+    ]
+
+
+def time_upload(client, n_orders, scale_orders, seed, workdir):
+    """POST /api/upload_data, then poll the job until it finishes."""
+    path = datagen.write_csv(os.path.join(workdir, 'bench_upload.csv'), n_orders, seed,
+                             order_offset=datagen.extra_order_offset(scale_orders), entity_orders=scale_orders)
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = client.post('/api/upload_data', data={'file': (f, 'bench_upload.csv')},
+                               content_type='multipart/form-data')
+    accepted = time.perf_counter() - start
+    if response.status_code != 202:
+        return [summarize('POST /api/upload_data', 'route', [accepted], status=response.status_code,
+                          error=response.get_json())]
+
+    status_url = response.get_json()['status_url']
+    polls = []
+    while True:
+        poll_start = time.perf_counter()
+        job = client.get(status_url).get_json()
+        polls.append(time.perf_counter() - poll_start)
+        if job['status'] in ('succeeded', 'failed'):
+            break
+        time.sleep(UPLOAD_POLL_SECONDS)
+    total = time.perf_counter() - start
+    upload = summarize('POST /api/upload_data', 'route', [total], status=200 if job['status'] == 'succeeded' else 500,
+                       accept_ms=round(accepted * 1000, 3), rows=n_orders,
+                       rows_per_second=job['rows_per_second'], error=job['error'])
+    poll = summarize('GET /api/import_jobs/<job_id>', 'route', polls)
+    return [upload, poll]
+
+
+def benchmark_routes(app, scale_orders, repeat, seed, workdir):
+    client = app.test_client()
+    results = []
+    covered = set()
+
+    # Read-only GET routes without URL parameters, in a stable order.
+    rules = sorted((rule for rule in app.url_map.iter_rules()
+                    if rule.endpoint.split('.')[0] in BENCHMARKED_BLUEPRINTS), key=lambda rule: rule.rule)
+    for rule in rules:
+        if 'GET' in rule.methods and not rule.arguments:
+            results.append(time_requests(client, 'GET', rule.rule, repeat))
+            covered.add(rule.endpoint)
+
+    payload = score_payload(SCORE_BATCH_ROWS, seed)
+    results.append(time_requests(client, 'POST', '/api/score_customers', repeat, json=payload))
+    results[-1]['rows'] = SCORE_BATCH_ROWS
+    covered.add('churn_bp.score_customers')
+
+    # Last: the upload changes the data the other routes read.
+    results.extend(time_upload(client, max(1000, int(scale_orders * UPLOAD_FRACTION)), scale_orders, seed, workdir))
+    covered.update(('utility_bp.upload_data', 'utility_bp.get_import_job'))
+
+    for rule in rules:
+        if rule.endpoint not in covered:
+            results.append({'name': rule.rule, 'kind': 'route', 'status': None, 'skipped': 'no benchmark case'})
+    return results
+
+
+def benchmark_scale(scale, args, env):
+    from app.services import schema
+    from app.services.db import raw_connection
+
+    n_orders = datagen.SCALES[scale]
+    results = []
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        schema.migrate(conn)
+        cursor = conn.cursor()
+        loaded = datagen.is_loaded(cursor, n_orders)
+        conn.rollback()
+    finally:
+        conn.close()
+    if not (args.reuse_data and loaded):
+        load = datagen.load(n_orders, args.seed)
+        results.append(summarize('load', 'load', [load['seconds']], rows=n_orders,
+                                 rows_per_second=load['rows_per_second']))
+
+    workdir = tempfile.mkdtemp(prefix=f'bench-{scale}-')
+    try:
+        for script in TRAINING_SCRIPTS:
+            results.append(run_training(script, workdir, env))
+
+        # The app loads its models from the working directory, so serve the freshly trained ones.
+        previous_dir = os.getcwd()
+        os.chdir(workdir)
+        try:
+            from app import create_app
+            app = create_app()
+            results.extend(benchmark_routes(app, n_orders, args.repeat, args.seed, workdir))
+        finally:
+            os.chdir(previous_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def run_scale(scale, args, env):
+    """Benchmarks one scale in a fresh interpreter, so no model or cache outlives its data."""
+    command = [sys.executable, os.path.abspath(__file__), '--run-scale', scale,
+               '--seed', str(args.seed), '--repeat', str(args.repeat)]
+    if args.reuse_data:
+        command.append('--reuse-data')
+    process = subprocess.run(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        return [{'name': 'benchmark', 'kind': 'scale', 'status': None, 'error': f"exit status {process.returncode}"}]
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def judge(report, thresholds, baseline, tolerance, min_delta_ms):
+    """Marks each result with its limits and collects regressions and failures."""
+    previous = {}
+    for scale in (baseline or {}).get('scales', {}).values():
+        for result in scale['results']:
+            previous[(scale['scale'], result['name'])] = result.get('median_ms')
+
+    problems = []
+    for scale in report['scales'].values():
+        limits = thresholds.get(scale['scale'], {})
+        for result in scale['results']:
+            if 'skipped' in result:
+                continue
+            key = (scale['scale'], result['name'])
+            if result['status'] is None or result['status'] >= 400:
+                problems.append({'scale': key[0], 'name': key[1], 'reason': f"status {result['status']}"})
+                continue
+            threshold = limits.get(result['name'])
+            if threshold is not None:
+                result['threshold_ms'] = threshold
+                if result['median_ms'] > threshold:
+                    problems.append({'scale': key[0], 'name': key[1], 'reason': f"median {result['median_ms']} ms > threshold {threshold} ms"})
+            if previous.get(key):
+                result['baseline_ms'] = previous[key]
+                slower = result['median_ms'] - previous[key]
+                if result['median_ms'] > previous[key] * tolerance and slower > min_delta_ms:
+                    problems.append({'scale': key[0], 'name': key[1], 'reason': f"median {result['median_ms']} ms > {tolerance}x baseline {previous[key]} ms"})
+    report['regressions'] = problems
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='10k', help=f"comma-separated, from {', '.join(datagen.SCALES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--reuse-data', action='store_true', help='skip loading when the scale is already loaded')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS)
+    parser.add_argument('--baseline', help='an earlier report to compare medians against')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help='ignore baseline slowdowns smaller than this (timer noise on fast routes)')
+    parser.add_argument('--output')
+    parser.add_argument('--run-scale', choices=sorted(datagen.SCALES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    scales = args.scales.split(',')
+    unknown = [scale for scale in scales if scale not in datagen.SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    database = datagen.use_bench_database()
+    # The app and the training scripts must not warm up against anything else.
+    os.environ.setdefault('STARTUP_MODE', 'eager')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.getenv('PYTHONPATH')])))
+
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.run_scale:
+        print(json.dumps(benchmark_scale(args.run_scale, args, env)))
+        return
+
+    report = {'database': database, 'seed': args.seed, 'repeat': args.repeat, 'scales': {}}
+    for scale in scales:
+        report['scales'][scale] = {
+            'scale': scale,
+            'orders': datagen.SCALES[scale],
+            'results': run_scale(scale, args, env),
+        }
+    problems = judge(report, thresholds, baseline, args.tolerance, args.min_delta_ms)
+
+    document = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document)
+    print(document)
+    for problem in problems:
+        print(f"Warning: {problem['scale']} {problem['name']}: {problem['reason']}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmarks churn inference: sklearn RandomForest vs. the flattened FlatForest.
+
+Usage (from backend/):
+    python -m benchmarks.inference_bench [--model churn_model.pkl] [--batches 1,100,1000,10000]
+
+Prints one JSON document with a parity check, per-batch latency for the
+route pattern the app used to run (predict_proba + predict) and for the
+single-pass engines, and the memory each backend adds to a fresh process
+that loads it and scores one --memory-rows batch.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.forest_engine import FlatForest, check_parity
+
+warnings.filterwarnings('ignore')
+
+
+def synthetic_features(model_package, n_rows, seed=0):
+    """Scaled numeric columns are ~N(0, 1); one-hot columns get a single 1 per category."""
+    rng = np.random.default_rng(seed)
+    columns = model_package['model_columns']
+    X = np.zeros((n_rows, len(columns)), dtype=np.float32)
+    numeric = set(model_package['numeric_columns'])
+    for j, column in enumerate(columns):
+        if column in numeric:
+            X[:, j] = rng.normal(size=n_rows)
+    for prefix in ('gender_', 'country_'):
+        positions = [j for j, c in enumerate(columns) if c.startswith(prefix)]
+        if positions:
+            choice = rng.integers(-1, len(positions), size=n_rows)
+            rows = np.flatnonzero(choice >= 0)
+            X[rows, np.asarray(positions)[choice[rows]]] = 1.0
+    return X
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def memory_kb():
+    """Rss, and the clean (shareable page cache) and dirty (per-process) private parts of it."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Private_Clean', 'Private_Dirty'):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def child_memory(backend, model_path, forest_dir, n_features, n_rows):
+    """Runs in a fresh interpreter: load one backend, score one batch and report the memory it added."""
+    import sklearn.ensemble  # noqa: F401 - import cost is the same for both backends
+    X = np.random.default_rng(0).normal(size=(n_rows, n_features)).astype(np.float32)
+    before = memory_kb()
+    if backend == 'sklearn':
+        model = joblib.load(model_path)['model']
+        model.predict_proba(X)
+    else:
+        forest = FlatForest.load(forest_dir, mmap_mode='r')
+        # Fault every page in, as scoring eventually does.
+        for name in ('feature', 'threshold', 'children', 'is_leaf', 'leaf_value', 'roots'):
+            np.asarray(getattr(forest, name)).sum()
+        forest.predict_proba(X)
+    after = memory_kb()
+    print(json.dumps({key: after[key] - before[key] for key in after}))
+
+
+def measure_memory(backend, model_path, forest_dir, n_features, n_rows):
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        return None
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child-memory', backend, '--model', model_path,
+         '--forest-dir', forest_dir, '--features', str(n_features), '--memory-rows', str(n_rows)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='churn_model.pkl')
+    parser.add_argument('--batches', default='1,100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--forest-dir')
+    parser.add_argument('--memory-rows', type=int, default=500,
+                        help='batch scored before the memory reading, so per-process scoring state counts')
+    parser.add_argument('--child-memory', choices=['sklearn', 'forest'])
+    parser.add_argument('--features', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_memory:
+        child_memory(args.child_memory, args.model, args.forest_dir, args.features, args.memory_rows)
+        return
+
+    package = joblib.load(args.model)
+    model = package['model']
+    forest = FlatForest.from_sklearn(model)
+    batches = [int(b) for b in args.batches.split(',')]
+    X_all = synthetic_features(package, max(batches))
+
+    report = {
+        'model': args.model,
+        'trees': forest.n_trees,
+        'nodes': int(len(forest.feature)),
+        'max_depth': forest.max_depth,
+        'parity': check_parity(model, forest, X_all[:min(len(X_all), 5000)]),
+        'latency_seconds': [],
+    }
+    for n_rows in batches:
+        X = X_all[:n_rows]
+        report['latency_seconds'].append({
+            'rows': n_rows,
+            'sklearn_proba_and_predict': best_of(lambda: (model.predict_proba(X), model.predict(X)), args.repeat),
+            'sklearn_single_pass': best_of(lambda: model.predict_proba(X), args.repeat),
+            'flat_forest': best_of(lambda: forest.predict_scores(X), args.repeat),
+        })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        forest_dir = args.forest_dir or os.path.join(tmp, 'forest')
+        if not args.forest_dir:
+            forest.save(forest_dir)
+        n_features = len(package['model_columns'])
+        report['memory_kb'] = {
+            'rows_scored': args.memory_rows,
+            'sklearn': measure_memory('sklearn', args.model, forest_dir, n_features, args.memory_rows),
+            'flat_forest_mmap': measure_memory('forest', args.model, forest_dir, n_features, args.memory_rows),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
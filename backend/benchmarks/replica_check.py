@@ -0,0 +1,201 @@
+"""Checks read routing against a primary and a streaming standby (DB_REPLICAS).
+
+Usage (from backend/):
+    BENCH_DB_NAME=replica_check DB_REPLICAS=127.0.0.1:5433 python -m benchmarks.replica_check
+        [--orders 1000] [--max-lag 2] [--timeout 60] [--down-replica 127.0.0.1:1]
+
+DB_HOST/DB_PORT is the primary and DB_REPLICAS one standby streaming from
+it. A local pair can be set up with (the primary's default pg_hba allows
+local replication connections):
+
+    pg_basebackup -h 127.0.0.1 -p 5432 -U postgres -D /tmp/standby -R
+    pg_ctl -D /tmp/standby -o '-p 5433' -l /tmp/standby/log start
+
+The data goes to BENCH_DB_NAME (default churn_bench; created on the primary,
+streamed to the standby, never DB_NAME's): datagen loads --orders orders,
+then one more order is imported. DB_USER must be allowed to call
+pg_wal_replay_pause() on the standby (a superuser is). Checks, in order:
+
+    routing           read-only connections go to the caught-up standby, the rest to the primary
+    read_only_guard   a write on a read-only connection fails on the standby
+    read_your_writes  with replay paused, reads after an import go to the primary and see it
+    lagging_replica   without read-your-writes, a standby missing the import for longer
+                      than --max-lag seconds leaves the rotation
+    resumed           once replay resumes the standby catches up and serves reads again
+    down_replica      an unreachable replica (--down-replica) is skipped, also when it
+                      goes down between health checks
+
+Prints one line per check and the replicas' last health checks as JSON.
+The exit status is 1 if any check failed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import datagen
+
+POLL_SECONDS = 0.1
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def wait_for(condition, timeout, what):
+    """Polls condition until it is true; raises CheckFailed after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise CheckFailed(f"timed out after {timeout}s waiting for {what}")
+        time.sleep(POLL_SECONDS)
+
+
+def read_target(read_only=True):
+    """('replica' or 'primary', data version) of the database a connection is routed to."""
+    from sqlalchemy import text
+    from app.services import data_version
+    from app.services.db import connect
+
+    with connect(read_only=read_only) as connection:
+        in_recovery = connection.execute(text("SELECT pg_is_in_recovery()")).scalar()
+        return ('replica' if in_recovery else 'primary'), data_version.read(connection)[0]
+
+
+def set_replay(replica, paused):
+    from sqlalchemy import text
+
+    with replica.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text(f"SELECT pg_wal_replay_{'pause' if paused else 'resume'}()"))
+
+
+def import_one_order(n_orders, seed):
+    """Imports one more order for a loaded scale; returns the data version it committed."""
+    from app.services.db import raw_connection
+    from data_importer import import_chunks
+
+    chunk = next(datagen.generate_chunks(1, seed, datagen.extra_order_offset(n_orders), entity_orders=n_orders))
+    conn = raw_connection(statement_timeout_ms=0)
+    try:
+        result = import_chunks(conn, [chunk])
+    finally:
+        conn.close()
+    if not result['success']:
+        raise CheckFailed(f"import failed: {result['error']}")
+    return result['data_version']
+
+
+def expect(actual, expected, what):
+    if actual != expected:
+        raise CheckFailed(f"{what}: expected {expected}, got {actual}")
+
+
+def run_checks(args):
+    from app.services import db, data_version
+
+    replica = db.replicas[0]
+    state = {}
+    db._start_replica_checks()
+
+    def routing():
+        primary_version = data_version.current()[0]
+        wait_for(lambda: replica.healthy and replica.data_version == primary_version, args.timeout,
+                 f"the standby to replay data version {primary_version}")
+        expect(read_target(), ('replica', primary_version), "read-only connection")
+        expect(read_target(read_only=False)[0], 'primary', "read-write connection")
+
+    def read_only_guard():
+        from sqlalchemy import text
+        from app.services.db import connect
+
+        try:
+            with connect(read_only=True) as connection:
+                connection.execute(text("CREATE TEMP TABLE replica_check_write (x INT)"))
+        except Exception:
+            return
+        raise CheckFailed("a write on a read-only connection succeeded")
+
+    def read_your_writes():
+        set_replay(replica, paused=True)
+        state['paused'] = True
+        state['version'] = import_one_order(args.orders, args.seed)
+        expect(read_target(), ('primary', state['version']), "read right after the import")
+        checked_at = replica.checked_at
+        wait_for(lambda: replica.checked_at != checked_at, args.timeout, "a standby health check")
+        expect(replica.data_version < state['version'], True, "standby behind while paused")
+        expect(read_target(), ('primary', state['version']), "read after the next health check")
+
+    def lagging_replica():
+        db.DB_READ_YOUR_WRITES = False
+        db.DB_REPLICA_MAX_LAG_SECONDS = args.max_lag
+        wait_for(lambda: replica.lag_seconds is not None and replica.lag_seconds > args.max_lag
+                 and not replica.healthy, args.timeout + args.max_lag, "the standby to exceed --max-lag")
+        expect(read_target(), ('primary', state['version']), "read from a lagging standby's rotation")
+
+    def resumed():
+        set_replay(replica, paused=False)
+        state['paused'] = False
+        db.DB_READ_YOUR_WRITES = True
+        wait_for(lambda: replica.healthy and replica.data_version == state['version'], args.timeout,
+                 "the standby to catch up")
+        expect(read_target(), ('replica', state['version']), "read-only connection after catching up")
+
+    def down_replica():
+        down = db.Replica(db._replica_url(args.down_replica))
+        live = list(db.replicas)
+        db.replicas[:] = [down]
+        try:
+            expect(db.check_replica(down), False, "health check of the down replica")
+            expect(read_target()[0], 'primary', "read with the only replica down")
+            # Down since its last check passed: the read falls back and takes it out of rotation.
+            down.healthy, down.data_version = True, data_version.current()[0]
+            expect(read_target()[0], 'primary', "read from a replica that went down")
+            expect(down.healthy, False, "replica that went down")
+        finally:
+            db.replicas[:] = live
+
+    checks = [routing, read_only_guard, read_your_writes, lagging_replica, resumed, down_replica]
+    failures = 0
+    try:
+        for check in checks:
+            try:
+                check()
+                print(f"Success: {check.__name__}")
+            except Exception as e:
+                failures += 1
+                print(f"Error: {check.__name__}: {e}")
+    finally:
+        if state.get('paused'):
+            set_replay(replica, paused=False)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000, help='orders loaded before the checks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-lag', type=float, default=2.0, help='DB_REPLICA_MAX_LAG_SECONDS for the lag check')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for the standby at each step')
+    parser.add_argument('--down-replica', default='127.0.0.1:1', help='an address no database listens on')
+    args = parser.parse_args()
+
+    datagen.use_bench_database()
+    if not os.getenv("DB_REPLICAS"):
+        parser.error("set DB_REPLICAS to the standby (host:port)")
+    # Must be set before app.services.db is imported: fast health checks, no cached watermark.
+    os.environ.setdefault("DB_REPLICA_CHECK_INTERVAL", "0.5")
+    os.environ["DATA_VERSION_TTL"] = "0"
+    os.environ["DB_READ_YOUR_WRITES"] = "true"
+
+    from app.services import db
+
+    datagen.load(args.orders, args.seed)
+    failures = run_checks(args)
+    print(json.dumps(db.pool_stats()['replicas'], indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,238 @@
+import io
+import os
 import pandas as pd
-import psycopg2
-from psycopg2 import extras
+from psycopg2 import sql
+from app.services import rollup_service, data_version
 
-def insert_data_from_df(conn, df):
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "50000"))
+
+# Columns of one upload row, in the order they are COPYed into the staging table.
+STAGING_COLUMNS = [
+    ('customer_id', 'TEXT'), ('age', 'NUMERIC'), ('gender', 'TEXT'), ('country', 'TEXT'),
+    ('signup_date', 'TIMESTAMP'), ('product_id', 'TEXT'), ('product_name', 'TEXT'),
+    ('category', 'TEXT'), ('order_id', 'TEXT'), ('last_purchase_date', 'TIMESTAMP'),
+    ('cancellations_count', 'NUMERIC'), ('subscription_status', 'TEXT'), ('unit_price', 'NUMERIC'),
+    ('quantity', 'NUMERIC'), ('purchase_frequency', 'NUMERIC'), ('Ratings', 'NUMERIC'),
+]
+SOURCE_COLUMNS = [name for name, _ in STAGING_COLUMNS]
+DATE_COLUMNS = ['signup_date', 'last_purchase_date']
+NUMERIC_COLUMNS = ['age', 'cancellations_count', 'unit_price', 'quantity', 'purchase_frequency', 'Ratings']
+
+CUSTOMER_COLUMNS = ['customer_id', 'age', 'gender', 'country', 'signup_date']
+PRODUCT_COLUMNS = ['product_id', 'product_name', 'category']
+# Target column -> staging column; only Ratings is renamed.
+ORDER_COLUMNS = {
+    'order_id': 'order_id', 'customer_id': 'customer_id', 'product_id': 'product_id',
+    'last_purchase_date': 'last_purchase_date', 'cancellations_count': 'cancellations_count',
+    'subscription_status': 'subscription_status', 'unit_price': 'unit_price', 'quantity': 'quantity',
+    'purchase_frequency': 'purchase_frequency', 'ratings': 'Ratings',
+}
+SUPPORTED_EXTENSIONS = ('.xls', '.xlsx', '.csv', '.parquet')
+
+
+def clean_chunk(df):
+    """Vectorized cleaning of one chunk; same rules as the original importer."""
+    missing = [col for col in SOURCE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    df = df[SOURCE_COLUMNS].copy()
+    for col in DATE_COLUMNS:
+        # Parse value by value: CSV text mixes formats the way Excel cells mix dates and strings.
+        df[col] = pd.to_datetime(df[col], errors='coerce', format='mixed')
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+
+def _frames_from_rows(rows, chunk_size):
+    """Groups an iterator of row tuples (header first) into DataFrames of chunk_size rows."""
+    header = None
+    batch = []
+    for row in rows:
+        if header is None:
+            header = [str(col).strip() if col is not None else '' for col in row]
+            continue
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield pd.DataFrame(batch, columns=header)
+            batch = []
+    if batch or header is None:
+        yield pd.DataFrame(batch, columns=header or [])
+
+
+def _xlsx_rows(file):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _xls_rows(file):
+    import xlrd
+
+    # .xls is capped at 65536 rows per sheet, so xlrd reading the whole file is bounded.
+    book = xlrd.open_workbook(file_contents=file.read(), on_demand=True)
+    sheet = book.sheet_by_index(0)
+    for row in sheet.get_rows():
+        yield tuple(
+            xlrd.xldate_as_datetime(cell.value, book.datemode) if cell.ctype == xlrd.XL_CELL_DATE
+            else (None if cell.ctype == xlrd.XL_CELL_EMPTY else cell.value)
+            for cell in row
+        )
+
+
+def iter_chunks(file, filename, chunk_size=IMPORT_CHUNK_ROWS):
+    """Yields the upload as DataFrames of at most chunk_size rows, picking a reader by extension."""
+    name = filename.lower()
+    if name.endswith('.csv'):
+        yield from pd.read_csv(file, chunksize=chunk_size)
+    elif name.endswith('.xlsx'):
+        yield from _frames_from_rows(_xlsx_rows(file), chunk_size)
+    elif name.endswith('.xls'):
+        yield from _frames_from_rows(_xls_rows(file), chunk_size)
+    elif name.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet uploads require pyarrow to be installed.")
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported file type. Use one of: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+
+def _column_types(cursor, table):
+    cursor.execute(
+        "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped",
+        (table,))
+    return dict(cursor.fetchall())
+
+
+def _select_list(column_types, columns):
+    """Staging columns cast to the target table's own column types."""
+    return sql.SQL(', ').join(
+        sql.SQL('s.{}::{}').format(sql.Identifier(source), sql.SQL(column_types[target]))
+        for target, source in columns.items()
+    )
+
+
+def _merge(cursor):
+    """Moves staged rows into customers, products and orders; first occurrence of an id wins."""
+    customer_types = _column_types(cursor, 'customers')
+    product_types = _column_types(cursor, 'products')
+    order_types = _column_types(cursor, 'orders')
+
+    cursor.execute(sql.SQL("""
+        INSERT INTO customers ({columns})
+        SELECT DISTINCT ON (s.customer_id) {values} FROM import_staging s
+        ORDER BY s.customer_id, s.row_seq
+        ON CONFLICT (customer_id) DO NOTHING
+    """).format(
+        columns=sql.SQL(', ').join(map(sql.Identifier, CUSTOMER_COLUMNS)),
+        values=_select_list(customer_types, {col: col for col in CUSTOMER_COLUMNS})))
+
+    cursor.execute(sql.SQL("""
+        INSERT INTO products ({columns})
+        SELECT DISTINCT ON (s.product_id) {values} FROM import_staging s
+        ORDER BY s.product_id, s.row_seq
+        ON CONFLICT (product_id) DO NOTHING
+    """).format(
+        columns=sql.SQL(', ').join(map(sql.Identifier, PRODUCT_COLUMNS)),
+        values=_select_list(product_types, {col: col for col in PRODUCT_COLUMNS})))
+
+    # Orders that were actually inserted are kept server-side for the rollup and the
+    # changed-customer list, so nothing proportional to the file comes back to Python.
+    cursor.execute("""
+        CREATE TEMP TABLE inserted_orders (
+            customer_id TEXT, last_purchase_date TIMESTAMP, product_id TEXT,
+            unit_price NUMERIC, quantity NUMERIC
+        ) ON COMMIT DROP
+    """)
+    cursor.execute(sql.SQL("""
+        WITH inserted AS (
+            INSERT INTO orders ({columns})
+            SELECT DISTINCT ON (s.order_id) {values} FROM import_staging s
+            ORDER BY s.order_id, s.row_seq
+            ON CONFLICT (order_id) DO NOTHING
+            RETURNING customer_id, last_purchase_date, product_id, unit_price, quantity
+        )
+        INSERT INTO inserted_orders SELECT * FROM inserted
+    """).format(
+        columns=sql.SQL(', ').join(map(sql.Identifier, ORDER_COLUMNS)),
+        values=_select_list(order_types, ORDER_COLUMNS)))
+
+
+def import_chunks(conn, chunks, progress=None):
     """
-    Cleans and inserts data from a DataFrame into the database.
-    Returns a dictionary with the result.
+    Streams cleaned chunks into a staging table with COPY, then merges them
+    into the database in one transaction. Memory stays at one chunk.
+    Returns a dictionary with the result, including the ids of customers
+    whose orders changed so that derived data can be refreshed for them only.
+    progress, if given, is called as progress(phase, rows_parsed).
     """
+    if progress is None:
+        progress = lambda phase, rows_parsed: None
     cursor = conn.cursor()
     try:
-        # 1. Clean the data
-        df['signup_date'] = pd.to_datetime(df['signup_date'], errors='coerce')
-        df['last_purchase_date'] = pd.to_datetime(df['last_purchase_date'], errors='coerce')
-        numeric_cols = ['age', 'cancellations_count', 'unit_price', 'quantity', 'purchase_frequency', 'Ratings']
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        # 2. Insert Customers
-        customers = df[['customer_id', 'age', 'gender', 'country', 'signup_date']].drop_duplicates(subset=['customer_id'])
-        customer_tuples = [tuple(x) for x in customers.to_numpy()]
-        extras.execute_values(cursor,
-            "INSERT INTO customers (customer_id, age, gender, country, signup_date) VALUES %s ON CONFLICT (customer_id) DO NOTHING",
-            customer_tuples)
-        
-        # 3. Insert Products
-        products = df[['product_id', 'product_name', 'category']].drop_duplicates(subset=['product_id'])
-        product_tuples = [tuple(x) for x in products.to_numpy()]
-        extras.execute_values(cursor,
-            "INSERT INTO products (product_id, product_name, category) VALUES %s ON CONFLICT (product_id) DO NOTHING",
-            product_tuples)
-
-        # 4. Insert Orders
-        orders = df[['order_id', 'customer_id', 'product_id', 'last_purchase_date', 'cancellations_count', 'subscription_status', 'unit_price', 'quantity', 'purchase_frequency', 'Ratings']]
-        order_tuples = [tuple(x) for x in orders.to_numpy()]
-        extras.execute_values(cursor,
-            "INSERT INTO orders (order_id, customer_id, product_id, last_purchase_date, cancellations_count, subscription_status, unit_price, quantity, purchase_frequency, ratings) VALUES %s ON CONFLICT (order_id) DO NOTHING",
-            order_tuples)
-        
+        cursor.execute(sql.SQL("CREATE TEMP TABLE import_staging ({columns}, row_seq BIGSERIAL) ON COMMIT DROP").format(
+            columns=sql.SQL(', ').join(
+                sql.SQL('{} {}').format(sql.Identifier(name), sql.SQL(col_type)) for name, col_type in STAGING_COLUMNS)))
+        copy_sql = sql.SQL("COPY import_staging ({columns}) FROM STDIN WITH (FORMAT csv)").format(
+            columns=sql.SQL(', ').join(map(sql.Identifier, SOURCE_COLUMNS)))
+
+        rows_processed = 0
+        for chunk in chunks:
+            chunk = clean_chunk(chunk)
+            if chunk.empty:
+                continue
+            buffer = io.StringIO()
+            chunk.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+            rows_processed += len(chunk)
+            progress('staging', rows_processed)
+
+        progress('merging', rows_processed)
+        _merge(cursor)
+        rollup_service.apply_inserted_orders_table(cursor, 'inserted_orders')
+        cursor.execute("SELECT COUNT(*) FROM inserted_orders")
+        rows_inserted = cursor.fetchone()[0]
+        cursor.execute("SELECT DISTINCT customer_id FROM inserted_orders ORDER BY customer_id")
+        customer_ids = [row[0] for row in cursor.fetchall()]
+        # Re-imports of known orders change nothing, so they keep the watermark (and clients' caches).
+        version = data_version.bump(cursor) if rows_inserted else None
+        if version is not None:
+            data_version.mark_customers(cursor, 'inserted_orders', version[0])
+
         conn.commit()
-        return {"success": True, "rows_processed": len(df)}
+        if version is not None:
+            data_version.remember(*version)
+        return {
+            "success": True,
+            "rows_processed": rows_processed,
+            "rows_inserted": rows_inserted,
+            "customer_ids": customer_ids,
+            "data_version": version[0] if version is not None else None,
+        }
     except Exception as e:
         conn.rollback()
         return {"success": False, "error": str(e)}
     finally:
-        cursor.close()
\ No newline at end of file
+        cursor.close()
+
+
+def import_file(conn, file, filename, chunk_size=IMPORT_CHUNK_ROWS, progress=None):
+    """Imports an uploaded .xls/.xlsx/.csv/.parquet file chunk by chunk."""
+    return import_chunks(conn, iter_chunks(file, filename, chunk_size), progress=progress)
+
+
+def insert_data_from_df(conn, df):
+    """
+    Cleans and inserts data from a DataFrame into the database.
+    Kept for callers that already hold the whole file in memory.
+    """
+    return import_chunks(conn, [df])
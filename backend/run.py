@@ -1,6 +1,9 @@
 from app import create_app
 
-app = create_app()
+# Worker processes started with spawn (demand forecasts) re-import this file as
+# __mp_main__; they only run plain functions and must not build their own app.
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=5000, debug=True)
\ No newline at end of file
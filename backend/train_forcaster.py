@@ -1,55 +1,70 @@
-import pandas as pd
-import joblib
+import argparse
+import os
 import warnings
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from app.services.db import engine
+from app.services.db import connect
+from app.services import model_store, forecaster_training
 
 warnings.filterwarnings('ignore')
 
 def get_sales_data():
-    """Fetches raw order data to create a sales time-series."""
+    """Fetches daily sales totals from the daily_sales rollup to create a sales time-series."""
     try:
-        sql_query = """
-            SELECT
-                last_purchase_date,
-                (unit_price * quantity) as order_amount
-            FROM
-                orders;
-        """
-        
-        df = pd.read_sql(sql_query, engine)
+        with connect(statement_timeout_ms=0, read_only=True) as connection:
+            sales_daily = forecaster_training.daily_sales_series(connection)
         print("Success: Sales data loaded from database.")
-        return df
+        return sales_daily
 
     except Exception as e:
         print(f"Error: Could not fetch sales data. {e}")
         return None
 
-def train_and_save_forecaster(df):
-    """Prepares time-series data and trains and saves a SARIMAX model."""
-    
-    df['last_purchase_date'] = pd.to_datetime(df['last_purchase_date'], errors='coerce')
-    df = df.dropna(subset=['last_purchase_date', 'order_amount'])
-    
-    sales_daily = df.groupby('last_purchase_date')['order_amount'].sum().asfreq('D').fillna(0)
-    
-    if len(sales_daily) < 14:
+def train_and_save_forecaster(sales_daily):
+    """Trains and saves a SARIMAX model on the daily sales series."""
+
+    if len(sales_daily) < forecaster_training.MIN_TRAINING_DAYS:
         print("Error: Not enough daily data to train the forecasting model.")
         return
 
     print("Training SARIMAX model... this may take a moment.")
     try:
-        model = SARIMAX(sales_daily, order=(1, 1, 1), seasonal_order=(1, 1, 1, 7))
-        results = model.fit(disp=False)
-        
-        joblib.dump(results, 'sales_forecaster.pkl')
-        print("\nSuccess: Sales forecasting model trained and saved to 'sales_forecaster.pkl'")
+        results = forecaster_training.fit(sales_daily)
+
+        # Renamed into place, so running servers hot-reload only a complete file.
+        model_store.save_artifact(results, model_store.SALES_FORECASTER_PATH)
+        print(f"\nSuccess: Sales forecasting model trained and saved to '{model_store.SALES_FORECASTER_PATH}'")
 
     except Exception as e:
         print(f"Error during model training: {e}")
 
+def update_forecaster(refit):
+    """Adds the days completed since the saved model's last update, keeping its parameters.
+
+    Returns False when there is no saved model to update.
+    """
+    try:
+        record = forecaster_training.update_saved_forecaster(refit=refit)
+    except Exception as e:
+        print(f"Error during forecaster update: {e}")
+        return True
+    if record is None:
+        if not os.path.exists(model_store.SALES_FORECASTER_PATH):
+            print(f"Warning: '{model_store.SALES_FORECASTER_PATH}' not found; training a new model.")
+            return False
+        print("Success: The sales forecaster is already up to date.")
+    else:
+        print(f"Success: Sales forecaster updated ({record['mode']}) through {record['through']} in {record['seconds']}s.")
+    return True
+
 if __name__ == '__main__':
-    sales_df = get_sales_data()
-    
-    if sales_df is not None:
-        train_and_save_forecaster(sales_df)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Trains the sales forecaster.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="append the days completed since the last run instead of refitting")
+    parser.add_argument('--refit', action='store_true',
+                        help="with --incremental, re-estimate the parameters (warm-started) now")
+    args = parser.parse_args()
+
+    if not (args.incremental and update_forecaster(args.refit)):
+        sales_df = get_sales_data()
+
+        if sales_df is not None:
+            train_and_save_forecaster(sales_df)
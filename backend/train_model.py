@@ -1,6 +1,12 @@
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 import joblib
 import warnings
 
@@ -11,46 +17,86 @@ from sklearn.preprocessing import StandardScaler, MinMaxScaler
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import roc_auc_score, classification_report
 from imblearn.over_sampling import SMOTE
-from app.services.db import engine
+from app.services import db_service, data_version, model_store
+from app.services.db import connect
+from app.services.feature_pipeline import ChurnFeatureTransformer
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
-def get_aggregated_data():
-    """Fetches and aggregates data from the database, similar to the notebook's logic."""
+MODEL_PATH = 'churn_model.pkl'
+# Cores used to fit (and evaluate) the forest; -1 uses all of them.
+TRAIN_N_JOBS = int(os.getenv("TRAIN_N_JOBS", "-1"))
+N_ESTIMATORS = int(os.getenv("TRAIN_N_ESTIMATORS", "200"))
+# Trees added per incremental run, and the forest size at which a run does a full refit instead.
+TRAIN_INCREMENT_TREES = int(os.getenv("TRAIN_INCREMENT_TREES", "50"))
+TRAIN_MAX_TREES = int(os.getenv("TRAIN_MAX_TREES", "600"))
+# One JSON line per training run (mode, rows, trees, per-phase seconds, peak memory, AUC).
+TRAINING_LOG_PATH = os.getenv("TRAINING_LOG_PATH", "training_history.jsonl")
+
+
+class TrainingRecorder:
+    """Wall time per phase and the process's peak memory for one training run."""
+
+    def __init__(self, mode):
+        self.record = {'mode': mode, 'started_at': datetime.now(timezone.utc).isoformat(), 'phases': {}}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record['phases'][name] = round(time.perf_counter() - started, 3)
+
+    def finish(self, **fields):
+        self.record.update(fields)
+        self.record['seconds'] = round(time.perf_counter() - self._started, 3)
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux.
+            self.record['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        print(f"Success: Training finished: {json.dumps(self.record)}")
+        try:
+            with open(TRAINING_LOG_PATH, 'a') as f:
+                f.write(json.dumps(self.record) + '\n')
+        except OSError as e:
+            print(f"Warning: Could not append to '{TRAINING_LOG_PATH}': {e}")
+        return self.record
+
+
+def get_aggregated_data(changed_since=None):
+    """Fetches the per-customer aggregates the app scores and the data version they reflect.
+
+    With changed_since only the customers whose orders changed after that data
+    version are aggregated (an empty frame when none did). Returns (None, None)
+    when the data cannot be read.
+    """
     try:
-        sql_query = """
-            SELECT
-                c.customer_id,
-                c.age,
-                c.gender,
-                c.country,
-                MIN(c.signup_date) as signup_date,
-                MAX(o.last_purchase_date) as last_purchase_date,
-                COUNT(o.order_id) as purchase_count,
-                SUM(o.quantity) as total_items_purchased,
-                SUM(o.unit_price * o.quantity) as total_spend,
-                AVG(o.ratings) as avg_rating,
-                SUM(o.cancellations_count) as total_cancellations,
-                MAX(o.subscription_status) as subscription_status -- Takes the most recent status
-            FROM
-                customers c
-            JOIN
-                orders o ON c.customer_id = o.customer_id
-            GROUP BY
-                c.customer_id, c.age, c.gender, c.country;
-        """
-        
-        df = pd.read_sql(sql_query, engine)
+        with connect(statement_timeout_ms=0, read_only=True) as connection:
+            # Read the watermark first and where the data comes from (reads may go to a
+            # replica): changes committed while training are picked up by the next run.
+            version = data_version.read(connection)[0]
+            customer_ids = None
+            if changed_since is not None:
+                customer_ids = data_version.changed_customers(connection, changed_since)
+            if customer_ids == []:
+                df = pd.DataFrame()
+            else:
+                df = db_service.read_aggregated_data(connection, customer_ids)
         print("Success: Data loaded and aggregated into DataFrame.")
-        return df
+        return df, version
 
     except Exception as e:
         print("Error: Could not fetch data.")
         print(e)
-        return None
+        return None, None
 
 def feature_engineering_and_labeling(df):
     """Applies the feature engineering and churn labeling logic from the Colab notebook."""
-    
+
     df['signup_date'] = pd.to_datetime(df['signup_date'], errors='coerce')
     df['last_purchase_date'] = pd.to_datetime(df['last_purchase_date'], errors='coerce')
 
@@ -59,29 +105,23 @@ def feature_engineering_and_labeling(df):
     df['tenure_days'] = (TODAY - df['signup_date']).dt.days.fillna(-1)
 
     numeric_cols = df.select_dtypes(include=np.number).columns
-    for c in numeric_cols:
-        df[c] = df[c].fillna(df[c].median())
-    
+    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
+
     df['avg_spend_per_order'] = df['total_spend'] / df['purchase_count'].replace(0, 1)
     df['purchases_per_year'] = (df['purchase_count'] * 365) / (df['tenure_days'] + 1)
-    
-    def derive_status(row):
-        ss = str(row.get('subscription_status', '')).lower()
-        days = row.get('days_since_last_purchase', np.nan)
-        if ss == 'cancelled' or (pd.notna(days) and days > 365):
-            return 'churned'
-        return 'active' 
 
-    df['status'] = df.apply(derive_status, axis=1)
-    df['churn'] = (df['status'] == 'churned').astype(int)
+    # Churned: a cancelled subscription or no purchase for over a year.
+    churned = (df['subscription_status'].astype(str).str.lower() == 'cancelled') | (df['days_since_last_purchase'] > 365)
+    df['status'] = np.where(churned, 'churned', 'active')
+    df['churn'] = churned.astype(int)
 
     print("Success: Feature engineering and labeling complete.")
     print("Churn distribution:\n", df['churn'].value_counts(normalize=True))
     return df
 
-def train_and_save_model(df):
+def train_and_save_model(df, recorder, trained_version):
     """Prepares data, trains the Random Forest model, and saves it."""
-    
+
     # 1. Define features and target, excluding identifiers and leak-prone columns
     features_to_use = [
         'age', 'days_since_last_purchase', 'tenure_days', 'purchase_count',
@@ -93,15 +133,15 @@ def train_and_save_model(df):
 
     # 2. One-hot encode categorical features
     df_model = pd.get_dummies(df, columns=categorical_features, drop_first=True)
-    
+
     # Get final list of feature columns after encoding
     final_feature_columns = features_to_use + [col for col in df_model.columns if any(cat in col for cat in categorical_features)]
-    
+
     # Ensure all feature columns exist
     for col in final_feature_columns:
         if col not in df_model.columns:
             df_model[col] = 0 # Add missing column if a category was not in the data
-            
+
     X = df_model[final_feature_columns]
     y = df_model[target]
 
@@ -114,35 +154,123 @@ def train_and_save_model(df):
     X_test[features_to_use] = scaler.transform(X_test[features_to_use])
 
     # 5. Handle class imbalance with SMOTE
-    sm = SMOTE(random_state=42)
-    X_train_res, y_train_res = sm.fit_resample(X_train, y_train)
+    with recorder.phase('smote'):
+        sm = SMOTE(random_state=42)
+        X_train_res, y_train_res = sm.fit_resample(X_train, y_train)
     print(f"SMOTE applied. New train shape: {X_train_res.shape}")
 
-    # 6. Train the Random Forest model
-    model = RandomForestClassifier(n_estimators=200, class_weight='balanced', random_state=42)
-    model.fit(X_train_res, y_train_res)
-    
+    # 6. Train the Random Forest model on every core
+    with recorder.phase('fit'):
+        model = RandomForestClassifier(n_estimators=N_ESTIMATORS, class_weight='balanced', random_state=42, n_jobs=TRAIN_N_JOBS)
+        model.fit(X_train_res, y_train_res)
+
     # 7. Evaluate the model
-    y_prob = model.predict_proba(X_test)[:, 1]
-    auc = roc_auc_score(y_test, y_prob)
+    with recorder.phase('evaluate'):
+        y_prob = model.predict_proba(X_test)[:, 1]
+        auc = roc_auc_score(y_test, y_prob)
     print(f"\nModel Evaluation (Random Forest) ROC-AUC: {auc:.4f}")
-    print("Classification Report:\n", classification_report(y_test, model.predict(X_test)))
+    print("Classification Report:\n", classification_report(y_test, (y_prob > 0.5).astype(int)))
 
-    # 8. Save the model, scaler, and columns
+    # 8. Compile the fitted feature pipeline (category maps, training medians, scaler)
+    transformer = ChurnFeatureTransformer(features_to_use, final_feature_columns, df[features_to_use].median(), scaler)
+
+    # The serving processes score one row at a time as often as in batches; a single
+    # core per prediction keeps them from oversubscribing the machine.
+    model.set_params(n_jobs=None)
+    record = recorder.finish(rows=len(df), trees=len(model.estimators_), auc=round(auc, 4), data_version=trained_version)
+
+    # 9. Save the model, scaler, columns, compiled pipeline and the training record
     model_data_package = {
         'model': model,
         'scaler': scaler,
         'numeric_columns': features_to_use,
-        'model_columns': final_feature_columns
+        'model_columns': final_feature_columns,
+        'transformer': transformer,
+        'training': record,
     }
-    joblib.dump(model_data_package, 'churn_model.pkl')
-    print("\nSuccess: New Random Forest model saved to 'churn_model.pkl'")
+    # Written to a temporary file and renamed, so running servers hot-reload only complete models.
+    model_store.save_artifact(model_data_package, MODEL_PATH)
+    print(f"\nSuccess: New Random Forest model saved to '{MODEL_PATH}'")
+
+def train_incremental(package, recorder):
+    """Adds TRAIN_INCREMENT_TREES trees fitted on the customers changed since the last run.
+
+    The existing trees are kept (warm start) and the new ones see the new data
+    through the model's own fitted pipeline, so the feature space is unchanged.
+    Returns False when a full retrain is needed instead.
+    """
+    previous = package.get('training') or {}
+    model = package['model']
+    if 'data_version' not in previous or model is None:
+        print("Warning: The saved model has no training record; running a full retrain.")
+        return False
+    if len(model.estimators_) + TRAIN_INCREMENT_TREES > TRAIN_MAX_TREES:
+        print(f"Warning: The forest would exceed {TRAIN_MAX_TREES} trees; running a full retrain.")
+        return False
+
+    with recorder.phase('load'):
+        df, trained_version = get_aggregated_data(changed_since=previous['data_version'])
+    if df is None:
+        print("Warning: Could not read the changed customers; running a full retrain.")
+        return False
+    if df.empty:
+        print("Success: No customers changed since the last training run; the model is up to date.")
+        return True
+
+    with recorder.phase('features'):
+        df = feature_engineering_and_labeling(df)
+        transformer = package.get('transformer') or ChurnFeatureTransformer.from_model_package(package)
+        X = pd.DataFrame(transformer.transform(df), columns=package['model_columns'])
+        y = df['churn'].to_numpy()
+
+    if len(np.unique(y)) < 2:
+        print("Warning: The changed customers all have the same label; running a full retrain.")
+        return False
+
+    X_train, X_test, y_train, y_test = X, None, y, None
+    if min(np.bincount(y)) >= 4:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, stratify=y, random_state=42)
+
+    with recorder.phase('fit'):
+        model.set_params(warm_start=True, n_jobs=TRAIN_N_JOBS, n_estimators=len(model.estimators_) + TRAIN_INCREMENT_TREES)
+        model.fit(X_train, y_train)
+        model.set_params(warm_start=False, n_jobs=None)
+
+    auc = None
+    if X_test is not None:
+        with recorder.phase('evaluate'):
+            auc = round(roc_auc_score(y_test, model.predict_proba(X_test)[:, 1]), 4)
+        print(f"\nModel Evaluation on the changed customers ROC-AUC: {auc:.4f}")
+
+    package['training'] = recorder.finish(rows=len(df), trees=len(model.estimators_), auc=auc,
+                                          data_version=trained_version, previous_data_version=previous['data_version'])
+    model_store.save_artifact(package, MODEL_PATH)
+    print(f"\nSuccess: Added {TRAIN_INCREMENT_TREES} trees; model saved to '{MODEL_PATH}'")
+    return True
 
 # --- Main Execution Block ---
 if __name__ == '__main__':
-    customer_df = get_aggregated_data()
-    
-    if customer_df is not None:
-        customer_df_featured = feature_engineering_and_labeling(customer_df)
-        
-        train_and_save_model(customer_df_featured)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Trains the churn model.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="add trees for customers changed since the last run instead of refitting")
+    args = parser.parse_args()
+
+    done = False
+    if args.incremental:
+        if os.path.exists(MODEL_PATH):
+            done = train_incremental(joblib.load(MODEL_PATH), TrainingRecorder('incremental'))
+        else:
+            print(f"Warning: '{MODEL_PATH}' not found; running a full retrain.")
+
+    if not done:
+        recorder = TrainingRecorder('full')
+        with recorder.phase('load'):
+            customer_df, trained_version = get_aggregated_data()
+
+        if customer_df is None:
+            # Nothing was trained: let schedulers see the failure.
+            sys.exit(1)
+        with recorder.phase('features'):
+            customer_df_featured = feature_engineering_and_labeling(customer_df)
+
+        train_and_save_model(customer_df_featured, recorder, trained_version)
@@ -1,5 +1,7 @@
 import React, { useState } from 'react';
 
+const API_BASE = 'https://company-dashboard-lsr7.onrender.com';
+
 function DataUploader() {
   const [selectedFile, setSelectedFile] = useState(null);
   const [uploadStatus, setUploadStatus] = useState(''); // idle, uploading, success, error
@@ -10,6 +12,25 @@ function DataUploader() {
     setUploadStatus('idle'); // Reset status when a new file is chosen
   };
 
+  // Imports run in the background; poll the job until it finishes.
+  const waitForImport = async (statusUrl) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const response = await fetch(`${API_BASE}${statusUrl}`);
+      const job = await response.json();
+      if (!response.ok) {
+        throw new Error(job.error || 'Could not read import status.');
+      }
+      if (job.status === 'succeeded') {
+        return job;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Import failed.');
+      }
+      setMessage(`Importing (${job.phase})... ${job.rows_parsed} rows read.`);
+    }
+  };
+
   const handleUpload = async () => {
     if (!selectedFile) {
       setMessage('Please select a file first.');
@@ -23,7 +44,7 @@ function DataUploader() {
     formData.append('file', selectedFile);
 
     try {
-      const response = await fetch('https://company-dashboard-lsr7.onrender.com/api/upload_data', {
+      const response = await fetch(`${API_BASE}/api/upload_data`, {
         method: 'POST',
         body: formData,
       });
@@ -31,8 +52,15 @@ function DataUploader() {
       const result = await response.json();
 
       if (response.ok) {
-        setUploadStatus('success');
-        setMessage(result.message || 'Upload successful!');
+        setMessage(result.message || 'Upload received.');
+        try {
+          const job = await waitForImport(result.status_url);
+          setUploadStatus('success');
+          setMessage(`Successfully processed ${job.rows_parsed} rows.`);
+        } catch (error) {
+          setUploadStatus('error');
+          setMessage(error.message);
+        }
       } else {
         setUploadStatus('error');
         setMessage(result.error || 'An unknown error occurred.');
@@ -48,13 +76,13 @@ function DataUploader() {
     <div className="bg-white p-6 rounded-lg shadow-md">
       <h2 className="text-xl font-semibold mb-4 text-gray-800">Append New Data</h2>
       <p className="text-sm text-gray-600 mb-4">
-        Upload a new Excel file (.xls or .xlsx) to add its data to the database. The dashboard will need to be refreshed to reflect the changes.
+        Upload a new Excel, CSV or Parquet file (.xls, .xlsx, .csv, .parquet) to add its data to the database. The dashboard will need to be refreshed to reflect the changes.
       </p>
       <div className="flex items-center space-x-4">
         <input
           type="file"
           onChange={handleFileChange}
-          accept=".xls,.xlsx"
+          accept=".xls,.xlsx,.csv,.parquet"
           className="block w-full text-sm text-gray-500
             file:mr-4 file:py-2 file:px-4
             file:rounded-full file:border-0
@@ -67,7 +95,7 @@ function DataUploader() {
           disabled={!selectedFile || uploadStatus === 'uploading'}
           className="px-4 py-2 bg-blue-600 text-white font-semibold rounded-lg shadow-md hover:bg-blue-700 disabled:bg-gray-400 disabled:cursor-not-allowed"
         >
-          {uploadStatus === 'uploading' ? 'Uploading...' : 'Upload'}
+          {uploadStatus === 'uploading' ? 'Importing...' : 'Upload'}
         </button>
       </div>
       {message && (